@@ -1,9 +1,73 @@
 # This file provides the runtime support for running a basic program
 # Assumes the program has been parsed using basparse.py
+#
+# Before a program runs, it is compiled into a flat list of instructions.
+# Each instruction is a Python closure that carries out one statement and
+# returns the index of the next instruction to execute.  Expressions are
+# compiled into closures as well.  The main loop then does nothing more
+# than call instructions one after another.
+#
+# Since programs are edited a line at a time in interactive mode, all of
+# the information about a program is maintained incrementally.  The sorted
+# list of line numbers is updated with bisect, each line is compiled once
+# and only recompiled if it is changed, and the DATA, END and FOR/NEXT
+# checks only look at the lines involved.  Instructions don't contain their
+# own position.  Instead, each line number has a label (a one-element list
+# holding the index of the line's instruction) and the labels are
+# renumbered in a single pass when lines are added or deleted.
+#
+# Lists and tables are stored in flat typed arrays rather than in nested
+# Python lists.  A FOR loop whose body does nothing but assign elements of
+# an array is carried out by its FOR statement in a single step.
 
 import sys
 import math
 import random
+import operator
+import bisect
+from array import array
+
+# Raised by compiled code when a runtime error occurs.  The run() loop
+# reports the message along with the offending line number.
+class BasicError(Exception):
+    pass
+
+
+# Storage for a list or table.  The elements are held in a contiguous
+# array of rows*cols numbers with row i starting at (i-1)*cols.  Numbers
+# are stored as machine integers until a value that doesn't fit is
+# stored, at which point the storage is converted to a list, which keeps
+# the type of each element.  Integers stored earlier still print as
+# integers.
+class NumArray(object):
+    __slots__ = ('data', 'rows', 'cols')
+
+    def __init__(self, rows, cols=1):
+        self.rows = rows
+        self.cols = cols
+        self.data = array('q', bytes(8 * rows * cols))
+
+    def __len__(self):
+        return self.rows
+
+    # Store value at a flat index, switching to a list if necessary
+    def store(self, index, value):
+        try:
+            self.data[index] = value
+        except (TypeError, OverflowError):
+            self.data = self.data.tolist()
+            self.data[index] = value
+
+    # Store value at every index in range(start, stop, step)
+    def fill(self, start, stop, step, value):
+        n = len(range(start, stop, step))
+        try:
+            if isinstance(self.data, array):
+                self.data[start:stop:step] = array('q', [value]) * n
+                return
+        except (TypeError, OverflowError):
+            self.data = self.data.tolist()
+        self.data[start:stop:step] = [value] * n
 
 
 class BasicInterpreter:
@@ -11,209 +75,598 @@ class BasicInterpreter:
     # Initialize the interpreter. prog is a dictionary
     # containing (line,statement) mappings
     def __init__(self, prog):
-        self.prog = prog
-
-        self.functions = {           # Built-in function table
-            'SIN': lambda z: math.sin(self.eval(z)),
-            'COS': lambda z: math.cos(self.eval(z)),
-            'TAN': lambda z: math.tan(self.eval(z)),
-            'ATN': lambda z: math.atan(self.eval(z)),
-            'EXP': lambda z: math.exp(self.eval(z)),
-            'ABS': lambda z: abs(self.eval(z)),
-            'LOG': lambda z: math.log(self.eval(z)),
-            'SQR': lambda z: math.sqrt(self.eval(z)),
-            'INT': lambda z: int(self.eval(z)),
+        # Built-in function table.  Functions receive their argument as a
+        # compiled expression and evaluate it themselves.
+        self.functions = {
+            'SIN': lambda z: math.sin(z()),
+            'COS': lambda z: math.cos(z()),
+            'TAN': lambda z: math.tan(z()),
+            'ATN': lambda z: math.atan(z()),
+            'EXP': lambda z: math.exp(z()),
+            'ABS': lambda z: abs(z()),
+            'LOG': lambda z: math.log(z()),
+            'SQR': lambda z: math.sqrt(z()),
+            'INT': lambda z: int(z()),
             'RND': lambda z: random.random()
         }
 
-    # Collect all data statements
+        # Run-time storage.  These objects are created once and cleared on
+        # each run so that compiled code can hold direct references to them.
+        self.vars = {}               # All variables
+        self.lists = {}              # List variables
+        self.tables = {}             # Tables
+        self.loops = []              # Currently active loops
+        self.data = []               # Values from all DATA statements
+        self.dc = 0                  # Data counter
+
+        self.new()
+        self.add_statements(prog)
+
+    # Collect all data statements.  The data values only need to be
+    # gathered again if a DATA statement was changed.
     def collect_data(self):
-        self.data = []
-        for lineno in self.stat:
-            if self.prog[lineno][0] == 'DATA':
-                self.data = self.data + self.prog[lineno][1]
+        if self.data_changed:
+            self.data = []
+            for lineno in self.datalines:
+                self.data.extend(self.prog[lineno][1])
+            self.data_changed = False
         self.dc = 0                  # Initialize the data counter
 
     # Check for end statements
     def check_end(self):
-        has_end = 0
-        for lineno in self.stat:
-            if self.prog[lineno][0] == 'END' and not has_end:
-                has_end = lineno
-        if not has_end:
+        if not self.ends:
             print("NO END INSTRUCTION")
             self.error = 1
             return
-        if has_end != lineno:
+        if self.ends[0] != self.stat[-1]:
             print("END IS NOT LAST")
             self.error = 1
 
-    # Check loops
+    # Check loops.  Each FOR is matched with the first NEXT for the same
+    # variable that follows it.  Matches are recomputed only for the loop
+    # variables whose FOR or NEXT statements were changed.
     def check_loops(self):
-        for pc in range(len(self.stat)):
-            lineno = self.stat[pc]
-            if self.prog[lineno][0] == 'FOR':
-                forinst = self.prog[lineno]
-                loopvar = forinst[1]
-                for i in range(pc + 1, len(self.stat)):
-                    if self.prog[self.stat[i]][0] == 'NEXT':
-                        nextvar = self.prog[self.stat[i]][1]
-                        if nextvar != loopvar:
-                            continue
-                        self.loopend[pc] = i
-                        break
+        for var in self.loops_changed:
+            nexts = self.nexts.get(var, [])
+            for lineno in self.fors.get(var, []):
+                i = bisect.bisect_right(nexts, lineno)
+                if i < len(nexts):
+                    self.loopend[lineno] = nexts[i]
                 else:
-                    print("FOR WITHOUT NEXT AT LINE %s" % self.stat[pc])
+                    self.loopend.pop(lineno, None)
+        self.loops_changed = set()
+
+        for var, lines in self.fors.items():
+            for lineno in lines:
+                if lineno not in self.loopend:
+                    print("FOR WITHOUT NEXT AT LINE %s" % lineno)
                     self.error = 1
 
-    # Evaluate an expression
-    def eval(self, expr):
+    # Return the label for a line number.  A label is a list holding the
+    # index of the line in the instruction list, or None if the line
+    # doesn't exist.
+    def label(self, lineno):
+        lab = self.labels.get(lineno)
+        if lab is None:
+            lab = self.labels[lineno] = [None]
+        return lab
+
+    # Compile an expression into a closure that computes its value
+    def compile_expr(self, expr):
         etype = expr[0]
         if etype == 'NUM':
-            return expr[1]
+            value = expr[1]
+            return lambda: value
         elif etype == 'GROUP':
-            return self.eval(expr[1])
+            return self.compile_expr(expr[1])
         elif etype == 'UNARY':
             if expr[1] == '-':
-                return -self.eval(expr[2])
+                operand = self.compile_expr(expr[2])
+                return lambda: -operand()
         elif etype == 'BINOP':
-            if expr[1] == '+':
-                return self.eval(expr[2]) + self.eval(expr[3])
-            elif expr[1] == '-':
-                return self.eval(expr[2]) - self.eval(expr[3])
-            elif expr[1] == '*':
-                return self.eval(expr[2]) * self.eval(expr[3])
-            elif expr[1] == '/':
-                return float(self.eval(expr[2])) / self.eval(expr[3])
-            elif expr[1] == '^':
-                return abs(self.eval(expr[2]))**self.eval(expr[3])
+            op = expr[1]
+            lhs = self.compile_expr(expr[2])
+            rhs = self.compile_expr(expr[3])
+            if op == '+':
+                return lambda: lhs() + rhs()
+            elif op == '-':
+                return lambda: lhs() - rhs()
+            elif op == '*':
+                return lambda: lhs() * rhs()
+            elif op == '/':
+                return lambda: float(lhs()) / rhs()
+            elif op == '^':
+                return lambda: abs(lhs())**rhs()
         elif etype == 'VAR':
-            var, dim1, dim2 = expr[1]
-            if not dim1 and not dim2:
-                if var in self.vars:
-                    return self.vars[var]
-                else:
-                    print("UNDEFINED VARIABLE %s AT LINE %s" %
-                          (var, self.stat[self.pc]))
-                    raise RuntimeError
-            # May be a list lookup or a function evaluation
-            if dim1 and not dim2:
-                if var in self.functions:
-                    # A function
-                    return self.functions[var](dim1)
-                else:
-                    # A list evaluation
-                    if var in self.lists:
-                        dim1val = self.eval(dim1)
-                        if dim1val < 1 or dim1val > len(self.lists[var]):
-                            print("LIST INDEX OUT OF BOUNDS AT LINE %s" %
-                                  self.stat[self.pc])
-                            raise RuntimeError
-                        return self.lists[var][dim1val - 1]
-            if dim1 and dim2:
-                if var in self.tables:
-                    dim1val = self.eval(dim1)
-                    dim2val = self.eval(dim2)
-                    if dim1val < 1 or dim1val > len(self.tables[var]) or dim2val < 1 or dim2val > len(self.tables[var][0]):
-                        print("TABLE INDEX OUT OUT BOUNDS AT LINE %s" %
-                              self.stat[self.pc])
-                        raise RuntimeError
-                    return self.tables[var][dim1val - 1][dim2val - 1]
-            print("UNDEFINED VARIABLE %s AT LINE %s" %
-                  (var, self.stat[self.pc]))
-            raise RuntimeError
+            return self.compile_var(expr[1])
 
-    # Evaluate a relational expression
-    def releval(self, expr):
-        etype = expr[1]
-        lhs = self.eval(expr[2])
-        rhs = self.eval(expr[3])
-        if etype == '<':
-            if lhs < rhs:
-                return 1
-            else:
-                return 0
+    # Compile a variable reference.  A reference with one subscript may
+    # either be a list element or a function call.  Since functions are
+    # defined by DEF statements as the program runs, the choice is made
+    # when the expression is evaluated.
+    def compile_var(self, target):
+        var, dim1, dim2 = target
+        vars = self.vars
+        if not dim1 and not dim2:
+            def scalar():
+                try:
+                    return vars[var]
+                except KeyError:
+                    raise BasicError("UNDEFINED VARIABLE %s" % var)
+            return scalar
+
+        functions = self.functions
+        lists = self.lists
+        tables = self.tables
+        if dim1 and not dim2:
+            index = self.compile_expr(dim1)
+
+            def element():
+                if var in functions:
+                    return functions[var](index)
+                if var in lists:
+                    lst = lists[var]
+                    dim1val = index()
+                    if dim1val < 1 or dim1val > lst.rows:
+                        raise BasicError("LIST INDEX OUT OF BOUNDS")
+                    return lst.data[dim1val - 1]
+                raise BasicError("UNDEFINED VARIABLE %s" % var)
+            return element
+
+        index1 = self.compile_expr(dim1)
+        index2 = self.compile_expr(dim2)
+
+        def table_element():
+            if var in tables:
+                tab = tables[var]
+                dim1val = index1()
+                dim2val = index2()
+                if dim1val < 1 or dim1val > tab.rows or dim2val < 1 or dim2val > tab.cols:
+                    raise BasicError("TABLE INDEX OUT OUT BOUNDS")
+                return tab.data[(dim1val - 1) * tab.cols + dim2val - 1]
+            raise BasicError("UNDEFINED VARIABLE %s" % var)
+        return table_element
+
+    # Compile a relational expression into a closure returning True or False
+    relops = {
+        '<': operator.lt,
+        '<=': operator.le,
+        '>': operator.gt,
+        '>=': operator.ge,
+        '=': operator.eq,
+        '<>': operator.ne
+    }
+
+    def compile_relexpr(self, expr):
+        op = self.relops[expr[1]]
+        lhs = self.compile_expr(expr[2])
+        rhs = self.compile_expr(expr[3])
+        return lambda: op(lhs(), rhs())
+
+    # Compile an assignment.  Returns a closure that stores the value
+    # computed by the compiled expression value into target.
+    def compile_assign(self, target, value):
+        var, dim1, dim2 = target
+        if not dim1 and not dim2:
+            vars = self.vars
 
-        elif etype == '<=':
-            if lhs <= rhs:
-                return 1
-            else:
-                return 0
+            def assign():
+                vars[var] = value()
+            return assign
 
-        elif etype == '>':
-            if lhs > rhs:
-                return 1
+        elif dim1 and not dim2:
+            # List assignment
+            lists = self.lists
+            index = self.compile_expr(dim1)
+
+            def assign_list():
+                dim1val = index()
+                lst = lists.get(var)
+                if lst is None:
+                    lst = lists[var] = NumArray(10)
+                if dim1val > lst.rows:
+                    raise BasicError("DIMENSION TOO LARGE")
+                if dim1val < 1:
+                    raise BasicError("LIST INDEX OUT OF BOUNDS")
+                lst.store(dim1val - 1, value())
+            return assign_list
+
+        else:
+            tables = self.tables
+            index1 = self.compile_expr(dim1)
+            index2 = self.compile_expr(dim2)
+
+            def assign_table():
+                dim1val = index1()
+                dim2val = index2()
+                tab = tables.get(var)
+                if tab is None:
+                    tab = tables[var] = NumArray(10, 10)
+                # Variable already exists
+                if dim1val > tab.rows or dim2val > tab.cols:
+                    raise BasicError("DIMENSION TOO LARGE")
+                if dim1val < 1 or dim2val < 1:
+                    raise BasicError("TABLE INDEX OUT OUT BOUNDS")
+                tab.store((dim1val - 1) * tab.cols + dim2val - 1, value())
+            return assign_table
+
+    # Compile the program into a list of instructions.  Only lines that
+    # have been added or changed since the last run are compiled.  If lines
+    # have been added or deleted, the labels are renumbered.
+    def compile(self):
+        code = self.code
+        stat = self.stat
+        prog = self.prog
+        for pc, lineno in enumerate(stat):
+            if code[pc] is None:
+                code[pc] = self.compile_statement(lineno, prog[lineno])
+        if self.renumber:
+            label = self.label
+            for pc, lineno in enumerate(stat):
+                label(lineno)[0] = pc
+            self.renumber = False
+
+    # Compile a single statement.  Returns a closure that executes the
+    # statement and returns the index of the next instruction (-1 to stop).
+    def compile_statement(self, lineno, instr):
+        op = instr[0]
+        return getattr(self, 'compile_' + op, self.compile_nop)(lineno, instr)
+
+    # REM, DATA and anything else with no run-time behavior
+    def compile_nop(self, lineno, instr):
+        me = self.label(lineno)
+        return lambda: me[0] + 1
+
+    # END and STOP statements
+    def compile_END(self, lineno, instr):
+        return lambda: -1
+
+    compile_STOP = compile_END
+
+    # Jump to a line.  Undefined line numbers are only an error if the
+    # jump is actually taken.
+    def compile_jump(self, linenum):
+        target = self.label(linenum)
+
+        def jump():
+            newpc = target[0]
+            if newpc is None:
+                raise BasicError("UNDEFINED LINE NUMBER %d" % linenum)
+            return newpc
+        return jump
+
+    # GOTO statement
+    def compile_GOTO(self, lineno, instr):
+        return self.compile_jump(instr[1])
+
+    # PRINT statement
+    def compile_PRINT(self, lineno, instr):
+        plist = [(label, self.compile_expr(val) if val else None)
+                 for label, val in instr[1]]
+        end = instr[2]
+        me = self.label(lineno)
+
+        def print_():
+            write = sys.stdout.write
+            out = ""
+            for label, val in plist:
+                if out:
+                    out += ' ' * (15 - (len(out) % 15))
+                out += label
+                if val:
+                    if label:
+                        out += " "
+                    out += str(val())
+            write(out)
+            if not (end == ',' or end == ';'):
+                write("\n")
+            if end == ',':
+                write(" " * (15 - (len(out) % 15)))
+            if end == ';':
+                write(" " * (3 - (len(out) % 3)))
+            return me[0] + 1
+        return print_
+
+    # LET statement
+    def compile_LET(self, lineno, instr):
+        assign = self.compile_assign(instr[1], self.compile_expr(instr[2]))
+        me = self.label(lineno)
+
+        def let():
+            assign()
+            return me[0] + 1
+        return let
+
+    # READ statement
+    def compile_READ(self, lineno, instr):
+        targets = []
+        for target in instr[1]:
+            cell = [0]
+            targets.append((cell, self.compile_assign(target, lambda cell=cell: cell[0])))
+        me = self.label(lineno)
+
+        def read():
+            data = self.data
+            for cell, assign in targets:
+                if self.dc < len(data):
+                    cell[0] = data[self.dc]
+                    assign()
+                    self.dc += 1
+                else:
+                    # No more data.  Program ends
+                    return -1
+            return me[0] + 1
+        return read
+
+    # IF statement
+    def compile_IF(self, lineno, instr):
+        cond = self.compile_relexpr(instr[1])
+        jump = self.compile_jump(instr[2])
+        me = self.label(lineno)
+
+        def if_():
+            if cond():
+                return jump()
+            return me[0] + 1
+        return if_
+
+    # FOR statement.  The loop stack holds (label, step, var) tuples for
+    # each active loop.  The matching NEXT is looked up in self.loopend
+    # when the loop finishes, so the instruction doesn't need to be
+    # recompiled if NEXT statements are edited.
+    def compile_FOR(self, lineno, instr):
+        loopvar = instr[1]
+        initval = self.compile_expr(instr[2])
+        finval = self.compile_expr(instr[3])
+        stepval = self.compile_expr(instr[4] if instr[4] else ('NUM', 1))
+        vars = self.vars
+        loops = self.loops
+        loopend = self.loopend
+        labels = self.labels
+        me = self.label(lineno)
+        fill = self.compile_fill(lineno, instr)
+
+        def for_():
+            # Check to see if this is a new loop
+            if not loops or loops[-1][0] is not me:
+                if fill is not None and fill():
+                    return labels[loopend[lineno]][0] + 1
+                # Looks like a new loop. Make the initial assignment
+                newvalue = vars[loopvar] = initval()
+                step = stepval()
+                loops.append((me, step, loopvar))
             else:
-                return 0
+                # It's a repeat of the previous loop
+                # Update the value of the loop variable according to the step
+                step = loops[-1][1]
+                newvalue = vars[loopvar] + step
 
-        elif etype == '>=':
-            if lhs >= rhs:
-                return 1
+            if step < 0:
+                done = newvalue < finval()
             else:
-                return 0
-
-        elif etype == '=':
-            if lhs == rhs:
-                return 1
+                done = newvalue > finval()
+            if done:
+                # Loop is done. Jump past the NEXT
+                loops.pop()
+                return labels[loopend[lineno]][0] + 1
+            vars[loopvar] = newvalue
+            return me[0] + 1
+        return for_
+
+    # Collect the names of the simple variables used by an expression into
+    # names.  Returns False if the expression uses a list, table or function.
+    def simple_expr(self, expr, names):
+        etype = expr[0]
+        if etype == 'NUM':
+            return True
+        elif etype == 'GROUP':
+            return self.simple_expr(expr[1], names)
+        elif etype == 'UNARY':
+            return self.simple_expr(expr[2], names)
+        elif etype == 'BINOP':
+            return self.simple_expr(expr[2], names) and self.simple_expr(expr[3], names)
+        elif etype == 'VAR':
+            var, dim1, dim2 = expr[1]
+            if dim1 or dim2:
+                return False
+            names.add(var)
+            return True
+        return False
+
+    # Compile a loop of the form
+    #
+    #     FOR I = a TO b [STEP n]
+    #     LET A(I) = expr            (or A(I,x) or A(x,I))
+    #     NEXT I
+    #
+    # where the step is a positive integer constant and everything else
+    # only uses numbers and simple variables.  Such a loop stores into
+    # evenly spaced elements of an array, so the whole loop can be done at
+    # once.  If expr doesn't depend on I, it is only evaluated once and the
+    # elements are filled in with a single slice assignment.
+    #
+    # Returns None if the loop doesn't have this form.  Otherwise returns
+    # a closure that runs the loop and returns True, or returns False if
+    # the loop should run the usual way instead (for instance, because an
+    # element would be out of bounds and the error must be reported at the
+    # line of the LET).
+    def compile_fill(self, lineno, instr):
+        loopvar = instr[1]
+        stepexpr = instr[4] if instr[4] else ('NUM', 1)
+        if stepexpr[0] != 'NUM' or type(stepexpr[1]) is not int or stepexpr[1] < 1:
+            return None
+        step = stepexpr[1]
+
+        i = bisect.bisect_left(self.stat, lineno)
+        if i + 2 >= len(self.stat):
+            return None
+        body = self.prog[self.stat[i + 1]]
+        if self.prog[self.stat[i + 2]] != ('NEXT', loopvar) or body[0] != 'LET':
+            return None
+        (var, dim1, dim2), valexpr = body[1], body[2]
+        if not dim1:
+            return None
+
+        # Work out which subscript is the loop variable
+        counter = ('VAR', (loopvar, None, None))
+        if not dim2:
+            otherexpr, rowfill = None, False
+            if dim1 != counter:
+                return None
+        elif dim1 == counter:
+            otherexpr, rowfill = dim2, False
+        elif dim2 == counter:
+            otherexpr, rowfill = dim1, True
+        else:
+            return None
+
+        names = set()
+        if not (self.simple_expr(instr[2], names) and self.simple_expr(valexpr, names)):
+            return None
+        loopnames = set()
+        if not self.simple_expr(instr[3], loopnames):
+            return None
+        if otherexpr and not self.simple_expr(otherexpr, loopnames):
+            return None
+        if loopvar in loopnames:
+            return None
+        names |= loopnames
+        constant = loopvar not in names
+        names.discard(loopvar)
+
+        initval = self.compile_expr(instr[2])
+        finval = self.compile_expr(instr[3])
+        other = self.compile_expr(otherexpr) if otherexpr else None
+        value = self.compile_expr(valexpr)
+        store = self.tables if dim2 else self.lists
+        vars = self.vars
+
+        def fill():
+            start = initval()
+            if type(start) is not int:
+                return False
+            for name in names:
+                if name not in vars:
+                    return False
+            stop = finval()
+            arr = store.get(var)
+            if arr is None:
+                return False
+
+            # Element I is stored at offset + (I-1)*scale
+            if other is None:
+                offset, scale, limit = 0, 1, arr.rows
             else:
-                return 0
-
-        elif etype == '<>':
-            if lhs != rhs:
-                return 1
+                k = other()
+                if type(k) is not int or k < 1 or k > (arr.rows if rowfill else arr.cols):
+                    return False
+                if rowfill:
+                    offset, scale, limit = (k - 1) * arr.cols, 1, arr.cols
+                else:
+                    offset, scale, limit = k - 1, arr.cols, arr.rows
+
+            if start > stop:
+                vars[loopvar] = start
+                return True
+            last = start + int((stop - start) // step) * step
+            if start < 1 or last > limit:
+                return False
+
+            if constant:
+                arr.fill(offset + (start - 1) * scale, offset + (last - 1) * scale + 1,
+                         step * scale, value())
             else:
-                return 0
-
-    # Assignment
-    def assign(self, target, value):
-        var, dim1, dim2 = target
-        if not dim1 and not dim2:
-            self.vars[var] = self.eval(value)
-        elif dim1 and not dim2:
-            # List assignment
-            dim1val = self.eval(dim1)
-            if not var in self.lists:
-                self.lists[var] = [0] * 10
-
-            if dim1val > len(self.lists[var]):
-                print ("DIMENSION TOO LARGE AT LINE %s" % self.stat[self.pc])
-                raise RuntimeError
-            self.lists[var][dim1val - 1] = self.eval(value)
-        elif dim1 and dim2:
-            dim1val = self.eval(dim1)
-            dim2val = self.eval(dim2)
-            if not var in self.tables:
-                temp = [0] * 10
-                v = []
-                for i in range(10):
-                    v.append(temp[:])
-                self.tables[var] = v
-            # Variable already exists
-            if dim1val > len(self.tables[var]) or dim2val > len(self.tables[var][0]):
-                print("DIMENSION TOO LARGE AT LINE %s" % self.stat[self.pc])
-                raise RuntimeError
-            self.tables[var][dim1val - 1][dim2val - 1] = self.eval(value)
-
-    # Change the current line number
-    def goto(self, linenum):
-        if not linenum in self.prog:
-            print("UNDEFINED LINE NUMBER %d AT LINE %d" %
-                  (linenum, self.stat[self.pc]))
-            raise RuntimeError
-        self.pc = self.stat.index(linenum)
+                for n in range(start, last + 1, step):
+                    vars[loopvar] = n
+                    arr.store(offset + (n - 1) * scale, value())
+            vars[loopvar] = last
+            return True
+        return fill
+
+    # NEXT statement
+    def compile_NEXT(self, lineno, instr):
+        nextvar = instr[1]
+        loops = self.loops
+
+        def next_():
+            if not loops:
+                print("NEXT WITHOUT FOR AT LINE %s" % lineno)
+                return -1
+            forlabel, step, forvar = loops[-1]
+            if forvar != nextvar:
+                print("NEXT DOESN'T MATCH FOR AT LINE %s" % lineno)
+                return -1
+            return forlabel[0]
+        return next_
+
+    # GOSUB statement.  Only one level of subroutine call is allowed
+    def compile_GOSUB(self, lineno, instr):
+        jump = self.compile_jump(instr[1])
+        me = self.label(lineno)
+
+        def gosub():
+            if self.gosub is not None:
+                print("ALREADY IN A SUBROUTINE AT LINE %s" % lineno)
+                return -1
+            self.gosub = me[0]
+            return jump()
+        return gosub
+
+    # RETURN statement
+    def compile_RETURN(self, lineno, instr):
+        def return_():
+            if self.gosub is None:
+                print("RETURN WITHOUT A GOSUB AT LINE %s" % lineno)
+                return -1
+            newpc = self.gosub + 1
+            self.gosub = None
+            return newpc
+        return return_
+
+    # DEF statement.  Defines a function when executed
+    def compile_FUNC(self, lineno, instr):
+        fname = instr[1]
+        pname = instr[2]
+        expr = self.compile_expr(instr[3])
+        vars = self.vars
+        functions = self.functions
+        me = self.label(lineno)
+
+        def eval_func(z):
+            vars[pname] = z()
+            return expr()
+
+        def func():
+            functions[fname] = eval_func
+            return me[0] + 1
+        return func
+
+    # DIM statement
+    def compile_DIM(self, lineno, instr):
+        dims = instr[1]
+        lists = self.lists
+        tables = self.tables
+        me = self.label(lineno)
+
+        def dim():
+            for vname, x, y in dims:
+                if y == 0:
+                    # Single dimension variable
+                    lists[vname] = NumArray(x)
+                else:
+                    # Double dimension variable
+                    tables[vname] = NumArray(x, y)
+            return me[0] + 1
+        return dim
 
     # Run it
     def run(self):
-        self.vars = {}            # All variables
-        self.lists = {}            # List variables
-        self.tables = {}            # Tables
-        self.loops = []            # Currently active loops
-        self.loopend = {}            # Mapping saying where loops end
-        self.gosub = None           # Gosub return point (if any)
-        self.error = 0              # Indicates program error
-
-        self.stat = list(self.prog)  # Ordered list of all line numbers
-        self.stat.sort()
+        self.vars.clear()
+        self.lists.clear()
+        self.tables.clear()
+        del self.loops[:]
+        self.gosub = None            # Gosub return point (if any)
+        self.error = 0               # Indicates program error
         self.pc = 0                  # Current program counter
 
         # Processing prior to running
@@ -225,154 +678,21 @@ class BasicInterpreter:
         if self.error:
             raise RuntimeError
 
-        while 1:
-            line = self.stat[self.pc]
-            instr = self.prog[line]
+        self.compile()
 
-            op = instr[0]
-
-            # END and STOP statements
-            if op == 'END' or op == 'STOP':
-                break           # We're done
-
-            # GOTO statement
-            elif op == 'GOTO':
-                newline = instr[1]
-                self.goto(newline)
-                continue
-
-            # PRINT statement
-            elif op == 'PRINT':
-                plist = instr[1]
-                out = ""
-                for label, val in plist:
-                    if out:
-                        out += ' ' * (15 - (len(out) % 15))
-                    out += label
-                    if val:
-                        if label:
-                            out += " "
-                        eval = self.eval(val)
-                        out += str(eval)
-                sys.stdout.write(out)
-                end = instr[2]
-                if not (end == ',' or end == ';'):
-                    sys.stdout.write("\n")
-                if end == ',':
-                    sys.stdout.write(" " * (15 - (len(out) % 15)))
-                if end == ';':
-                    sys.stdout.write(" " * (3 - (len(out) % 3)))
-
-            # LET statement
-            elif op == 'LET':
-                target = instr[1]
-                value = instr[2]
-                self.assign(target, value)
-
-            # READ statement
-            elif op == 'READ':
-                for target in instr[1]:
-                    if self.dc < len(self.data):
-                        value = ('NUM', self.data[self.dc])
-                        self.assign(target, value)
-                        self.dc += 1
-                    else:
-                        # No more data.  Program ends
-                        return
-            elif op == 'IF':
-                relop = instr[1]
-                newline = instr[2]
-                if (self.releval(relop)):
-                    self.goto(newline)
-                    continue
-
-            elif op == 'FOR':
-                loopvar = instr[1]
-                initval = instr[2]
-                finval = instr[3]
-                stepval = instr[4]
-
-                # Check to see if this is a new loop
-                if not self.loops or self.loops[-1][0] != self.pc:
-                    # Looks like a new loop. Make the initial assignment
-                    newvalue = initval
-                    self.assign((loopvar, None, None), initval)
-                    if not stepval:
-                        stepval = ('NUM', 1)
-                    stepval = self.eval(stepval)    # Evaluate step here
-                    self.loops.append((self.pc, stepval))
-                else:
-                    # It's a repeat of the previous loop
-                    # Update the value of the loop variable according to the
-                    # step
-                    stepval = ('NUM', self.loops[-1][1])
-                    newvalue = (
-                        'BINOP', '+', ('VAR', (loopvar, None, None)), stepval)
-
-                if self.loops[-1][1] < 0:
-                    relop = '>='
-                else:
-                    relop = '<='
-                if not self.releval(('RELOP', relop, newvalue, finval)):
-                    # Loop is done. Jump to the NEXT
-                    self.pc = self.loopend[self.pc]
-                    self.loops.pop()
-                else:
-                    self.assign((loopvar, None, None), newvalue)
-
-            elif op == 'NEXT':
-                if not self.loops:
-                    print("NEXT WITHOUT FOR AT LINE %s" % line)
-                    return
-
-                nextvar = instr[1]
-                self.pc = self.loops[-1][0]
-                loopinst = self.prog[self.stat[self.pc]]
-                forvar = loopinst[1]
-                if nextvar != forvar:
-                    print("NEXT DOESN'T MATCH FOR AT LINE %s" % line)
-                    return
-                continue
-            elif op == 'GOSUB':
-                newline = instr[1]
-                if self.gosub:
-                    print("ALREADY IN A SUBROUTINE AT LINE %s" % line)
-                    return
-                self.gosub = self.stat[self.pc]
-                self.goto(newline)
-                continue
-
-            elif op == 'RETURN':
-                if not self.gosub:
-                    print("RETURN WITHOUT A GOSUB AT LINE %s" % line)
-                    return
-                self.goto(self.gosub)
-                self.gosub = None
-
-            elif op == 'FUNC':
-                fname = instr[1]
-                pname = instr[2]
-                expr = instr[3]
-
-                def eval_func(pvalue, name=pname, self=self, expr=expr):
-                    self.assign((pname, None, None), pvalue)
-                    return self.eval(expr)
-                self.functions[fname] = eval_func
-
-            elif op == 'DIM':
-                for vname, x, y in instr[1]:
-                    if y == 0:
-                        # Single dimension variable
-                        self.lists[vname] = [0] * x
-                    else:
-                        # Double dimension variable
-                        temp = [0] * y
-                        v = []
-                        for i in range(x):
-                            v.append(temp[:])
-                        self.tables[vname] = v
-
-            self.pc += 1
+        # Run the program.  Each instruction returns the index of the next
+        # instruction to execute.  If an instruction fails, pc still holds
+        # its index.
+        code = self.code
+        pc = 0
+        try:
+            while pc >= 0:
+                pc = code[pc]()
+        except BasicError as e:
+            print("%s AT LINE %s" % (e, self.stat[pc]))
+            raise RuntimeError
+        finally:
+            self.pc = pc
 
     # Utility functions for program listing
     def expr_str(self, expr):
@@ -402,9 +722,7 @@ class BasicInterpreter:
 
     # Create a program listing
     def list(self):
-        stat = list(self.prog)      # Ordered list of all line numbers
-        stat.sort()
-        for line in stat:
+        for line in self.stat:
             instr = self.prog[line]
             op = instr[0]
             if op in ['END', 'STOP', 'RETURN']:
@@ -482,15 +800,72 @@ class BasicInterpreter:
     # Erase the current program
     def new(self):
         self.prog = {}
+        self.stat = []               # Ordered list of all line numbers
+        self.code = []               # Compiled instructions (None if not compiled)
+        self.labels = {}             # Labels for line numbers
+        self.renumber = False        # Set if labels need to be renumbered
+        self.datalines = []          # Ordered list of DATA line numbers
+        self.data_changed = True     # Set if DATA statements were changed
+        self.ends = []               # Ordered list of END line numbers
+        self.fors = {}               # Ordered FOR line numbers by variable
+        self.nexts = {}              # Ordered NEXT line numbers by variable
+        self.loopend = {}            # Mapping of FOR lines to matching NEXT lines
+        self.loops_changed = set()   # Loop variables with changed FOR/NEXT lines
+
+    # Add or remove the line number of a statement from the bookkeeping
+    # used by the checks done before a program runs
+    def index_statement(self, lineno, stat, add):
+        op = stat[0]
+        if op == 'DATA':
+            lines = self.datalines
+            self.data_changed = True
+        elif op == 'END':
+            lines = self.ends
+        elif op == 'FOR' or op == 'NEXT':
+            table = self.fors if op == 'FOR' else self.nexts
+            lines = table.setdefault(stat[1], [])
+            self.loops_changed.add(stat[1])
+            if op == 'FOR' and not add:
+                self.loopend.pop(lineno, None)
+        else:
+            return
+        if add:
+            bisect.insort(lines, lineno)
+        else:
+            del lines[bisect.bisect_left(lines, lineno)]
 
     # Insert statements
     def add_statements(self, prog):
         for line, stat in prog.items():
+            i = bisect.bisect_left(self.stat, line)
+            if line in self.prog:
+                self.index_statement(line, self.prog[line], False)
+                self.code[i] = None
+            else:
+                self.stat.insert(i, line)
+                self.code.insert(i, None)
+                self.renumber = True
             self.prog[line] = stat
+            self.index_statement(line, stat, True)
+            self.invalidate_fors(i)
 
     # Delete a statement
     def del_line(self, lineno):
-        try:
-            del self.prog[lineno]
-        except KeyError:
-            pass
+        stat = self.prog.pop(lineno, None)
+        if stat is None:
+            return
+        self.index_statement(lineno, stat, False)
+        i = bisect.bisect_left(self.stat, lineno)
+        del self.stat[i]
+        del self.code[i]
+        self.label(lineno)[0] = None
+        self.renumber = True
+        self.invalidate_fors(i)
+
+    # A FOR statement is compiled according to the two lines that follow
+    # it (see compile_fill).  When the line at index i of self.stat is
+    # changed, FOR statements just before it must be compiled again.
+    def invalidate_fors(self, i):
+        for j in range(max(i - 2, 0), i):
+            if self.prog[self.stat[j]][0] == 'FOR':
+                self.code[j] = None
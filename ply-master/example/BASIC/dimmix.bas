@@ -0,0 +1,21 @@
+5 REM Arrays holding both integers and non-integers.  Should print
+6 REM    1   2.5   0
+7 REM    1   0.25  2   4
+8 REM    0.5 0.5   3
+10 DIM A(3), B(2,2)
+20 LET A(1) = 1
+30 LET A(2) = 2.5
+40 PRINT A(1), A(2), A(3)
+50 FOR I = 1 TO 2
+60 FOR J = 1 TO 2
+70   LET B(I,J) = I * J
+80 NEXT J
+90 NEXT I
+100 LET B(1,2) = 1 / 4
+110 PRINT B(1,1), B(1,2), B(2,1), B(2,2)
+120 FOR I = 1 TO 3
+130   LET A(I) = 0.5
+140 NEXT I
+150 LET A(3) = 3
+160 PRINT A(1), A(2), A(3)
+999 END
@@ -42,7 +42,7 @@
 # Modifications for inclusion in PLY distribution
 import sys
 sys.path.insert(0, "../..")
-from ply import *
+from ply import lex, yacc
 
 ##### Lexer ######
 #import lex
@@ -66,7 +66,6 @@ tokens = (
     'MULT',
     'DIV',
     'RETURN',
-    'WS',
     'NEWLINE',
     'COMMA',
     'SEMICOLON',
@@ -120,9 +119,7 @@ def t_NAME(t):
     t.type = RESERVED.get(t.value, "NAME")
     return t
 
-# Putting this before t_WS let it consume lines with only comments in
-# them so the latter code never sees the WS part.  Not consuming the
-# newline.  Needed for "if 1: #comment"
+# Not consuming the newline.  Needed for "if 1: #comment"
 
 
 def t_comment(t):
@@ -130,11 +127,9 @@ def t_comment(t):
     pass
 
 
-# Whitespace
-def t_WS(t):
-    r'[ ]+'
-    if t.lexer.at_line_start and t.lexer.paren_count == 0:
-        return t
+# Whitespace.  The indentation of a line is worked out from the position
+# of its first token (see IndentLexer), so no WS tokens are needed.
+t_ignore = ' '
 
 # Don't generate newline tokens when inside of parenthesis, eg
 #   a = (1,
@@ -167,16 +162,18 @@ def t_error(t):
     print("Skipping", repr(t.value[0]))
     t.lexer.skip(1)
 
-# I implemented INDENT / DEDENT generation as a post-processing filter
+# INDENT / DEDENT generation is done by IndentLexer, which sits on top
+# of the Ply lexer and tracks the indentation in a single pass over the
+# token stream.
 
-# The original lex token stream contains WS and NEWLINE characters.
-# WS will only occur before any other tokens on a line.
+# The lex token stream contains NEWLINE tokens but no whitespace.  The
+# indentation of a line is the distance from the end of the previous
+# NEWLINE to the first token on the line.
 
-# I have three filters.  One tags tokens by adding two attributes.
-# "must_indent" is True if the token must be indented from the
-# previous code.  The other is "at_line_start" which is True for WS
-# and the first non-WS/non-NEWLINE on a line.  It flags the check so
-# see if the new line has changed indication level.
+# For each token, IndentLexer works out two things.  "must_indent" is
+# True if the token must be indented from the previous code.
+# "at_line_start" is True for the first non-NEWLINE on a line.  It flags
+# the check to see if the new line has changed indentation level.
 
 # Python's syntax has three INDENT states
 #  0) no colon hence no need to indent
@@ -186,44 +183,6 @@ NO_INDENT = 0
 MAY_INDENT = 1
 MUST_INDENT = 2
 
-# only care about whitespace at the start of a line
-
-
-def track_tokens_filter(lexer, tokens):
-    lexer.at_line_start = at_line_start = True
-    indent = NO_INDENT
-    saw_colon = False
-    for token in tokens:
-        token.at_line_start = at_line_start
-
-        if token.type == "COLON":
-            at_line_start = False
-            indent = MAY_INDENT
-            token.must_indent = False
-
-        elif token.type == "NEWLINE":
-            at_line_start = True
-            if indent == MAY_INDENT:
-                indent = MUST_INDENT
-            token.must_indent = False
-
-        elif token.type == "WS":
-            assert token.at_line_start == True
-            at_line_start = True
-            token.must_indent = False
-
-        else:
-            # A real token; only indent after COLON NEWLINE
-            if indent == MUST_INDENT:
-                token.must_indent = True
-            else:
-                token.must_indent = False
-            at_line_start = False
-            indent = NO_INDENT
-
-        yield token
-        lexer.at_line_start = at_line_start
-
 
 def _new_token(type, lineno):
     tok = lex.LexToken()
@@ -246,117 +205,124 @@ def INDENT(lineno):
     return _new_token("INDENT", lineno)
 
 
-# Track the indentation level and emit the right INDENT / DEDENT events.
-def indentation_filter(tokens):
-    # A stack of indentation levels; will never pop item 0
-    levels = [0]
-    token = None
-    depth = 0
-    prev_was_ws = False
-    for token in tokens:
-        # if 1:
-        # print "Process", token,
-        # if token.at_line_start:
-        # print "at_line_start",
-        # if token.must_indent:
-        # print "must_indent",
-        # print
-
-        # WS only occurs at the start of the line
-        # There may be WS followed by NEWLINE so
-        # only track the depth here.  Don't indent/dedent
-        # until there's something real.
-        if token.type == "WS":
-            assert depth == 0
-            depth = len(token.value)
-            prev_was_ws = True
-            # WS tokens are never passed to the parser
-            continue
-
-        if token.type == "NEWLINE":
-            depth = 0
-            if prev_was_ws or token.at_line_start:
-                # ignore blank lines
-                continue
-            # pass the other cases on through
-            yield token
-            continue
-
-        # then it must be a real token (not WS, not NEWLINE)
-        # which can affect the indentation level
-
-        prev_was_ws = False
-        if token.must_indent:
-            # The current depth must be larger than the previous level
-            if not (depth > levels[-1]):
-                raise IndentationError("expected an indented block")
-
-            levels.append(depth)
-            yield INDENT(token.lineno)
-
-        elif token.at_line_start:
-            # Must be on the same level or one of the previous levels
-            if depth == levels[-1]:
-                # At the same level
-                pass
-            elif depth > levels[-1]:
-                raise IndentationError(
-                    "indentation increase but not in new block")
-            else:
-                # Back up; but only if it matches a previous level
-                try:
-                    i = levels.index(depth)
-                except ValueError:
-                    raise IndentationError("inconsistent indentation")
-                for _ in range(i + 1, len(levels)):
-                    yield DEDENT(token.lineno)
-                    levels.pop()
-
-        yield token
-
-    ### Finished processing ###
-
-    # Must dedent any remaining levels
-    if len(levels) > 1:
-        assert token is not None
-        for _ in range(1, len(levels)):
-            yield DEDENT(token.lineno)
-
-
-# The top-level filter adds an ENDMARKER, if requested.
-# Python's grammar uses it.
-def filter(lexer, add_endmarker=True):
-    token = None
-    tokens = iter(lexer.token, None)
-    tokens = track_tokens_filter(lexer, tokens)
-    for token in indentation_filter(tokens):
-        yield token
+# Building the Ply lexer is expensive, so it is only done once for each
+# combination of options.  Each IndentLexer gets a clone of it.
+_lexers = {}
 
-    if add_endmarker:
-        lineno = 1
-        if token is not None:
-            lineno = token.lineno
-        yield _new_token("ENDMARKER", lineno)
 
-# Combine Ply and my filters into a new lexer
+def _get_lexer(debug, reflags):
+    lexer = _lexers.get((debug, reflags))
+    if lexer is None:
+        lexer = _lexers[debug, reflags] = lex.lex(debug=debug, reflags=reflags)
+    return lexer.clone()
 
 
+# Combine Ply and indentation tracking into a new lexer.  token()
+# returns INDENT and DEDENT tokens as needed and adds an ENDMARKER at
+# the end of the input, if requested.  Python's grammar uses it.
 class IndentLexer(object):
 
     def __init__(self, debug=0, reflags=0):
-        self.lexer = lex.lex(debug=debug, reflags=reflags)
-        self.token_stream = None
+        self.lexer = _get_lexer(debug, reflags)
+        self.input("", False)
 
     def input(self, s, add_endmarker=True):
         self.lexer.paren_count = 0
         self.lexer.input(s)
-        self.token_stream = filter(self.lexer, add_endmarker)
+        self.add_endmarker = add_endmarker
+        self.at_line_start = True    # Next token starts a line
+        self.indent = NO_INDENT      # Indentation state (see above)
+        self.levels = [0]            # Stack of indentation levels; never pops item 0
+        self.linestart = 0           # Position where the current line starts
+        self.pending = []            # Tokens waiting to be returned (in reverse)
+        self.lastlineno = None       # Line of the last token from the lexer
+        self.lineno = 1              # Line of the last token returned
+        self.done = False
 
     def token(self):
-        try:
-            return next(self.token_stream)
-        except StopIteration:
+        if self.pending:
+            tok = self.pending.pop()
+            self.lineno = tok.lineno
+            return tok
+
+        lexer = self.lexer
+        levels = self.levels
+        while True:
+            tok = lexer.token()
+            if tok is None:
+                return self.finish()
+            self.lastlineno = tok.lineno
+            ttype = tok.type
+            at_line_start = self.at_line_start
+
+            if ttype == "NEWLINE":
+                self.at_line_start = True
+                if self.indent == MAY_INDENT:
+                    self.indent = MUST_INDENT
+                self.linestart = tok.lexpos + len(tok.value)
+                if at_line_start:
+                    # ignore blank lines
+                    continue
+                # pass the other cases on through
+                self.lineno = tok.lineno
+                return tok
+
+            # then it must be a real token (not NEWLINE)
+            # which can affect the indentation level.  Only indent
+            # after COLON NEWLINE
+            if ttype == "COLON":
+                must_indent = False
+                self.indent = MAY_INDENT
+            else:
+                must_indent = self.indent == MUST_INDENT
+                self.indent = NO_INDENT
+            self.at_line_start = False
+            depth = tok.lexpos - self.linestart
+
+            if must_indent:
+                # The current depth must be larger than the previous level
+                if not (depth > levels[-1]):
+                    raise IndentationError("expected an indented block")
+
+                levels.append(depth)
+                self.pending.append(tok)
+                tok = INDENT(tok.lineno)
+
+            elif at_line_start and depth != levels[-1]:
+                # Must be on the same level or one of the previous levels
+                if depth > levels[-1]:
+                    raise IndentationError(
+                        "indentation increase but not in new block")
+                # Back up; but only if it matches a previous level
+                try:
+                    i = levels.index(depth)
+                except ValueError:
+                    raise IndentationError("inconsistent indentation")
+                self.pending.append(tok)
+                for _ in range(i + 2, len(levels)):
+                    self.pending.append(DEDENT(tok.lineno))
+                del levels[i + 1:]
+                tok = DEDENT(tok.lineno)
+
+            self.lineno = tok.lineno
+            return tok
+
+    # Called at the end of the input.  Must dedent any remaining levels
+    # and then add the ENDMARKER.
+    def finish(self):
+        if self.done:
+            return None
+        self.done = True
+        tokens = [DEDENT(self.lastlineno) for _ in range(1, len(self.levels))]
+        del self.levels[1:]
+        if self.add_endmarker:
+            lineno = tokens[-1].lineno if tokens else self.lineno
+            tokens.append(_new_token("ENDMARKER", lineno))
+        if not tokens:
             return None
+        tokens.reverse()
+        self.pending = tokens
+        return self.token()
 
 ##########   Parser (tokens -> AST) ######
 
@@ -417,7 +383,7 @@ def p_file_input(p):
 # ignoring decorators
 def p_funcdef(p):
     "funcdef : DEF NAME parameters COLON suite"
-    p[0] = ast.FunctionDef(p[2], args=ast.arguments([ast.arg(x, None) for x in p[3]], None, [], [], None, []), body=p[5], decorator_list=[], returns=None)
+    p[0] = ast.FunctionDef(p[2], args=ast.arguments(posonlyargs=[], args=[ast.arg(x, None) for x in p[3]], vararg=None, kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[]), body=p[5], decorator_list=[], returns=None)
 
 # parameters: '(' [varargslist] ')'
 
@@ -704,7 +670,7 @@ class GardenSnakeParser(object):
     def parse(self, code):
         self.lexer.input(code)
         result = self.parser.parse(lexer=self.lexer)
-        return ast.Module(result)
+        return ast.Module(result, type_ignores=[])
 
 
 ###### Code generation ######
@@ -114,6 +114,7 @@ def t_error(t):
     return t
 
 import re
+import io
 import copy
 import time
 import os.path
@@ -151,6 +152,52 @@ _trigraph_rep = {
 def trigraph(input):
     return _trigraph_pat.sub(lambda g: _trigraph_rep[g.group()[-1]],input)
 
+# -----------------------------------------------------------------------------
+# physical_lines()
+#
+# Given an input string or an iterable producing lines of text (such as an
+# open file), this generator produces the physical lines of the input one at
+# a time with line terminators and trailing whitespace removed.  Trigraph
+# replacement is applied per line.  Trigraphs never span a line boundary so
+# this is equivalent to replacing them over the whole input at once.
+# -----------------------------------------------------------------------------
+
+def physical_lines(input):
+    if isinstance(input,STRING_TYPES):
+        input = io.StringIO(input, newline=None)
+    for line in input:
+        yield trigraph(line.rstrip())
+
+# -----------------------------------------------------------------------------
+# _comment_open()
+#
+# Scans a line of text and reports whether a /* ... */ comment is still open
+# at the end of it.  incomment indicates whether the line starts inside of a
+# comment.  String and character literals are skipped so that comment
+# delimiters appearing within them are ignored.
+# -----------------------------------------------------------------------------
+
+_comment_scan = re.compile(r'/\*|\*/|//|"(?:[^"\\]|\\.)*"?|\'(?:[^\'\\]|\\.)*\'?')
+
+def _comment_open(line,incomment):
+    pos = 0
+    while True:
+        if incomment:
+            end = line.find('*/',pos)
+            if end < 0:
+                return True
+            pos = end + 2
+            incomment = False
+        m = _comment_scan.search(line,pos)
+        if not m:
+            return False
+        tok = m.group()
+        if tok == '/*':
+            incomment = True
+        elif tok == '//':
+            return False
+        pos = m.end()
+
 # ------------------------------------------------------------------
 # Macro object
 #
@@ -297,38 +344,80 @@ class Preprocessor(object):
     def add_path(self,path):
         self.path.append(path)
 
+    # ----------------------------------------------------------------------
+    # logical_lines()
+    #
+    # Given an input string or an iterable of lines, this generator splices
+    # together any lines ending with \ and produces the resulting logical lines
+    # one at a time.  Each logical line is terminated by a newline for every
+    # physical line that was consumed so that line numbering is preserved.  The
+    # final line of input is not given a terminating newline.  A logical line
+    # that leaves a /* comment open is joined with the lines that follow it
+    # until the comment is closed so that comments can be tokenized whole.
+    # Lines are spliced by collecting pieces in a list, so the cost is linear
+    # in the length of a continuation chain.
+    # ----------------------------------------------------------------------
+
+    def logical_lines(self,input):
+        chunk = []              # Logical lines held while a comment is open
+        splice = []             # Physical lines being spliced together
+        incomment = False
+        pending = None          # Completed text held back by one line
+        for line in physical_lines(input):
+            if pending is not None:
+                yield pending
+                pending = None
+            if line.endswith('\\'):
+                splice.append(line[:-1])
+                continue
+            splice.append(line)
+            text = "".join(splice)
+            incomment = _comment_open(text,incomment)
+            chunk.append(text)
+            chunk.append("\n" * len(splice))
+            splice = []
+            if not incomment:
+                pending = "".join(chunk)
+                chunk = []
+
+        # The last line of input does not get a terminating newline
+        if pending is None:
+            pending = "".join(chunk) + "".join(splice)
+        if pending.endswith("\n"):
+            pending = pending[:-1]
+        if pending:
+            yield pending
+
     # ----------------------------------------------------------------------
     # group_lines()
     #
-    # Given an input string, this function splits it into lines.  Trailing whitespace
-    # is removed.   Any line ending with \ is grouped with the next line.  This
+    # Given an input string or an iterable of lines, this function produces
+    # lists of tokens, one for each line of text.  Trailing whitespace is
+    # removed.   Any line ending with \ is grouped with the next line.  This
     # function forms the lowest level of the preprocessor---grouping into text into
-    # a line-by-line format.
+    # a line-by-line format.   Input is read and tokenized incrementally so
+    # memory use is bounded by the length of the longest logical line.
     # ----------------------------------------------------------------------
 
     def group_lines(self,input):
         lex = self.lexer.clone()
-        lines = [x.rstrip() for x in input.splitlines()]
-        for i in xrange(len(lines)):
-            j = i+1
-            while lines[i].endswith('\\') and (j < len(lines)):
-                lines[i] = lines[i][:-1]+lines[j]
-                lines[j] = ""
-                j += 1
-
-        input = "\n".join(lines)
-        lex.input(input)
         lex.lineno = 1
+        t_WS = self.t_WS
+        offset = 0
 
         current_line = []
-        while True:
-            tok = lex.token()
-            if not tok:
-                break
-            current_line.append(tok)
-            if tok.type in self.t_WS and '\n' in tok.value:
-                yield current_line
-                current_line = []
+        for text in self.logical_lines(input):
+            lex.input(text)
+            while True:
+                tok = lex.token()
+                if not tok:
+                    break
+                tok.lexpos += offset
+                current_line.append(tok)
+                if tok.type in t_WS and '\n' in tok.value:
+                    yield current_line
+                    current_line = []
+            offset += len(text)
 
         if current_line:
             yield current_line
@@ -659,16 +748,46 @@ class Preprocessor(object):
             result = 0
         return result
 
+    # ----------------------------------------------------------------------
+    # macro_pending()
+    #
+    # Given a list of tokens, this function determines whether the list might
+    # end in the middle of a call to a macro with arguments.  That is the case
+    # if the parentheses are unbalanced or if the last token is the name of such
+    # a macro (the arguments may start on the next line).  The depth argument
+    # is the parenthesis nesting level at the start of the tokens. Returns a
+    # tuple (pending, depth) with the nesting level at the end.
+    # ----------------------------------------------------------------------
+
+    def macro_pending(self,tokens,depth=0):
+        last = None
+        for tok in tokens:
+            if tok.type in self.t_WS:
+                continue
+            if tok.value == '(':
+                depth += 1
+            elif tok.value == ')' and depth > 0:
+                depth -= 1
+            last = tok
+        if depth:
+            return True, depth
+        if last is not None and last.type == self.t_ID:
+            m = self.macros.get(last.value)
+            if m is not None and m.arglist:
+                return True, depth
+        return False, depth
+
     # ----------------------------------------------------------------------
     # parsegen()
     #
-    # Parse an input string/
+    # Parse an input string or an iterable producing lines of text.  Tokens
+    # of normal text are expanded and produced as soon as each line has been
+    # read.  Lines are only held back while they might contain an incomplete
+    # call to a macro with arguments.
     # ----------------------------------------------------------------------
     def parsegen(self,input,source=None):
 
-        # Replace trigraph sequences
-        t = trigraph(input)
-        lines = self.group_lines(t)
+        lines = self.group_lines(input)
 
         if not source:
             source = ""
@@ -677,6 +796,7 @@ class Preprocessor(object):
 
         self.source = source
         chunk = []
+        depth = 0
         enable = True
         iftrigger = False
         ifstack = []
@@ -705,12 +825,14 @@ class Preprocessor(object):
                         for tok in self.expand_macros(chunk):
                             yield tok
                         chunk = []
+                        depth = 0
                         self.define(args)
                 elif name == 'include':
                     if enable:
                         for tok in self.expand_macros(chunk):
                             yield tok
                         chunk = []
+                        depth = 0
                         oldfile = self.macros['__FILE__']
                         for tok in self.include(args):
                             yield tok
@@ -721,6 +843,7 @@ class Preprocessor(object):
                         for tok in self.expand_macros(chunk):
                             yield tok
                         chunk = []
+                        depth = 0
                         self.undef(args)
                 elif name == 'ifdef':
                     ifstack.append((enable,iftrigger))
@@ -784,6 +907,11 @@ class Preprocessor(object):
                 # Normal text
                 if enable:
                     chunk.extend(x)
+                    pending, depth = self.macro_pending(x,depth)
+                    if not pending:
+                        for tok in self.expand_macros(chunk):
+                            yield tok
+                        chunk = []
 
         for tok in self.expand_macros(chunk):
             yield tok
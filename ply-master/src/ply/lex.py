@@ -34,11 +34,14 @@
 # -----------------------------------------------------------------------------
 
 import re
+import bisect
 import sys
 import types
 import copy
+import itertools
 import os
 import inspect
+import threading
 
 # This tuple contains acceptable string types
 StringTypes = (str, bytes)
@@ -46,6 +49,11 @@ StringTypes = (str, bytes)
 # This regular expression is used to match valid token names
 _is_identifier = re.compile(r'^[a-zA-Z0-9_]+$')
 
+# Signatures of lexer specifications that have already passed validation.
+# lex(optimize=True) skips validation for these.  This only lasts for the
+# lifetime of the process.
+_validated_specs = set()
+
 # Exception thrown when invalid token encountered and no default error
 # handler is defined.
 class LexError(Exception):
@@ -86,6 +94,10 @@ class PlyLogger(object):
 #    input()          -  Store a new string in the lexer
 #    token()          -  Get the next token
 #    clone()          -  Clone the lexer
+#    relex()          -  Lex the input again after an edit
+#    adjust()         -  Update the position of a token after relex()
+#    checkpoint()     -  Save the state of the lexer
+#    restore()        -  Restore a state saved by checkpoint()
 #
 #    lineno           -  Current line number
 #    lexpos           -  Current position in the input string
@@ -97,10 +109,14 @@ class Lexer:
                                       # tuples (re, findex) where re is a compiled
                                       # regular expression and findex is a list
                                       # mapping regex group numbers to rules
+        self.lexreinclude = ()        # Master regexs of INITIAL, tried after lexre
+                                      # in inclusive states
         self.lexretext = None         # Current regular expression strings
         self.lexstatere = {}          # Dictionary mapping lexer states to master regexs
         self.lexstateretext = {}      # Dictionary mapping lexer states to regex strings
         self.lexstaterenames = {}     # Dictionary mapping lexer states to symbol names
+        self.lexstaterules = {}       # Dictionary mapping lexer states to the rules used
+                                      # to build their master regexs (see compile_state)
         self.lexstate = 'INITIAL'     # Current lexer state
         self.lexstatestack = []       # Stack of lexer states
         self.lexstateinfo = None      # State information
@@ -118,9 +134,25 @@ class Lexer:
         self.lexliterals = ''         # Literal characters that can be passed through
         self.lexmodule = None         # Module
         self.lineno = 1               # Current line number
+        self.lexrelex = False         # Record state changes for relex()
+        self.lexstatelog = None       # State changes as (lexpos, state, stack, lineno)
+        self.lexshifts = []           # Position shifts not yet applied by adjust()
+        self.lexshiftbase = 0         # Number of shifts already applied to all tokens
 
+    # ------------------------------------------------------------
+    # clone() - Clone the lexer
+    #
+    # The clone gets its own copies of the state stack and the lists
+    # kept for relex(), so that neither lexer changes the other's.
+    # They are short, except for the state log, which is only kept
+    # if lexrelex is set.  The original lexer is left untouched.
+    # ------------------------------------------------------------
     def clone(self, object=None):
         c = copy.copy(self)
+        c.lexstatestack = list(self.lexstatestack)
+        c.lexshifts = list(self.lexshifts)
+        if self.lexstatelog is not None:
+            c.lexstatelog = list(self.lexstatelog)
 
         # If the object parameter has been supplied, it means we are attaching the
         # lexer to a new object.  In this case, we have to rebind all methods in
@@ -143,6 +175,14 @@ class Lexer:
             c.lexstateerrorf = {}
             for key, ef in self.lexstateerrorf.items():
                 c.lexstateerrorf[key] = getattr(object, ef.__name__)
+            c.lexstaterules = {}
+            for key, (relist, handles, toknames) in self.lexstaterules.items():
+                newhandles = {}
+                for name, handle in handles.items():
+                    if isinstance(handle, (types.FunctionType, types.MethodType)):
+                        handle = getattr(object, handle.__name__)
+                    newhandles[name] = handle
+                c.lexstaterules[key] = (relist, newhandles, toknames)
             c.lexmodule = object
         return c
 
@@ -153,19 +193,61 @@ class Lexer:
         self.lexdata = s
         self.lexpos = 0
         self.lexlen = len(s)
+        self._reset_log()
+
+    # Start a new state log, if lexrelex is set, and forget the shifts
+    # made by relex()
+    def _reset_log(self):
+        if self.lexrelex:
+            self.lexstatelog = [(0, self.lexstate, tuple(self.lexstatestack), self.lineno)]
+        else:
+            self.lexstatelog = None
+        self.lexshifts = []
+        self.lexshiftbase = 0
 
     # ------------------------------------------------------------
     # begin() - Changes the lexing state
     # ------------------------------------------------------------
     def begin(self, state):
-        if state not in self.lexstatere:
-            raise ValueError(f'Undefined state {state!r}')
-        self.lexre = self.lexstatere[state]
+        lexre = self.lexstatere.get(state)
+        if lexre is None:
+            if state not in self.lexstaterules:
+                raise ValueError(f'Undefined state {state!r}')
+            lexre = self.compile_state(state)
+        self.lexre = lexre
+        if state != 'INITIAL' and self.lexstateinfo[state] == 'inclusive':
+            self.lexreinclude = self.lexstatere['INITIAL']
+        else:
+            self.lexreinclude = ()
         self.lexretext = self.lexstateretext[state]
         self.lexignore = self.lexstateignore.get(state, '')
         self.lexerrorf = self.lexstateerrorf.get(state, None)
         self.lexeoff = self.lexstateeoff.get(state, None)
         self.lexstate = state
+        if self.lexstatelog is not None:
+            self.lexstatelog.append((self.lexpos, state, tuple(self.lexstatestack), self.lineno))
+
+    # ------------------------------------------------------------
+    # compile_state() - Builds the master regexs for a state
+    #
+    # The master regexs of a state are only built the first time the
+    # state is entered.  Lexers often have states that are rarely used
+    # (comments, code blocks, etc.), so there is no point in compiling
+    # them up front.  The regexs of an inclusive state only hold its own
+    # rules.  token() tries the regexs of INITIAL after them, so INITIAL
+    # is compiled along with the state.  Compiled regexs are stored in
+    # dictionaries shared with any clones of the lexer.
+    # ------------------------------------------------------------
+    def compile_state(self, state):
+        relist, handles, toknames = self.lexstaterules[state]
+        lexre, re_text, re_names = _form_master_re(relist, self.lexreflags, handles, toknames)
+        if state != 'INITIAL' and self.lexstateinfo[state] == 'inclusive':
+            if 'INITIAL' not in self.lexstatere:
+                self.compile_state('INITIAL')
+        self.lexstateretext[state] = re_text
+        self.lexstaterenames[state] = re_names
+        self.lexstatere[state] = lexre
+        return lexre
 
     # ------------------------------------------------------------
     # push_state() - Changes the lexing state and saves old on stack
@@ -186,6 +268,226 @@ class Lexer:
     def current_state(self):
         return self.lexstate
 
+    # ------------------------------------------------------------
+    # relex() - Lex the input again after an edit
+    #
+    # Replaces lexdata[start:end] with text and updates tokens, the
+    # list of tokens produced from the old input.  Lexing restarts at
+    # the last token before the edit, in the lexer state recorded for
+    # that position.  The states are only recorded if lexrelex was set
+    # before input() was called.  It stops as
+    # soon as a new token matches an old token after the edit, with
+    # the same type, value, shifted position and lexer state.  The
+    # remaining old tokens are reused as they are.
+    #
+    # The positions of the reused tokens are not changed right away,
+    # since that would take time proportional to the size of the
+    # input.  Instead, the shift is recorded and applied by adjust()
+    # when the token is needed.  After relex(), pass any old token to
+    # adjust() before looking at its lexpos or lineno.  The old token
+    # list is updated in place and returned.  relexrange is set to
+    # (a, b, n), meaning that the old tokens[a:b] were replaced by n
+    # new tokens.
+    # ------------------------------------------------------------
+    def relex(self, tokens, start, end, text):
+        if self.lexstatelog is None:
+            raise ValueError('relex() needs lexrelex to be set before input() is called')
+        adjust = self.adjust
+        log = self.lexstatelog
+        data = self.lexdata[:start] + text + self.lexdata[end:]
+        delta = len(text) - (end - start)
+        endlineno = self.lineno
+
+        # Find the first token at or after the start of the edit
+        lo, hi = 0, len(tokens)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if adjust(tokens[mid]).lexpos < start:
+                lo = mid + 1
+            else:
+                hi = mid
+        b = lo
+        while b < len(tokens) and adjust(tokens[b]).lexpos < end:
+            b += 1
+
+        # Restart with the token before it, which may be joined to the edit
+        if lo:
+            a = lo - 1
+            lexpos = tokens[a].lexpos
+            lineno = tokens[a].lineno
+        else:
+            a = lexpos = 0
+            lineno = log[0][3]
+
+        k = _find_state(log, lexpos)
+        oldlog = log[k+1:]
+        del log[k+1:]
+        self.lexdata = data
+        self.lexlen = len(data)
+        self.lexpos = lexpos
+        self.lineno = lineno
+        _, state, stack, _ = log[k]
+        self.lexstatestack = list(stack)
+        self.begin(state)
+        del log[k+1:]
+
+        # Lex until a token matches an old token after the edit
+        oldstates = log[k:k+1] + oldlog
+        newtokens = []
+        editend = start + len(text)
+        for tok in self:
+            if tok.lexpos >= editend:
+                while b < len(tokens) and adjust(tokens[b]).lexpos + delta < tok.lexpos:
+                    b += 1
+                if b < len(tokens):
+                    old = tokens[b]
+                    if (old.lexpos + delta == tok.lexpos and old.type == tok.type and old.value == tok.value and
+                        _state_at(log, tok.lexpos) == _state_at(oldstates, old.lexpos)):
+                        break
+            newtokens.append(tok)
+        else:
+            b = len(tokens)
+            old = None
+
+        if old is not None:
+            # Reuse the old tokens and state changes after the match
+            lines = tok.lineno - old.lineno
+            while log[-1][0] > tok.lexpos:
+                log.pop()
+            for lexpos, state, stack, lineno in oldlog:
+                if lexpos > old.lexpos:
+                    log.append((lexpos + delta, state, stack, lineno + lines))
+            if delta or lines:
+                self.lexshifts.append((old.lexpos, delta, lines))
+            self.lexpos = self.lexlen
+            self.lineno = endlineno + lines
+            _, state, stack, _ = log[-1]
+            self.lexstatestack = list(stack)
+            self.begin(state)
+            log.pop()
+
+        # Old tokens at the start that didn't change are kept
+        i = 0
+        while (i < len(newtokens) and a < b and newtokens[i].type == tokens[a].type and
+               newtokens[i].value == tokens[a].value and newtokens[i].lexpos == tokens[a].lexpos and
+               newtokens[i].lineno == tokens[a].lineno):
+            i += 1
+            a += 1
+        del newtokens[:i]
+
+        shift = self.lexshiftbase + len(self.lexshifts)
+        for tok in newtokens:
+            tok.lexshift = shift
+
+        self.relexrange = (a, b, len(newtokens))
+        tokens[a:b] = newtokens
+
+        # Apply the shifts to all tokens once in a while.  On long inputs,
+        # more shifts are allowed to pile up before paying for a full pass.
+        n = len(self.lexshifts)
+        if n >= 64 and n * n >= len(tokens):
+            self._apply_shifts(tokens)
+        return tokens
+
+    # Apply all of the shifts recorded by relex() to a list of tokens.
+    # Tokens that haven't been adjusted since the last time form a sorted
+    # run, so each shift applies to a suffix of them that can be found by
+    # binary search.  They are then updated in one pass.
+    def _apply_shifts(self, tokens):
+        base = self.lexshiftbase
+        old = []
+        for tok in tokens:
+            if getattr(tok, 'lexshift', 0) == base:
+                old.append(tok)
+            else:
+                self.adjust(tok)
+
+        # starts holds the index in old where each shift begins, in order,
+        # and offsets[j] is the sum of the first j shifts in starts.
+        starts = []
+        shifts = []
+        offsets = [0]
+        for pos, delta, lines in self.lexshifts:
+            lo, hi = 0, len(old)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if old[mid].lexpos + offsets[bisect.bisect_right(starts, mid)] < pos:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            j = bisect.bisect_right(starts, lo)
+            starts.insert(j, lo)
+            shifts.insert(j, (delta, lines))
+            offsets.insert(j + 1, offsets[j])
+            for k in range(j + 1, len(offsets)):
+                offsets[k] += delta
+
+        shift = base + len(self.lexshifts)
+        delta = lines = 0
+        starts.append(len(old))
+        shifts.append((0, 0))
+        start = 0
+        for end, (d, l) in zip(starts, shifts):
+            for tok in old[start:end]:
+                tok.lexpos += delta
+                tok.lineno += lines
+                tok.lexshift = shift
+            delta += d
+            lines += l
+            start = end
+        self.lexshiftbase = shift
+        self.lexshifts = []
+
+    # ------------------------------------------------------------
+    # adjust() - Apply the shifts recorded by relex() to a token
+    # ------------------------------------------------------------
+    def adjust(self, tok):
+        n = getattr(tok, 'lexshift', 0) - self.lexshiftbase
+        shifts = self.lexshifts
+        if n < len(shifts):
+            lexpos = tok.lexpos
+            lineno = tok.lineno
+            for pos, delta, lines in shifts[n:]:
+                if lexpos >= pos:
+                    lexpos += delta
+                    lineno += lines
+            tok.lexpos = lexpos
+            tok.lineno = lineno
+            tok.lexshift = self.lexshiftbase + len(shifts)
+        return tok
+
+    # ------------------------------------------------------------
+    # checkpoint() - Save the state of the lexer
+    #
+    # Returns a tuple holding the input, position, line number, lexing
+    # state and state stack.  It can be passed to restore() any number
+    # of times, on this lexer or on a clone of it.  Attributes set on the
+    # lexer by the user's own rules aren't included.
+    # ------------------------------------------------------------
+    def checkpoint(self):
+        return (self.lexdata, self.lexpos, self.lineno, self.lexstate, tuple(self.lexstatestack))
+
+    # ------------------------------------------------------------
+    # restore() - Restore a state saved by checkpoint()
+    # ------------------------------------------------------------
+    def restore(self, checkpoint):
+        lexdata, lexpos, lineno, state, stack = checkpoint
+        self.lexpos = lexpos
+        self.lineno = lineno
+        self.lexstatestack = list(stack)
+        if lexdata is not self.lexdata:
+            # The state changes before the checkpoint aren't known
+            self.lexdata = lexdata
+            self.lexlen = len(lexdata) if lexdata is not None else 0
+            self.lexstate = state
+            self._reset_log()
+        log = self.lexstatelog
+        if log is not None:
+            del log[_find_state(log, lexpos)+1:]
+        self.begin(state)
+        if log is not None and len(log) > 1 and log[-2][1:3] == log[-1][1:3]:
+            log.pop()
+
     # ------------------------------------------------------------
     # skip() - Skip ahead n characters
     # ------------------------------------------------------------
@@ -212,8 +514,12 @@ class Lexer:
                 lexpos += 1
                 continue
 
-            # Look for a regular expression match
-            for lexre, lexindexfunc in self.lexre:
+            # Look for a regular expression match, falling through to the
+            # INITIAL state in inclusive states
+            lexres = self.lexre
+            if self.lexreinclude:
+                lexres = itertools.chain(lexres, self.lexreinclude)
+            for lexre, lexindexfunc in lexres:
                 m = lexre.match(lexdata, lexpos)
                 if not m:
                     continue
@@ -313,6 +619,100 @@ class Lexer:
             raise StopIteration
         return t
 
+    # ------------------------------------------------------------
+    # tokens_async() - Asynchronously tokenize a stream
+    #
+    # An async iterator over the tokens of data read from an
+    # asyncio.StreamReader (or any object with an awaitable read()
+    # method).  Bytes are decoded incrementally, so multi-byte
+    # characters may be split between reads.
+    #
+    # Text is only passed to the lexer up to the last occurrence of
+    # boundary in the data received so far.  The rest is kept until more
+    # data arrives.  Tokens must not span a boundary.  The lexpos of each
+    # token is adjusted to be an offset in the whole stream.  The
+    # t_eof() rule is only called at the end of the stream.
+    #
+    # To avoid starving other tasks when data arrives faster than it can
+    # be lexed, control is given back to the event loop every few
+    # thousand tokens.
+    # ------------------------------------------------------------
+    async def tokens_async(self, reader, encoding='utf-8', boundary='\n', chunksize=65536):
+        import asyncio
+        import codecs
+
+        decoder = codecs.getincrementaldecoder(encoding)()
+        eoff = self.lexeoff
+        buffer = ''
+        offset = 0
+        count = 0
+        eof = False
+        try:
+            while not eof:
+                data = await reader.read(chunksize)
+                eof = not data
+                if not isinstance(data, str):
+                    data = decoder.decode(data, eof)
+                buffer += data
+                if eof:
+                    end = len(buffer)
+                    self.lexeoff = eoff
+                else:
+                    end = buffer.rfind(boundary)
+                    if end < 0:
+                        continue
+                    end += len(boundary)
+                    self.lexeoff = None
+
+                self.input(buffer[:end])
+                buffer = buffer[end:]
+                for tok in self:
+                    tok.lexpos += offset
+                    yield tok
+                    count += 1
+                    if count == 4096:
+                        count = 0
+                        await asyncio.sleep(0)
+                offset += end
+        finally:
+            self.lexeoff = eoff
+
+# Return the index of the entry of a state log in effect at lexpos
+def _find_state(log, lexpos):
+    lo, hi = 0, len(log)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if log[mid][0] <= lexpos:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo - 1
+
+# Return the (state, stack) in effect at lexpos
+def _state_at(log, lexpos):
+    return log[_find_state(log, lexpos)][1:3]
+
+# -----------------------------------------------------------------------------
+#                           === Lexer Pool ===
+#
+# Hands out a separate clone of a lexer to each thread.  Clones share the
+# regular expressions and rules of the original lexer, but have their own
+# input and position, so they can be used by different threads at the same
+# time.
+# -----------------------------------------------------------------------------
+
+class LexerPool:
+    def __init__(self, lexer):
+        self.lexer = lexer
+        self.local = threading.local()
+
+    # Return the lexer for the calling thread
+    def get(self):
+        lexer = getattr(self.local, 'lexer', None)
+        if lexer is None:
+            lexer = self.local.lexer = self.lexer.clone()
+        return lexer
+
 # -----------------------------------------------------------------------------
 #                           ==== Lex Builder ===
 #
@@ -434,6 +834,23 @@ class LexerReflect(object):
         self.validate_rules()
         return self.error
 
+    # Compute a signature over the lexer specification.  Rules defined by
+    # functions contribute their code objects, so the signature changes if
+    # the code of a rule changes even if its regular expression doesn't.
+    # Returns None if no signature can be computed.
+    def signature(self):
+        try:
+            parts = [tuple(self.tokens), tuple(self.literals), tuple(self.stateinfo.items()), self.reflags]
+            for state in self.stateinfo:
+                parts.append(tuple((fname, _get_regex(f), f.__code__) for fname, f in self.funcsym[state]))
+                parts.append(tuple(self.strsym[state]))
+                parts.append(self.ignore.get(state))
+                efunc = self.errorf.get(state)
+                parts.append(efunc.__code__ if efunc else None)
+            return tuple(parts)
+        except (TypeError, AttributeError):
+            return None
+
     # Get the tokens map
     def get_tokens(self):
         tokens = self.ldict.get('tokens', None)
@@ -714,7 +1131,7 @@ class LexerReflect(object):
 #
 # Build all of the regular expression rules from definitions in the supplied module
 # -----------------------------------------------------------------------------
-def lex(*, module=None, object=None, debug=False, 
+def lex(*, module=None, object=None, debug=False, optimize=False,
         reflags=int(re.VERBOSE), debuglog=None, errorlog=None):
 
     global lexer
@@ -748,8 +1165,16 @@ def lex(*, module=None, object=None, debug=False,
     # Collect parser information from the dictionary
     linfo = LexerReflect(ldict, log=errorlog, reflags=reflags)
     linfo.get_all()
-    if linfo.validate_all():
-        raise SyntaxError("Can't build lexer")
+
+    # In optimized mode, a specification is only validated the first time it
+    # is seen.  Validation inspects the source of every module involved and
+    # compiles each rule separately, which is wasted work after that.
+    signature = linfo.signature() if optimize and not linfo.error else None
+    if signature is None or signature not in _validated_specs:
+        if linfo.validate_all():
+            raise SyntaxError("Can't build lexer")
+        if signature is not None:
+            _validated_specs.add(signature)
 
     # Dump some basic debugging information
     if debug:
@@ -773,50 +1198,44 @@ def lex(*, module=None, object=None, debug=False,
     # Get the stateinfo dictionary
     stateinfo = linfo.stateinfo
 
-    regexs = {}
-    # Build the master regular expressions
+    # Collect the rules for each state
     for state in stateinfo:
         regex_list = []
+        handles = {}
 
         # Add rules defined by functions first
         for fname, f in linfo.funcsym[state]:
             regex_list.append('(?P<%s>%s)' % (fname, _get_regex(f)))
+            handles[fname] = f
             if debug:
                 debuglog.info("lex: Adding rule %s -> '%s' (state '%s')", fname, _get_regex(f), state)
 
         # Now add all of the simple rules
         for name, r in linfo.strsym[state]:
             regex_list.append('(?P<%s>%s)' % (name, r))
+            handles[name] = ldict.get(name)
             if debug:
                 debuglog.info("lex: Adding rule %s -> '%s' (state '%s')", name, r, state)
 
-        regexs[state] = regex_list
+        lexobj.lexstaterules[state] = (regex_list, handles, linfo.toknames)
 
-    # Build the master regular expressions
+    lexobj.lexstateinfo = stateinfo
+    lexobj.lexreflags = reflags
 
+    # Build the master regular expressions.  Only the INITIAL state is
+    # compiled now.  Other states are compiled when they are first entered,
+    # except in debug mode where all of them are shown.
     if debug:
         debuglog.info('lex: ==== MASTER REGEXS FOLLOW ====')
-
-    for state in regexs:
-        lexre, re_text, re_names = _form_master_re(regexs[state], reflags, ldict, linfo.toknames)
-        lexobj.lexstatere[state] = lexre
-        lexobj.lexstateretext[state] = re_text
-        lexobj.lexstaterenames[state] = re_names
-        if debug:
-            for i, text in enumerate(re_text):
+        for state in stateinfo:
+            lexobj.compile_state(state)
+            for i, text in enumerate(lexobj.lexstateretext[state]):
                 debuglog.info("lex: state '%s' : regex[%d] = '%s'", state, i, text)
 
-    # For inclusive states, we need to add the regular expressions from the INITIAL state
-    for state, stype in stateinfo.items():
-        if state != 'INITIAL' and stype == 'inclusive':
-            lexobj.lexstatere[state].extend(lexobj.lexstatere['INITIAL'])
-            lexobj.lexstateretext[state].extend(lexobj.lexstateretext['INITIAL'])
-            lexobj.lexstaterenames[state].extend(lexobj.lexstaterenames['INITIAL'])
-
-    lexobj.lexstateinfo = stateinfo
+    if 'INITIAL' not in lexobj.lexstatere:
+        lexobj.compile_state('INITIAL')
     lexobj.lexre = lexobj.lexstatere['INITIAL']
     lexobj.lexretext = lexobj.lexstateretext['INITIAL']
-    lexobj.lexreflags = reflags
 
     # Set up ignore variables
     lexobj.lexstateignore = linfo.ignore
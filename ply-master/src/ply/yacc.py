@@ -62,9 +62,20 @@
 # ----------------------------------------------------------------------------
 
 import re
+import dis
+import time
 import types
 import sys
 import inspect
+import threading
+import io
+import functools
+import itertools
+import gc
+import collections
+import operator
+import array
+import mmap
 
 #-----------------------------------------------------------------------------
 #                     === User configurable parameters ===
@@ -81,6 +92,11 @@ resultlimit = 40               # Size limit of results when running in debug mod
 
 MAXINT = sys.maxsize
 
+# Specifications that have already passed validation.  yacc(optimize=True)
+# skips validation for these.  Keys are computed by ParserReflect.spec_key().
+# This only lasts for the lifetime of the process.
+_validated_specs = set()
+
 # This object is a stand-in for a logging object created by the
 # logging module.   PLY will use this by default to create things
 # such as the parser.out file.  If a user wants more detailed
@@ -136,6 +152,114 @@ def format_stack_entry(r):
     else:
         return '<%s @ 0x%x>' % (type(r).__name__, id(r))
 
+# Return True if a grammar rule or p_error() function might use the symbol
+# objects of a parse, through p.slice, p.stack or parser.symstack.  These
+# don't exist in the value stack engine.  Anything that isn't a plain
+# function or method is assumed to use them.
+def uses_symbols(f):
+    code = getattr(getattr(f, '__func__', f), '__code__', None)
+    if code is None:
+        return True
+    codes = [code]
+    while codes:
+        code = codes.pop()
+        if {'slice', 'stack', 'symstack'} & set(code.co_names):
+            return True
+        codes.extend(c for c in code.co_consts if isinstance(c, types.CodeType))
+    return False
+
+# Return the instructions of a grammar rule function as (opname, argval)
+# pairs, with the name of its production argument replaced by 'p'.  Returns
+# None if f isn't a function or method taking just that argument.
+def rule_instructions(f):
+    func = getattr(f, '__func__', f)
+    code = getattr(func, '__code__', None)
+    nargs = 2 if hasattr(f, '__self__') else 1
+    if code is None or code.co_argcount != nargs or code.co_kwonlyargcount or \
+       code.co_flags & (inspect.CO_VARARGS | inspect.CO_VARKEYWORDS):
+        return None
+    pname = code.co_varnames[nargs-1]
+    instructions = []
+    for i in dis.get_instructions(code):
+        if i.opname in ('RESUME', 'NOP', 'CACHE', 'EXTENDED_ARG'):
+            continue
+        if 'FAST' in i.opname and i.argval == pname:
+            instructions.append((i.opname, 'p'))
+        else:
+            instructions.append((i.opname, i.argval))
+    return instructions
+
+def _rule_pass(p):
+    pass
+
+def _rule_select(p):
+    p[0] = p[1]
+
+_pass_instructions = rule_instructions(_rule_pass)
+_select_instructions = rule_instructions(_rule_select)
+
+# Return k if a grammar rule function only does p[0] = p[k], 0 if it does
+# nothing at all, and None otherwise.  The parsing engine doesn't call
+# these functions.  It moves the value of symbol k, or None, into place
+# itself.  This is recognized from the bytecode of the function, so rules
+# like these in a grammar get the fast path without any changes:
+#
+#     def p_expression_term(p):
+#         'expression : term'
+#         p[0] = p[1]
+#
+#     def p_declaration_list(p):
+#         'declaration_list : declaration_list declaration'
+#         pass
+
+def passthrough_index(f):
+    instructions = rule_instructions(f)
+    if instructions is None:
+        return None
+    if instructions == _pass_instructions:
+        return 0
+    if len(instructions) != len(_select_instructions):
+        return None
+    k = None
+    for (op, arg), (sop, sarg) in zip(instructions, _select_instructions):
+        if op != sop:
+            return None
+        if arg != sarg:
+            # Only the index of p[1] may differ
+            if sarg != 1 or 'FAST' in op or k is not None or type(arg) is not int or arg < 1:
+                return None
+            k = arg
+    return k or 1
+
+# Return a grammar rule function for a production with plen symbols that
+# builds the node described by the NODE decorator of f.  Its node attribute
+# holds the tag and the positions of the symbols in the node.
+def node_action(f, plen, file, line):
+    tag, positions = f.node
+    positions = tuple(positions) or tuple(range(1, plen+1))
+    for n in positions:
+        if not isinstance(n, int) or not 1 <= n <= plen:
+            raise YaccError('%s:%d: Bad position %r in NODE of rule %r' % (file, line, n, f.__name__))
+    if isinstance(tag, str):
+        def action(p):
+            p[0] = (tag,) + tuple([p[n] for n in positions])
+    else:
+        def action(p):
+            p[0] = tag(*[p[n] for n in positions])
+    functools.update_wrapper(action, f)
+    action.node = (tag, positions)
+    return action
+
+# Return a function that gets the values of the symbols at positions of a
+# rule with plen symbols from the top of a value stack, as a sequence
+def node_getter(positions, plen):
+    if not positions:
+        return operator.itemgetter(slice(0, 0))
+    indices = [n - plen - 1 for n in positions]
+    if positions == tuple(range(positions[0], positions[-1] + 1)):
+        return operator.itemgetter(slice(indices[0], indices[-1] + 1 or None))
+    return operator.itemgetter(*indices)
+
 #-----------------------------------------------------------------------------
 #                        ===  LR Parsing Engine ===
 #
@@ -168,6 +292,15 @@ class YaccSymbol:
 # a tuple of (startline,endline) representing the range of lines
 # for a symbol.  The lexspan() method returns a tuple (lexpos,endlexpos)
 # representing the range of positional information for a symbol.
+#
+# When LRParser.parse() tracks positions, they aren't stored on the
+# symbols.  Instead, spans is a pair of stacks running alongside the symbol
+# stack.  They hold (lineno, lexpos) tuples giving the start and the end of
+# each symbol.  While a rule is called, its symbols are on top of the
+# stacks.  The result (symbol 0) starts where the first symbol starts,
+# unless set_lineno() or set_lexpos() changed its start, which is then kept
+# in spanstart, and ends where the last symbol ends.  For an empty rule,
+# the top of the stacks holds the position of the result.
 
 class YaccProduction:
     def __init__(self, s, stack=None):
@@ -175,6 +308,8 @@ class YaccProduction:
         self.stack = stack
         self.lexer = None
         self.parser = None
+        self.spans = None
+        self.spanstart = None
 
     def __getitem__(self, n):
         if isinstance(n, slice):
@@ -193,24 +328,62 @@ class YaccProduction:
     def __len__(self):
         return len(self.slice)
 
+    # Return the start and end (lineno, lexpos) of symbol n from spans
+    def span(self, n):
+        starts, ends = self.spans
+        if n < 0:
+            n += len(self.slice)
+        if n == 0:
+            return self.spanstart or starts[-max(len(self.slice) - 1, 1)], ends[-1]
+        return starts[n - len(self.slice)], ends[n - len(self.slice)]
+
+    # Change the start line or position of symbol n in spans
+    def set_spanstart(self, n, lineno=None, lexpos=None):
+        if n < 0:
+            n += len(self.slice)
+        start = self.span(n)[0]
+        start = (start[0] if lineno is None else lineno, start[1] if lexpos is None else lexpos)
+        if n == 0:
+            self.spanstart = start
+        else:
+            self.spans[0][n - len(self.slice)] = start
+
     def lineno(self, n):
+        if self.spans is not None:
+            if n > 0:
+                return self.spans[0][n - len(self.slice)][0]
+            return self.span(n)[0][0]
         return getattr(self.slice[n], 'lineno', 0)
 
     def set_lineno(self, n, lineno):
+        if self.spans is not None:
+            self.set_spanstart(n, lineno=lineno)
         self.slice[n].lineno = lineno
 
     def linespan(self, n):
+        if self.spans is not None:
+            start, end = self.span(n)
+            return start[0], end[0]
         startline = getattr(self.slice[n], 'lineno', 0)
         endline = getattr(self.slice[n], 'endlineno', startline)
         return startline, endline
 
     def lexpos(self, n):
+        if self.spans is not None:
+            if n > 0:
+                return self.spans[0][n - len(self.slice)][1]
+            return self.span(n)[0][1]
         return getattr(self.slice[n], 'lexpos', 0)
 
     def set_lexpos(self, n, lexpos):
+        if self.spans is not None:
+            self.set_spanstart(n, lexpos=lexpos)
         self.slice[n].lexpos = lexpos
 
     def lexspan(self, n):
+        if self.spans is not None:
+            start, end = self.span(n)
+            return start[1], end[1]
         startpos = getattr(self.slice[n], 'lexpos', 0)
         endpos = getattr(self.slice[n], 'endlexpos', startpos)
         return startpos, endpos
@@ -218,20 +391,505 @@ class YaccProduction:
     def error(self):
         raise SyntaxError
 
+# This class is passed to grammar rules in place of YaccProduction when
+# LRParser.parse_values() runs the parse.  There are no YaccSymbol objects
+# for the symbols of a rule.  The values are read directly from the value
+# stack of the parser, where the symbols of the rule are the entries above
+# top.  p[0] is kept in result until the rule returns.  The symbol stack
+# holds the tokens that were shifted, so that p.lineno() and p.lexpos()
+# still work for them.  Nonterminals are None there, unless set_lineno()
+# or set_lexpos() has been called for them, which creates a YaccSymbol to
+# hold the position.  p.slice is a list of YaccSymbols made on request;
+# changing it has no effect on the parse.
+
+class YaccValues:
+    def __init__(self, parser, lexer=None):
+        self.parser = parser
+        self.lexer = lexer
+        self.values = None
+        self.symbols = None
+        self.prod = None
+        self.top = 0
+        self.result = None
+        self.sym = None
+
+    def __getitem__(self, n):
+        try:
+            if n > 0:
+                return self.values[self.top + n]
+        except TypeError:
+            return [self[i] for i in range(*n.indices(len(self)))]
+        if n == 0:
+            return self.result
+        return self.values[self.top + 1 + n]
+
+    def __setitem__(self, n, v):
+        if n == 0:
+            self.result = v
+        elif n > 0:
+            self.values[self.top + n] = v
+        else:
+            self.values[self.top + 1 + n] = v
+
+    def __len__(self):
+        return len(self.values) - self.top
+
+    # Return the type of symbol n of the rule
+    def symbol_type(self, n):
+        if n == 0:
+            return self.prod.name
+        return self.parser.accessing_symbol(self.parser.statestack[self.index(n)])
+
+    # Return the index of symbol n of the rule in the stacks
+    def index(self, n):
+        return self.top + n if n > 0 else self.top + 1 + n
+
+    # Return symbol n from the symbol stack.  If create is set, a YaccSymbol
+    # is made for a nonterminal that doesn't have one yet.
+    def symbol(self, n, create=False):
+        if n == 0:
+            if create and self.sym is None:
+                self.sym = YaccSymbol()
+                self.sym.type = self.prod.name
+            return self.sym
+        i = self.index(n)
+        if create and self.symbols[i] is None:
+            sym = self.symbols[i] = YaccSymbol()
+            sym.type = self.symbol_type(n)
+        return self.symbols[i]
+
+    @property
+    def slice(self):
+        slice = []
+        for n in range(len(self)):
+            sym = self.symbol(n)
+            if sym is None:
+                sym = YaccSymbol()
+                sym.type = self.symbol_type(n)
+            sym.value = self[n]
+            slice.append(sym)
+        return slice
+
+    def lineno(self, n):
+        return getattr(self.symbol(n), 'lineno', 0)
+
+    def set_lineno(self, n, lineno):
+        self.symbol(n, True).lineno = lineno
+
+    def linespan(self, n):
+        sym = self.symbol(n)
+        startline = getattr(sym, 'lineno', 0)
+        endline = getattr(sym, 'endlineno', startline)
+        return startline, endline
+
+    def lexpos(self, n):
+        return getattr(self.symbol(n), 'lexpos', 0)
+
+    def set_lexpos(self, n, lexpos):
+        self.symbol(n, True).lexpos = lexpos
+
+    def lexspan(self, n):
+        sym = self.symbol(n)
+        startpos = getattr(sym, 'lexpos', 0)
+        endpos = getattr(sym, 'endlexpos', startpos)
+        return startpos, endpos
+
+    def error(self):
+        raise SyntaxError
+
+# -----------------------------------------------------------------------------
+#                               == ParseTree ==
+#
+# A concrete syntax tree recorded by LRParser.parse_tree() in flat arrays
+# instead of objects.  The nodes are numbered in the order their rules were
+# reduced, so the children of a node always come before it and the root is
+# the last node.  For node n:
+#
+#    prods[n]    - Number of the production reduced
+#    starts[n]   - Offset of the children of the node in kids
+#    firsts[n]   - Index of the first token covered
+#    ends[n]     - Index of the token after the last one covered
+#
+# The children of node n are kids[starts[n]:starts[n]+len], where len is
+# the length of its production.  A child is either a node number or, if
+# negative, ~i for tokens[i].  tokens holds the tokens in the order they
+# were shifted, including the error symbols of error recovery.  Nodes that
+# were thrown away by error recovery are left in the arrays unused.
+#
+# The arrays can be saved to a file with save() and read back with
+# ParseTree.load(), which maps the file into memory instead of reading it.
+# TreeNode objects give a view of a node for walking the tree.
+# -----------------------------------------------------------------------------
+
+class ParseTree:
+    def __init__(self, productions, tokens=None, prods=None, starts=None, firsts=None, ends=None, kids=None, root=-1):
+        self.productions = productions
+        self.tokens = [] if tokens is None else tokens
+        self.prods = array.array('i') if prods is None else prods
+        self.starts = array.array('i') if starts is None else starts
+        self.firsts = array.array('i') if firsts is None else firsts
+        self.ends = array.array('i') if ends is None else ends
+        self.kids = array.array('i') if kids is None else kids
+        self.rootindex = root
+
+    def __len__(self):
+        return len(self.prods)
+
+    def __getitem__(self, n):
+        return TreeNode(self, range(len(self.prods))[n])
+
+    def __repr__(self):
+        return 'ParseTree(%d nodes, %d tokens)' % (len(self.prods), len(self.tokens))
+
+    # The root of the tree
+    @property
+    def root(self):
+        return TreeNode(self, self.rootindex)
+
+    # Write the arrays to a binary file object
+    def save(self, f):
+        f.write(b'PLYT')
+        f.write(array.array('i', [self.rootindex, len(self.prods), len(self.kids)]))
+        for a in (self.prods, self.starts, self.firsts, self.ends, self.kids):
+            f.write(a)
+
+    # Return the tree saved in the file filename.  The file is mapped into
+    # memory and the arrays are views of it.  productions are the productions
+    # of the parser that built the tree and tokens its tokens, if needed.
+    @classmethod
+    def load(cls, filename, productions, tokens=None):
+        with open(filename, 'rb') as f:
+            data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        if data[:4] != b'PLYT':
+            raise YaccError('%s is not a saved parse tree' % filename)
+        root, nodes, nkids = data[4:16].cast('i')
+        arrays = []
+        offset = 16
+        for size in (nodes, nodes, nodes, nodes, nkids):
+            arrays.append(data[offset:offset + 4*size].cast('i'))
+            offset += 4*size
+        return cls(productions, tokens, *arrays, root=root)
+
+# A node of a ParseTree.  Tokens among the children are the token objects.
+
+class TreeNode:
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, TreeNode) and self.tree is other.tree and self.index == other.index
+
+    def __hash__(self):
+        return hash(self.index)
+
+    def __repr__(self):
+        return 'TreeNode(%s)' % self.production()
+
+    # The production reduced to make the node
+    def production(self):
+        return self.tree.productions[self.tree.prods[self.index]]
+
+    @property
+    def type(self):
+        return self.production().name
+
+    @property
+    def children(self):
+        tree = self.tree
+        start = tree.starts[self.index]
+        children = []
+        for kid in tree.kids[start:start + self.production().len]:
+            children.append(TreeNode(tree, kid) if kid >= 0 else tree.tokens[~kid])
+        return children
+
+    # The tokens covered by the node
+    @property
+    def tokens(self):
+        return self.tree.tokens[self.tree.firsts[self.index]:self.tree.ends[self.index]]
+
+    # Return a tuple (first, end) with the indices of the first token
+    # covered and of the token after the last one
+    def tokenspan(self):
+        return self.tree.firsts[self.index], self.tree.ends[self.index]
+
+# -----------------------------------------------------------------------------
+#                              == GLR parsing ==
+#
+# LRParser.parse_glr() follows every action of the conflicts that the table
+# generator resolved by default (the ones reported as shift/reduce and
+# reduce/reduce conflicts), instead of only the one chosen.  Conflicts
+# resolved by precedence are not followed.  Parsing is done with a single
+# stack, as usual, until the parser reaches a state and lookahead with a
+# conflict.  The stack is then turned into a graph-structured stack (GSS)
+# and each possible parse gets a head of its own.  Heads in the same state
+# at the same point of the input are merged.  Once a single head is left
+# and the stack below it is a single path again, parsing goes back to
+# using a single stack.
+#
+# The result is a shared packed parse forest.  Each ForestNode stands for
+# a nonterminal covering the tokens [start, end) of the input and has one
+# or more alternatives, which are (production number, children) pairs.
+# The children are ForestNodes and tokens.  A node with more than one
+# alternative is an ambiguity.  When the forest is complete, the grammar
+# rules are called once for each alternative, bottom up, to compute the
+# value of each node.
+# -----------------------------------------------------------------------------
+
+class ForestNode:
+    __slots__ = ('type', 'start', 'end', 'alternatives', 'packed')
+
+    def __init__(self, type, start, end, alternatives):
+        self.type = type
+        self.start = start
+        self.end = end
+        self.alternatives = alternatives
+        self.packed = None           # Set of the alternatives, made by add()
+
+    def __repr__(self):
+        return 'ForestNode(%s, %d, %d, %d alternatives)' % (self.type, self.start, self.end, len(self.alternatives))
+
+    # Add an alternative unless the node already has it
+    def add(self, prodnum, children):
+        alternative = (prodnum, children)
+        if self.packed is None:
+            self.packed = set(self.alternatives)
+        if alternative not in self.packed:
+            self.packed.add(alternative)
+            self.alternatives.append(alternative)
+
+# A node of the graph-structured stack.  pos is the number of tokens
+# shifted when the node was made.  links is a list of (node, symbol) pairs
+# going down the stack, where symbol is the ForestNode or token between
+# the two nodes.  below is the set of the nodes in links.
+
+class GSSNode:
+    __slots__ = ('state', 'pos', 'links', 'below')
+
+    def __init__(self, state, pos):
+        self.state = state
+        self.pos = pos
+        self.links = []
+        self.below = set()
+
+    def link(self, node, sym):
+        link = (node, sym)
+        self.links.append(link)
+        self.below.add(node)
+        return link
+
+# Return the paths of n links going down the stack from node, as a list of
+# (base, symbols) pairs, where base is the node at the end of the path and
+# symbols are the symbols of the links from left to right.  If link is
+# given, only the paths starting with it are returned.
+
+def gss_paths(node, n, link=None):
+    if n == 0:
+        return [(node, ())]
+    paths = []
+    for below, sym in ([link] if link else node.links):
+        for base, symbols in gss_paths(below, n - 1):
+            paths.append((base, symbols + (sym,)))
+    return paths
+
+# Return the ForestNodes among the children of the alternatives of node
+
+def forest_children(node):
+    for _, children in node.alternatives:
+        for child in children:
+            if isinstance(child, ForestNode):
+                yield child
+
+# A grammar with a cycle, such as a : a, has inputs with infinitely many
+# parses, and the parse forest then has nodes that are part of themselves.
+# Remove alternatives from a forest until it has no cycles, keeping for
+# each node the alternatives that reach the rest of its strongly connected
+# component by the shortest derivations.  The components are found with
+# Tarjan's algorithm.  Returns the number of alternatives removed.
+
+def break_cycles(root):
+    index = {id(root): 0}
+    low = {id(root): 0}
+    stack = [root]
+    onstack = {id(root)}
+    removed = 0
+    work = [(root, forest_children(root))]
+    while work:
+        node, children = work[-1]
+        key = id(node)
+        for child in children:
+            ckey = id(child)
+            if ckey not in index:
+                index[ckey] = low[ckey] = len(index)
+                stack.append(child)
+                onstack.add(ckey)
+                work.append((child, forest_children(child)))
+                break
+            if ckey in onstack:
+                low[key] = min(low[key], index[ckey])
+        else:
+            work.pop()
+            if work:
+                pkey = id(work[-1][0])
+                low[pkey] = min(low[pkey], low[key])
+            if low[key] == index[key]:
+                component = []
+                while True:
+                    n = stack.pop()
+                    onstack.discard(id(n))
+                    component.append(n)
+                    if n is node:
+                        break
+                removed += break_component(component)
+    return removed
+
+# Remove the alternatives making cycles within a strongly connected
+# component of a parse forest.  The height of a node is the length of its
+# shortest derivation within the component.  Only the alternatives whose
+# children in the component are lower than the node are kept.
+
+def break_component(component):
+    members = {id(n) for n in component}
+    if len(component) == 1 and not any(id(c) in members for c in forest_children(component[0])):
+        return 0
+
+    height = {}
+    changed = True
+    while changed:
+        changed = False
+        for n in component:
+            for _, children in n.alternatives:
+                h = 0
+                for c in children:
+                    if id(c) in members:
+                        if id(c) not in height:
+                            break
+                        h = max(h, height[id(c)])
+                else:
+                    if h + 1 < height.get(id(n), MAXINT):
+                        height[id(n)] = h + 1
+                        changed = True
+
+    removed = 0
+    for n in component:
+        kept = [alt for alt in n.alternatives
+                if all(height.get(id(c), MAXINT) < height.get(id(n), MAXINT) for c in alt[1] if id(c) in members)]
+        removed += len(n.alternatives) - len(kept)
+        n.alternatives = kept
+        n.packed = None
+    return removed
+
+# Stands in for the symbol stack in the grammar rules called by parse_glr().
+# The rules are called after parsing, so there are no symbols below them.
+
+class NoStack:
+    def __getitem__(self, n):
+        raise YaccError('p[%d] is not available in grammar rules called by parse_glr()' % n)
+
+    def __len__(self):
+        return 0
+
+# Statistics of the last run of parse_glr(), kept as parser.glr_report.
+# Split regions are the parts of the input parsed with more than one
+# stack head.
+
+class GLRReport:
+    def __init__(self):
+        self.tokens = 0              # Tokens shifted
+        self.splits = 0              # Times the stack was split
+        self.split_tokens = 0        # Tokens shifted in split regions
+        self.max_stacks = 1          # Most stack heads at once
+        self.time = 0.0              # Time spent parsing
+        self.split_time = 0.0        # Time spent in split regions
+        self.cycles = 0              # Alternatives left out by break_cycles()
+
+    def __str__(self):
+        s = ('%d tokens, %d splits, %d tokens in split regions, up to %d stacks, '
+             '%.1f%% of %.3f s in split regions' %
+             (self.tokens, self.splits, self.split_tokens, self.max_stacks,
+              100.0 * self.split_time / self.time if self.time else 0.0, self.time))
+        if self.cycles:
+            s += ', %d cyclic alternatives left out' % self.cycles
+        return s
+
 # -----------------------------------------------------------------------------
 #                               == LRParser ==
 #
 # The LR Parsing engine.
+#
+# The parsing tables are never modified by parse().  However, the state
+# of a parse in progress (the stacks, the current state and the error
+# recovery flag) is stored on the object running the parse, so that it can
+# be inspected and changed by grammar rules and p_error() through
+# p.parser.  For this reason, one LRParser can't run two parses at the same
+# time.  Use context() or a ParserPool to get separate objects for each
+# parse that share the tables of the parser.
 # -----------------------------------------------------------------------------
 
 class LRParser:
-    def __init__(self, lrtab, errorf):
+    def __init__(self, lrtab, errorf, flat=False):
         self.productions = lrtab.lr_productions
         self.action = lrtab.lr_action
         self.goto = lrtab.lr_goto
+        self.conflicts = lrtab.lr_conflicts
         self.errorfunc = errorf
         self.set_defaulted_states()
         self.errorok = True
+        self.valstack = None
+        self.accessing = None
+
+        # Use the value stack engine if asked to, unless a function looks at
+        # the symbols
+        functions = [p.callable for p in self.productions if p.callable]
+        if errorf:
+            functions.append(errorf)
+        self.flat = flat and not any(uses_symbols(f) for f in functions)
+
+        # For each production, the symbol whose value a rule only passes on
+        # (see passthrough_index()), or None if the rule has to be called
+        self.passthrough = []
+        for p in self.productions:
+            k = passthrough_index(p.callable) if p.callable else None
+            self.passthrough.append(k if k is not None and k <= p.len else None)
+
+        # For each production whose rule has a NODE decorator, the tag of the
+        # node and a function getting the values for it from the value stack
+        self.nodes = []
+        for p in self.productions:
+            node = getattr(p.callable, 'node', None)
+            self.nodes.append(node and (node[0], node_getter(node[1], p.len)))
+
+    # Replace the productions with MiniProductions, which hold only what the
+    # parsing engine uses.  The data left over from building the tables is
+    # freed, which matters for programs that keep many parsers around.
+    def compact(self):
+        self.productions = [MiniProduction(p.name, p.len, p.callable, p.str) for p in self.productions]
+
+    # Pickle the tables and grammar rules only.  The stacks and the other
+    # state left over from the last parse are dropped, so that parse_many()
+    # doesn't send them to the workers.  They may also hold tokens and values
+    # that can't be pickled.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ('token', 'statestack', 'symstack', 'spans', 'state', 'glr_report'):
+            state.pop(name, None)
+        state['valstack'] = None
+        state['errorok'] = True
+        return state
+
+    # Return a new context for running parses with this parser's tables
+    def context(self, lexer=None):
+        return ParseContext(self, lexer)
+
+    # Return a new incremental parser for documents that are edited
+    def incremental(self, lexer=None):
+        return IncrementalParser(self, lexer)
+
+    # Return a new push parser.  Tokens are supplied with its feed() method
+    def push_context(self, lexer=None, callbacks=None, debug=False, tracking=False):
+        return PushParser(self, lexer, callbacks, debug, tracking)
 
     def errok(self):
         self.errorok = True
@@ -243,6 +901,22 @@ class LRParser:
         sym.type = '$end'
         self.symstack.append(sym)
         self.statestack.append(0)
+        if self.valstack is not None:
+            del self.valstack[:]
+            self.valstack.append(None)
+
+    # Return the symbol that leads to a state, which is the type of the
+    # symbol on top of the stack whenever the parser is in that state
+    def accessing_symbol(self, state):
+        if self.accessing is None:
+            accessing = {}
+            for table in (self.action, self.goto):
+                for actions in table.values():
+                    for sym, t in actions.items():
+                        if t > 0:
+                            accessing[t] = sym
+            self.accessing = accessing
+        return self.accessing.get(state)
 
     # Defaulted state support.
     # This method identifies parser states where there is only one possible reduction action.
@@ -264,13 +938,46 @@ class LRParser:
 
     # parse().
     #
-    # This is the core parsing engine.  To operate, it requires a lexer object.
-    # Two options are provided.  The debug flag turns on debugging so that you can
-    # see the various rule reductions and parsing steps.  tracking turns on position
-    # tracking.  In this mode, symbols will record the starting/ending line number and
-    # character index.
+    # Parse input with a lexer object.  Two options are provided.  The debug flag
+    # turns on debugging so that you can see the various rule reductions and parsing
+    # steps.  tracking turns on position tracking.  In this mode, symbols will record
+    # the starting/ending line number and character index.
 
     def parse(self, input=None, lexer=None, debug=False, tracking=False):
+        # If no lexer was given, we will try to use the lex module
+        if not lexer:
+            from . import lex
+            lexer = lex.lexer
+
+        # If input was supplied, pass to lexer
+        if input is not None:
+            lexer.input(input)
+
+        return self.parse_from(lexer.token, lexer, debug, tracking)
+
+    # parse_tokens().
+    #
+    # Parse tokens that have already been produced, without a lexer.  tokens is
+    # either an iterable of token objects or a tuple of columns (types, values,
+    # positions) or (types, values, positions, linenos), from which the tokens
+    # are made as they are needed.  positions are lexpos values.  If a lexer is
+    # given, it is only made available to grammar rules as p.lexer.
+
+    def parse_tokens(self, tokens, lexer=None, debug=False, tracking=False):
+        if isinstance(tokens, tuple) and 3 <= len(tokens) <= 4 and not hasattr(tokens[0], 'type'):
+            tokens = column_tokens(*tokens)
+        return self.parse_from(functools.partial(next, iter(tokens), None), lexer, debug, tracking)
+
+    # parse_from().
+    #
+    # This is the core parsing engine.  get_token is a function that returns the
+    # next token each time it is called, and None at the end of the input.  lexer
+    # is made available to grammar rules as p.lexer and may be None.
+
+    def parse_from(self, get_token, lexer=None, debug=False, tracking=False):
+        if self.flat and not debug and not tracking:
+            return self.parse_values(get_token, lexer)
+
         # If debugging has been specified as a flag, turn it into a logging object
         if isinstance(debug, int) and debug:
             debug = PlyLogger(sys.stderr)
@@ -287,27 +994,24 @@ class LRParser:
         if debug:
             debug.info('PLY: PARSE DEBUG START')
 
-        # If no lexer was given, we will try to use the lex module
-        if not lexer:
-            from . import lex
-            lexer = lex.lexer
-
         # Set up the lexer and parser objects on pslice
         pslice.lexer = lexer
         pslice.parser = self
 
-        # If input was supplied, pass to lexer
-        if input is not None:
-            lexer.input(input)
-
         # Set the token function
-        get_token = self.token = lexer.token
+        self.token = get_token
 
         # Set up the state and symbol stacks
         statestack = self.statestack = []   # Stack of parsing states
         symstack = self.symstack = []       # Stack of grammar symbols
         pslice.stack = symstack             # Put in the production
         errtoken   = None                   # Err token
+        self.valstack = None
+
+        # Set up the position stacks if tracking positions (see YaccProduction)
+        spans = self.spans = pslice.spans = ([], []) if tracking else None
+        if tracking:
+            startstack, endstack = spans
 
         # The start state is assumed to be (0,$end)
 
@@ -315,6 +1019,9 @@ class LRParser:
         sym = YaccSymbol()
         sym.type = '$end'
         symstack.append(sym)
+        if tracking:
+            startstack.append((0, 0))
+            endstack.append((0, 0))
         state = 0
         while True:
             # Get the next symbol on the input.  If a lookahead symbol
@@ -346,6 +1053,1257 @@ class LRParser:
                 debug.debug('Stack  : %s',
                             ('%s . %s' % (' '.join([xx.type for xx in symstack][1:]), str(lookahead))).lstrip())
 
+            if t is not None:
+                if t > 0:
+                    # shift a symbol on the stack
+                    statestack.append(t)
+                    state = t
+
+                    if debug:
+                        debug.debug('Action : Shift and goto state %s', t)
+
+                    symstack.append(lookahead)
+                    if tracking:
+                        if ltype == 'error':
+                            start = (getattr(lookahead, 'lineno', 0), getattr(lookahead, 'lexpos', 0))
+                            end = (getattr(lookahead, 'endlineno', start[0]),
+                                   getattr(lookahead, 'endlexpos', start[1]))
+                        else:
+                            start = end = (lookahead.lineno, lookahead.lexpos)
+                        startstack.append(start)
+                        endstack.append(end)
+                    lookahead = None
+
+                    # Decrease error count on successful shift
+                    if errorcount:
+                        errorcount -= 1
+                    continue
+
+                if t < 0:
+                    # reduce a symbol on the stack, emit a production
+                    p = prod[-t]
+                    pname = p.name
+                    plen  = p.len
+
+                    # Get production function
+                    sym = YaccSymbol()
+                    sym.type = pname       # Production name
+                    sym.value = None
+
+                    if debug:
+                        if plen:
+                            debug.info('Action : Reduce rule [%s] with %s and goto state %d', p.str,
+                                       '['+','.join([format_stack_entry(_v.value) for _v in symstack[-plen:]])+']',
+                                       goto[statestack[-1-plen]][pname])
+                        else:
+                            debug.info('Action : Reduce rule [%s] with %s and goto state %d', p.str, [],
+                                       goto[statestack[-1]][pname])
+
+                    if plen:
+                        targ = symstack[-plen-1:]
+                        targ[0] = sym
+
+                        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+                        # The code enclosed in this section is duplicated
+                        # below as a performance optimization.  Make sure
+                        # changes get made in both locations.
+
+                        pslice.slice = targ
+
+                        try:
+                            # Call the grammar rule with our special slice object
+                            del symstack[-plen:]
+                            self.state = state
+                            p.callable(pslice)
+                            del statestack[-plen:]
+                            if debug:
+                                debug.info('Result : %s', format_result(pslice[0]))
+                            symstack.append(sym)
+                            state = goto[statestack[-1]][pname]
+                            statestack.append(state)
+                            if tracking:
+                                # The result starts where its first symbol starts and
+                                # ends where its last symbol ends
+                                if pslice.spanstart:
+                                    startstack[-plen] = pslice.spanstart
+                                    pslice.spanstart = None
+                                if plen > 1:
+                                    del startstack[1-plen:]
+                                    del endstack[-plen:-1]
+                        except SyntaxError:
+                            # If an error was set. Enter error recovery state
+                            lookaheadstack.append(lookahead)    # Save the current lookahead token
+                            symstack.extend(targ[1:-1])         # Put the production slice back on the stack
+                            if tracking:
+                                sym.lineno, sym.lexpos = pslice.spanstart or startstack[-plen]
+                                sym.endlineno, sym.endlexpos = endstack[-1]
+                                pslice.spanstart = None
+                                startstack.pop()
+                                endstack.pop()
+                            statestack.pop()                    # Pop back one state (before the reduce)
+                            state = statestack[-1]
+                            sym.type = 'error'
+                            sym.value = 'error'
+                            lookahead = sym
+                            errorcount = error_count
+                            self.errorok = False
+
+                        continue
+
+                    else:
+
+                        if tracking:
+                            if lexer:
+                                start = (lexer.lineno, lexer.lexpos)
+                            else:
+                                start = (getattr(lookahead, 'lineno', 0), getattr(lookahead, 'lexpos', 0))
+                            startstack.append(start)
+                            endstack.append(start)
+
+                        targ = [sym]
+
+                        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+                        # The code enclosed in this section is duplicated
+                        # above as a performance optimization.  Make sure
+                        # changes get made in both locations.
+
+                        pslice.slice = targ
+
+                        try:
+                            # Call the grammar rule with our special slice object
+                            self.state = state
+                            p.callable(pslice)
+                            if debug:
+                                debug.info('Result : %s', format_result(pslice[0]))
+                            symstack.append(sym)
+                            state = goto[statestack[-1]][pname]
+                            statestack.append(state)
+                            if tracking and pslice.spanstart:
+                                startstack[-1] = pslice.spanstart
+                                pslice.spanstart = None
+                        except SyntaxError:
+                            # If an error was set. Enter error recovery state
+                            lookaheadstack.append(lookahead)    # Save the current lookahead token
+                            if tracking:
+                                sym.lineno, sym.lexpos = pslice.spanstart or start
+                                pslice.spanstart = None
+                                startstack.pop()
+                                endstack.pop()
+                            statestack.pop()                    # Pop back one state (before the reduce)
+                            state = statestack[-1]
+                            sym.type = 'error'
+                            sym.value = 'error'
+                            lookahead = sym
+                            errorcount = error_count
+                            self.errorok = False
+
+                        continue
+
+                if t == 0:
+                    n = symstack[-1]
+                    result = getattr(n, 'value', None)
+
+                    if debug:
+                        debug.info('Done   : Returning %s', format_result(result))
+                        debug.info('PLY: PARSE DEBUG END')
+
+                    return result
+
+            if t is None:
+
+                if debug:
+                    debug.error('Error  : %s',
+                                ('%s . %s' % (' '.join([xx.type for xx in symstack][1:]), str(lookahead))).lstrip())
+
+                # We have some kind of parsing error here.  To handle
+                # this, we are going to push the current token onto
+                # the tokenstack and replace it with an 'error' token.
+                # If there are any synchronization rules, they may
+                # catch it.
+                #
+                # In addition to pushing the error token, we call call
+                # the user defined p_error() function if this is the
+                # first syntax error.  This function is only called if
+                # errorcount == 0.
+                if errorcount == 0 or self.errorok:
+                    errorcount = error_count
+                    self.errorok = False
+                    errtoken = lookahead
+                    if errtoken.type == '$end':
+                        errtoken = None               # End of file!
+                    if self.errorfunc:
+                        if errtoken and lexer and not hasattr(errtoken, 'lexer'):
+                            errtoken.lexer = lexer
+                        self.state = state
+                        tok = self.errorfunc(errtoken)
+                        if self.errorok:
+                            # User must have done some kind of panic
+                            # mode recovery on their own.  The
+                            # returned token is the next lookahead
+                            lookahead = tok
+                            errtoken = None
+                            continue
+                    else:
+                        if errtoken:
+                            if hasattr(errtoken, 'lineno'):
+                                lineno = lookahead.lineno
+                            else:
+                                lineno = 0
+                            if lineno:
+                                sys.stderr.write('yacc: Syntax error at line %d, token=%s\n' % (lineno, errtoken.type))
+                            else:
+                                sys.stderr.write('yacc: Syntax error, token=%s' % errtoken.type)
+                        else:
+                            sys.stderr.write('yacc: Parse error in input. EOF\n')
+                            return
+
+                else:
+                    errorcount = error_count
+
+                # case 1:  the statestack only has 1 entry on it.  If we're in this state, the
+                # entire parse has been rolled back and we're completely hosed.   The token is
+                # discarded and we just keep going.
+
+                if len(statestack) <= 1 and lookahead.type != '$end':
+                    lookahead = None
+                    errtoken = None
+                    state = 0
+                    # Nuke the pushback stack
+                    del lookaheadstack[:]
+                    continue
+
+                # case 2: the statestack has a couple of entries on it, but we're
+                # at the end of the file. nuke the top entry and generate an error token
+
+                # Start nuking entries on the stack
+                if lookahead.type == '$end':
+                    # Whoa. We're really hosed here. Bail out
+                    return
+
+                if lookahead.type != 'error':
+                    sym = symstack[-1]
+                    if sym.type == 'error':
+                        # Hmmm. Error is on top of stack, we'll just nuke input
+                        # symbol and continue
+                        if tracking:
+                            endstack[-1] = (getattr(lookahead, 'lineno', startstack[-1][0]),
+                                            getattr(lookahead, 'lexpos', startstack[-1][1]))
+                        lookahead = None
+                        continue
+
+                    # Create the error symbol for the first time and make it the new lookahead symbol
+                    t = YaccSymbol()
+                    t.type = 'error'
+
+                    if hasattr(lookahead, 'lineno'):
+                        t.lineno = t.endlineno = lookahead.lineno
+                    if hasattr(lookahead, 'lexpos'):
+                        t.lexpos = t.endlexpos = lookahead.lexpos
+                    t.value = lookahead
+                    lookaheadstack.append(lookahead)
+                    lookahead = t
+                else:
+                    sym = symstack.pop()
+                    if tracking:
+                        lookahead.lineno, lookahead.lexpos = startstack.pop()
+                        endstack.pop()
+                    statestack.pop()
+                    state = statestack[-1]
+
+                continue
+
+            # If we'r here, something really bad happened
+            raise RuntimeError('yacc: internal parser error!!!\n')
+
+    # parse_values().
+    #
+    # The parsing engine used by parse_from() for parsers built with
+    # flat=True, when neither debugging nor position tracking is on and no
+    # grammar rule uses the symbol objects (see uses_symbols()).  It works
+    # like parse_from(), but keeps the values of the symbols in a flat stack.
+    # A reduction doesn't make a YaccSymbol or a list for the rule.  The rule
+    # gets a YaccValues object that indexes the top of the value stack, and
+    # its result replaces the values of its symbols there.  YaccSymbols are
+    # only made for error recovery and when a rule sets a position with
+    # set_lineno() or set_lexpos().
+
+    def parse_values(self, get_token, lexer=None):
+        lookahead = None                         # Current lookahead symbol
+        lookaheadstack = []                      # Stack of lookahead symbols
+        actions = self.action                    # Local reference to action table (to avoid lookup on self.)
+        goto    = self.goto                      # Local reference to goto table (to avoid lookup on self.)
+        prod    = self.productions               # Local reference to production list (to avoid lookup on self.)
+        defaulted_states = self.defaulted_states # Local reference to defaulted states
+        passthrough = self.passthrough           # Local reference to pass-through rules
+        nodes   = self.nodes                     # Local reference to NODE rules
+        pslice  = YaccValues(self, lexer)        # Production object passed to grammar rules
+        errorcount = 0                           # Used during error recovery
+
+        # Set the token function
+        self.token = get_token
+
+        # Set up the state, symbol and value stacks.  The symbol stack holds
+        # the tokens and None for nonterminals without a position.
+        statestack = self.statestack = [0]
+        symstack = self.symstack = [None]
+        valstack = self.valstack = [None]
+        pslice.symbols = symstack
+        pslice.values = valstack
+        self.spans = None
+        errtoken   = None
+
+        state = 0
+        while True:
+            if state not in defaulted_states:
+                if not lookahead:
+                    if not lookaheadstack:
+                        lookahead = get_token()     # Get the next token
+                    else:
+                        lookahead = lookaheadstack.pop()
+                    if not lookahead:
+                        lookahead = YaccSymbol()
+                        lookahead.type = '$end'
+
+                # Check the action table
+                ltype = lookahead.type
+                t = actions[state].get(ltype)
+            else:
+                t = defaulted_states[state]
+
+            if t is not None:
+                if t > 0:
+                    # shift a symbol on the stack
+                    statestack.append(t)
+                    state = t
+                    symstack.append(lookahead)
+                    valstack.append(lookahead.value)
+                    lookahead = None
+
+                    # Decrease error count on successful shift
+                    if errorcount:
+                        errorcount -= 1
+                    continue
+
+                if t < 0:
+                    # reduce a symbol on the stack, emit a production
+                    p = prod[-t]
+                    plen  = p.len
+                    top = len(valstack) - plen - 1
+                    k = passthrough[-t]
+
+                    if k is not None:
+                        # The rule only passes on the value of symbol k, or
+                        # None if k is 0, so it isn't called
+                        result = valstack[top+k] if k else None
+                        sym = None
+                    elif nodes[-t]:
+                        # Build the node of a NODE rule without calling it
+                        tag, getter = nodes[-t]
+                        if isinstance(tag, str):
+                            result = (tag, *getter(valstack))
+                        else:
+                            result = tag(*getter(valstack))
+                        sym = None
+                    else:
+                        pslice.top = top
+                        pslice.prod = p
+                        try:
+                            # Call the grammar rule with our special slice object
+                            self.state = state
+                            p.callable(pslice)
+                        except SyntaxError:
+                            # If an error was set. Enter error recovery state
+                            lookaheadstack.append(lookahead)    # Save the current lookahead token
+                            sym = pslice.sym or YaccSymbol()
+                            pslice.result = pslice.sym = None
+                            if plen:
+                                del valstack[-1]                # Drop the last symbol of the rule
+                                del symstack[-1]
+                            statestack.pop()                    # Pop back one state (before the reduce)
+                            state = statestack[-1]
+                            sym.type = 'error'
+                            sym.value = 'error'
+                            lookahead = sym
+                            errorcount = error_count
+                            self.errorok = False
+                            continue
+                        result = pslice.result
+                        sym = pslice.sym
+                        pslice.result = pslice.sym = None
+
+                    # Replace the symbols of the rule with the result
+                    if plen:
+                        if plen > 1:
+                            del valstack[top+2:]
+                            del symstack[top+2:]
+                            del statestack[1-plen:]
+                        valstack[top+1] = result
+                        symstack[top+1] = sym
+                        statestack[-1] = state = goto[statestack[-2]][p.name]
+                    else:
+                        valstack.append(result)
+                        symstack.append(sym)
+                        state = goto[statestack[-1]][p.name]
+                        statestack.append(state)
+                    continue
+
+                if t == 0:
+                    return valstack[-1]
+
+            if t is None:
+                # We have some kind of parsing error here.  This is handled
+                # as in parse_from().
+                if errorcount == 0 or self.errorok:
+                    errorcount = error_count
+                    self.errorok = False
+                    errtoken = lookahead
+                    if errtoken.type == '$end':
+                        errtoken = None               # End of file!
+                    if self.errorfunc:
+                        if errtoken and lexer and not hasattr(errtoken, 'lexer'):
+                            errtoken.lexer = lexer
+                        self.state = state
+                        tok = self.errorfunc(errtoken)
+                        if self.errorok:
+                            # User must have done some kind of panic
+                            # mode recovery on their own.  The
+                            # returned token is the next lookahead
+                            lookahead = tok
+                            errtoken = None
+                            continue
+                    else:
+                        if errtoken:
+                            if hasattr(errtoken, 'lineno'):
+                                lineno = lookahead.lineno
+                            else:
+                                lineno = 0
+                            if lineno:
+                                sys.stderr.write('yacc: Syntax error at line %d, token=%s\n' % (lineno, errtoken.type))
+                            else:
+                                sys.stderr.write('yacc: Syntax error, token=%s' % errtoken.type)
+                        else:
+                            sys.stderr.write('yacc: Parse error in input. EOF\n')
+                            return
+
+                else:
+                    errorcount = error_count
+
+                # case 1:  the statestack only has 1 entry on it.  The token is
+                # discarded and we just keep going.
+
+                if len(statestack) <= 1 and lookahead.type != '$end':
+                    lookahead = None
+                    errtoken = None
+                    state = 0
+                    # Nuke the pushback stack
+                    del lookaheadstack[:]
+                    continue
+
+                # case 2: the statestack has a couple of entries on it, but we're
+                # at the end of the file. nuke the top entry and generate an error token
+
+                # Start nuking entries on the stack
+                if lookahead.type == '$end':
+                    # Whoa. We're really hosed here. Bail out
+                    return
+
+                if lookahead.type != 'error':
+                    if getattr(symstack[-1], 'type', None) == 'error':
+                        # Hmmm. Error is on top of stack, we'll just nuke input
+                        # symbol and continue
+                        lookahead = None
+                        continue
+
+                    # Create the error symbol for the first time and make it the new lookahead symbol
+                    t = YaccSymbol()
+                    t.type = 'error'
+
+                    if hasattr(lookahead, 'lineno'):
+                        t.lineno = t.endlineno = lookahead.lineno
+                    if hasattr(lookahead, 'lexpos'):
+                        t.lexpos = t.endlexpos = lookahead.lexpos
+                    t.value = lookahead
+                    lookaheadstack.append(lookahead)
+                    lookahead = t
+                else:
+                    symstack.pop()
+                    valstack.pop()
+                    statestack.pop()
+                    state = statestack[-1]
+
+                continue
+
+            # Call an error function here
+            raise RuntimeError('yacc: internal parser error!!!\n')
+
+    # parse_tree().
+    #
+    # Parse input with a lexer object like parse(), but record the parse tree
+    # in a ParseTree instead of calling the grammar rules.  Returns the tree,
+    # or None if the input couldn't be parsed.  p_error() is called and error
+    # recovery works as usual.
+
+    def parse_tree(self, input=None, lexer=None):
+        if not lexer:
+            from . import lex
+            lexer = lex.lexer
+
+        if input is not None:
+            lexer.input(input)
+
+        return self.tree_from(lexer.token, lexer)
+
+    # tree_from().
+    #
+    # The parsing engine used by parse_tree().  It works like parse_values(),
+    # but the value stack holds the children entries of the tree (see
+    # ParseTree) and each reduction appends a node to the arrays.
+
+    def tree_from(self, get_token, lexer=None):
+        lookahead = None                         # Current lookahead symbol
+        lookaheadstack = []                      # Stack of lookahead symbols
+        actions = self.action                    # Local reference to action table (to avoid lookup on self.)
+        goto    = self.goto                      # Local reference to goto table (to avoid lookup on self.)
+        prod    = self.productions               # Local reference to production list (to avoid lookup on self.)
+        defaulted_states = self.defaulted_states # Local reference to defaulted states
+        errorcount = 0                           # Used during error recovery
+
+        tree = ParseTree(prod)
+        tokens = tree.tokens
+        prods = tree.prods
+        starts = tree.starts
+        firsts = tree.firsts
+        ends = tree.ends
+        kids = tree.kids
+
+        # Set the token function
+        self.token = get_token
+
+        # Set up the stacks.  The symbol stack is only kept for restart().
+        statestack = self.statestack = [0]
+        valstack = self.valstack = [None]
+        self.symstack = [None]
+        self.spans = None
+        errtoken   = None
+
+        state = 0
+        while True:
+            if state not in defaulted_states:
+                if not lookahead:
+                    if not lookaheadstack:
+                        lookahead = get_token()     # Get the next token
+                    else:
+                        lookahead = lookaheadstack.pop()
+                    if not lookahead:
+                        lookahead = YaccSymbol()
+                        lookahead.type = '$end'
+
+                # Check the action table
+                ltype = lookahead.type
+                t = actions[state].get(ltype)
+            else:
+                t = defaulted_states[state]
+
+            if t is not None:
+                if t > 0:
+                    # shift a symbol on the stack
+                    statestack.append(t)
+                    state = t
+                    tokens.append(lookahead)
+                    valstack.append(-len(tokens))
+                    lookahead = None
+
+                    # Decrease error count on successful shift
+                    if errorcount:
+                        errorcount -= 1
+                    continue
+
+                if t < 0:
+                    # reduce a symbol on the stack, adding a node to the tree
+                    p = prod[-t]
+                    plen  = p.len
+                    prods.append(-t)
+                    starts.append(len(kids))
+                    if plen:
+                        kid = valstack[-plen]
+                        firsts.append(firsts[kid] if kid >= 0 else ~kid)
+                        kids.extend(valstack[-plen:])
+                        del valstack[-plen:]
+                        del statestack[-plen:]
+                    else:
+                        firsts.append(len(tokens))
+                    ends.append(len(tokens))
+                    valstack.append(len(prods) - 1)
+                    state = goto[statestack[-1]][p.name]
+                    statestack.append(state)
+                    continue
+
+                if t == 0:
+                    tree.rootindex = valstack[-1]
+                    return tree
+
+            if t is None:
+                # We have some kind of parsing error here.  This is handled
+                # as in parse_from().
+                if errorcount == 0 or self.errorok:
+                    errorcount = error_count
+                    self.errorok = False
+                    errtoken = lookahead
+                    if errtoken.type == '$end':
+                        errtoken = None               # End of file!
+                    if self.errorfunc:
+                        if errtoken and lexer and not hasattr(errtoken, 'lexer'):
+                            errtoken.lexer = lexer
+                        self.state = state
+                        tok = self.errorfunc(errtoken)
+                        if self.errorok:
+                            # User must have done some kind of panic
+                            # mode recovery on their own.  The
+                            # returned token is the next lookahead
+                            lookahead = tok
+                            errtoken = None
+                            continue
+                    else:
+                        if errtoken:
+                            if hasattr(errtoken, 'lineno'):
+                                lineno = lookahead.lineno
+                            else:
+                                lineno = 0
+                            if lineno:
+                                sys.stderr.write('yacc: Syntax error at line %d, token=%s\n' % (lineno, errtoken.type))
+                            else:
+                                sys.stderr.write('yacc: Syntax error, token=%s' % errtoken.type)
+                        else:
+                            sys.stderr.write('yacc: Parse error in input. EOF\n')
+                            return
+
+                else:
+                    errorcount = error_count
+
+                # case 1:  the statestack only has 1 entry on it.  The token is
+                # discarded and we just keep going.
+
+                if len(statestack) <= 1 and lookahead.type != '$end':
+                    lookahead = None
+                    errtoken = None
+                    state = 0
+                    # Nuke the pushback stack
+                    del lookaheadstack[:]
+                    continue
+
+                # case 2: the statestack has a couple of entries on it, but we're
+                # at the end of the file. nuke the top entry and generate an error token
+
+                # Start nuking entries on the stack
+                if lookahead.type == '$end':
+                    # Whoa. We're really hosed here. Bail out
+                    return
+
+                if lookahead.type != 'error':
+                    kid = valstack[-1]
+                    if kid < 0 and tokens[~kid].type == 'error':
+                        # Hmmm. Error is on top of stack, we'll just nuke input
+                        # symbol and continue
+                        lookahead = None
+                        continue
+
+                    # Create the error symbol for the first time and make it the new lookahead symbol
+                    t = YaccSymbol()
+                    t.type = 'error'
+
+                    if hasattr(lookahead, 'lineno'):
+                        t.lineno = t.endlineno = lookahead.lineno
+                    if hasattr(lookahead, 'lexpos'):
+                        t.lexpos = t.endlexpos = lookahead.lexpos
+                    t.value = lookahead
+                    lookaheadstack.append(lookahead)
+                    lookahead = t
+                else:
+                    valstack.pop()
+                    statestack.pop()
+                    state = statestack[-1]
+
+                continue
+
+            # Call an error function here
+            raise RuntimeError('yacc: internal parser error!!!\n')
+
+    # parse_glr().
+    #
+    # Parse input with a lexer object, following every action of the
+    # unresolved conflicts of the grammar (see GLR parsing above).  The
+    # grammar rules are called once the whole input has been parsed.  When
+    # there is more than one parse for part of the input, the rules are called
+    # for each of them, and merge(node, values) is called with the ForestNode
+    # and the list of values to get the value of the part.  Without merge, the
+    # value of the first parse is used.  Returns the value of the start
+    # symbol, or None if the input couldn't be parsed.  p_error() is called on
+    # a syntax error, but there is no error recovery.  Statistics of the parse
+    # are left in glr_report.
+    #
+    # The garbage collector is turned off meanwhile, as in IncrementalParser.
+    # An ambiguous input can make a forest of millions of objects, which the
+    # collector would otherwise scan over and over while it is being built.
+
+    def parse_glr(self, input=None, lexer=None, merge=None):
+        if not lexer:
+            from . import lex
+            lexer = lex.lexer
+
+        if input is not None:
+            lexer.input(input)
+
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            root = self.glr_from(lexer.token, lexer)
+            if root is None:
+                return None
+            return self.glr_value(root, lexer, merge)
+        finally:
+            if enabled:
+                gc.enable()
+
+    # glr_from().
+    #
+    # The parsing engine used by parse_glr().  Returns the root of the parse
+    # forest, or None if the input couldn't be parsed.  Until a conflict is
+    # reached, it is an ordinary LR parser whose stacks hold states, forest
+    # nodes or tokens, and the number of tokens shifted.  In a split region,
+    # heads maps the states of the stack heads to their GSSNodes and nodes
+    # maps (name, start) to the forest nodes ending at the current token,
+    # which are shared by all heads.
+
+    def glr_from(self, get_token, lexer=None):
+        actions = self.action                    # Local reference to action table (to avoid lookup on self.)
+        goto    = self.goto                      # Local reference to goto table (to avoid lookup on self.)
+        prod    = self.productions               # Local reference to production list (to avoid lookup on self.)
+        conflicts = self.conflicts               # Local reference to conflicting actions
+
+        # States with conflicts need the lookahead, so they are never defaulted
+        defaulted_states = {state: t for state, t in self.defaulted_states.items() if state not in conflicts}
+
+        # With empty rules, a new link can lengthen the paths of other heads
+        nullable = any(p.len == 0 for p in prod[1:])
+
+        report = self.glr_report = GLRReport()
+        started = time.perf_counter()
+
+        # Set the token function
+        self.token = get_token
+
+        statestack = [0]                         # Stack of parsing states
+        symstack = [None]                        # Stack of forest nodes and tokens
+        posstack = [0]                           # Stack of token counts
+        pos = 0                                  # Tokens shifted
+        lookahead = None
+
+        while True:
+            # Deterministic parsing.  Runs until a state and lookahead with
+            # a conflict is reached.
+            state = statestack[-1]
+            while True:
+                if state not in defaulted_states:
+                    if not lookahead:
+                        lookahead = get_token()     # Get the next token
+                        if not lookahead:
+                            lookahead = YaccSymbol()
+                            lookahead.type = '$end'
+
+                    ltype = lookahead.type
+                    if state in conflicts and ltype in conflicts[state]:
+                        break
+                    t = actions[state].get(ltype)
+                else:
+                    t = defaulted_states[state]
+
+                if t is None:
+                    self.glr_error(lookahead, lexer, state)
+                    report.tokens = pos
+                    report.time = time.perf_counter() - started
+                    return None
+
+                if t > 0:
+                    # shift a symbol on the stack
+                    statestack.append(t)
+                    state = t
+                    symstack.append(lookahead)
+                    pos += 1
+                    posstack.append(pos)
+                    lookahead = None
+                    continue
+
+                if t < 0:
+                    # reduce a symbol on the stack, adding a node to the forest
+                    p = prod[-t]
+                    plen = p.len
+                    if plen:
+                        node = ForestNode(p.name, posstack[-plen - 1], pos, [(-t, tuple(symstack[-plen:]))])
+                        del statestack[-plen:]
+                        del symstack[-plen:]
+                        del posstack[-plen:]
+                    else:
+                        node = ForestNode(p.name, pos, pos, [(-t, ())])
+                    state = goto[statestack[-1]][p.name]
+                    statestack.append(state)
+                    symstack.append(node)
+                    posstack.append(pos)
+                    continue
+
+                report.tokens = pos
+                report.time = time.perf_counter() - started
+                return symstack[-1]
+
+            # Split the stack.  The stacks become a chain of GSSNodes.
+            report.splits += 1
+            split = time.perf_counter()
+            head = None
+            for state, sym, n in zip(statestack, symstack, posstack):
+                below = head
+                head = GSSNode(state, n)
+                if below:
+                    head.link(below, sym)
+            heads = {head.state: head}
+
+            while True:
+                # Do all reductions with the lookahead.  Each work item is a
+                # head and either None, for all of its paths, or a new link,
+                # for the paths that start with it.
+                ltype = lookahead.type
+                nodes = {}
+                work = [(head, None) for head in heads.values()]
+                accepted = None
+                while work:
+                    head, link = work.pop()
+                    state = head.state
+                    acts = conflicts.get(state)
+                    acts = acts and acts.get(ltype)
+                    if acts is None:
+                        t = actions[state].get(ltype)
+                        acts = () if t is None else (t,)
+                    for t in acts:
+                        if t == 0:
+                            accepted = head.links[0][1]
+                        if t >= 0:
+                            continue
+                        p = prod[-t]
+                        if link and not p.len:
+                            continue
+                        name = p.name
+                        for base, children in gss_paths(head, p.len, link):
+                            node = nodes.get((name, base.pos))
+                            if node is None:
+                                node = nodes[name, base.pos] = ForestNode(name, base.pos, pos, [])
+                            node.add(-t, children)
+                            state = goto[base.state][name]
+                            top = heads.get(state)
+                            if top is None:
+                                top = heads[state] = GSSNode(state, pos)
+                                top.link(base, node)
+                                work.append((top, None))
+                            elif base not in top.below:
+                                work.append((top, top.link(base, node)))
+                                if nullable:
+                                    work.extend((other, None) for other in heads.values() if other is not top)
+
+                report.max_stacks = max(report.max_stacks, len(heads))
+                if accepted:
+                    report.tokens = pos
+                    now = time.perf_counter()
+                    report.split_time += now - split
+                    report.time = now - started
+                    return accepted
+
+                # Shift the lookahead onto every head that can shift it
+                shifted = {}
+                for head in heads.values():
+                    t = actions[head.state].get(ltype)
+                    if t is not None and t > 0:
+                        top = shifted.get(t)
+                        if top is None:
+                            top = shifted[t] = GSSNode(t, pos + 1)
+                        top.link(head, lookahead)
+
+                if not shifted:
+                    self.glr_error(lookahead, lexer, next(iter(heads)))
+                    report.tokens = pos
+                    now = time.perf_counter()
+                    report.split_time += now - split
+                    report.time = now - started
+                    return None
+
+                pos += 1
+                report.split_tokens += 1
+                heads = shifted
+                lookahead = get_token()
+                if not lookahead:
+                    lookahead = YaccSymbol()
+                    lookahead.type = '$end'
+
+                # Go back to a single stack if the stack is a single path
+                if len(heads) == 1:
+                    head, = heads.values()
+                    chain = [head]
+                    while len(head.links) == 1:
+                        head = head.links[0][0]
+                        chain.append(head)
+                    if not head.links:
+                        chain.reverse()
+                        statestack = [node.state for node in chain]
+                        posstack = [node.pos for node in chain]
+                        symstack = [None] + [node.links[0][1] for node in chain[1:]]
+                        report.split_time += time.perf_counter() - split
+                        break
+
+    # Report a syntax error found by glr_from()
+    def glr_error(self, lookahead, lexer, state):
+        errtoken = lookahead
+        if errtoken.type == '$end':
+            errtoken = None               # End of file!
+        if self.errorfunc:
+            if errtoken and lexer and not hasattr(errtoken, 'lexer'):
+                errtoken.lexer = lexer
+            self.state = state
+            self.errorfunc(errtoken)
+        elif errtoken:
+            lineno = getattr(errtoken, 'lineno', 0)
+            if lineno:
+                sys.stderr.write('yacc: Syntax error at line %d, token=%s\n' % (lineno, errtoken.type))
+            else:
+                sys.stderr.write('yacc: Syntax error, token=%s' % errtoken.type)
+        else:
+            sys.stderr.write('yacc: Parse error in input. EOF\n')
+
+    # glr_value().
+    #
+    # Compute the value of a parse forest made by glr_from() by calling the
+    # grammar rules, bottom up.  Each node is evaluated once, however many
+    # alternatives it is a child of.  merge is as for parse_glr().
+
+    def glr_value(self, root, lexer=None, merge=None):
+        prod = self.productions
+        pslice = YaccProduction(None, NoStack())
+        pslice.lexer = lexer
+        pslice.parser = self
+        symbols = {}                             # Symbols holding the values of the nodes, by id
+        expanded = set()                         # Nodes whose children are on the work stack
+        cyclic = False
+
+        # Depth first, a node is evaluated when it is back on top of the
+        # work stack after its children.  A child that is expanded but has
+        # no value yet is below on the work stack, so it is part of itself.
+        work = [root]
+        while work and not cyclic:
+            node = work[-1]
+            key = id(node)
+            if key in symbols:
+                work.pop()
+                continue
+            if key not in expanded:
+                expanded.add(key)
+                for _, children in node.alternatives:
+                    for child in children:
+                        if isinstance(child, ForestNode) and id(child) not in symbols:
+                            if id(child) in expanded:
+                                cyclic = True
+                            work.append(child)
+                if work[-1] is not node:
+                    continue
+            work.pop()
+
+            results = []
+            for prodnum, children in node.alternatives:
+                p = prod[prodnum]
+                sym = YaccSymbol()
+                sym.type = p.name
+                sym.value = None
+                targ = [sym]
+                for child in children:
+                    targ.append(symbols[id(child)] if isinstance(child, ForestNode) else child)
+                if p.callable:
+                    pslice.slice = targ
+                    p.callable(pslice)
+                results.append(sym.value)
+
+            sym = symbols[key] = YaccSymbol()
+            sym.type = node.type
+            if len(results) > 1 and merge:
+                sym.value = merge(node, results)
+            else:
+                sym.value = results[0]
+
+        if cyclic:
+            # Leave out the alternatives that make the cycles and start again
+            removed = break_cycles(root)
+            report = getattr(self, 'glr_report', None)
+            if report:
+                report.cycles += removed
+            return self.glr_value(root, lexer, merge)
+
+        return symbols[id(root)].value
+
+    # parse_async().
+    #
+    # Parse the data read from an asyncio.StreamReader.  Tokens are produced
+    # by lexer.tokens_async() and fed to a push parser as they arrive, so the
+    # whole input is never held in memory.  Extra keyword arguments are
+    # passed to tokens_async().  callbacks is as for push_context().
+
+    async def parse_async(self, reader, lexer=None, debug=False, tracking=False, callbacks=None, **kwargs):
+        if not lexer:
+            from . import lex
+            lexer = lex.lexer
+
+        p = self.push_context(lexer, callbacks, debug, tracking)
+        tokens = lexer.tokens_async(reader, **kwargs)
+        try:
+            async for tok in tokens:
+                p.feed(tok)
+                if p.done:
+                    break
+        finally:
+            await tokens.aclose()
+        return p.finish()
+
+    # parse_many().
+    #
+    # Parse many independent inputs in a pool of worker processes and return
+    # an iterator over the results, in the same order as the inputs.  The
+    # parser and lexer are sent to each worker once, when it starts, and the
+    # inputs are sent in batches of chunksize.  Each input is parsed with a
+    # fresh clone of the lexer, so line numbers and lexer states don't carry
+    # over from one input to the next.
+    #
+    # Anything written to sys.stdout or sys.stderr while parsing an input
+    # (usually by p_error()) is written out in the calling process just
+    # before its result is returned.  An exception raised while parsing an
+    # input is raised again at that point.
+    #
+    # Results must be picklable.  If workers is 1, everything runs in the
+    # calling process.
+
+    def parse_many(self, inputs, lexer=None, workers=None, chunksize=256, debug=False, tracking=False):
+        if not lexer:
+            from . import lex
+            lexer = lex.lexer
+
+        if workers == 1:
+            for data in inputs:
+                yield self.parse(data, lexer.clone(), debug, tracking)
+            return
+
+        import multiprocessing
+        with multiprocessing.Pool(workers, _parse_many_init, (self, lexer, debug, tracking)) as pool:
+            for batch in pool.imap(_parse_many_batch, _batches(inputs, chunksize)):
+                for result, out, err, exc in batch:
+                    if out:
+                        sys.stdout.write(out)
+                    if err:
+                        sys.stderr.write(err)
+                    if exc is not None:
+                        raise exc
+                    yield result
+
+# Make tokens from the columns passed to LRParser.parse_tokens()
+def column_tokens(types, values, positions, linenos=None):
+    from .lex import LexToken
+    if linenos is None:
+        linenos = itertools.repeat(0)
+    for type, value, lexpos, lineno in zip(types, values, positions, linenos):
+        tok = LexToken()
+        tok.type = type
+        tok.value = value
+        tok.lineno = lineno
+        tok.lexpos = lexpos
+        yield tok
+
+# Support functions for LRParser.parse_many().  These run in the worker
+# processes, which keep the parser and lexer in _parse_many_state.
+
+_parse_many_state = None
+
+def _parse_many_init(parser, lexer, debug, tracking):
+    global _parse_many_state
+    _parse_many_state = (parser, lexer, debug, tracking)
+
+def _parse_many_batch(batch):
+    parser, lexer, debug, tracking = _parse_many_state
+    stdout, stderr = sys.stdout, sys.stderr
+    results = []
+    try:
+        for data in batch:
+            out = sys.stdout = io.StringIO()
+            err = sys.stderr = io.StringIO()
+            result = exc = None
+            try:
+                result = parser.parse(data, lexer.clone(), debug, tracking)
+            except Exception as e:
+                exc = e
+            results.append((result, out.getvalue(), err.getvalue(), exc))
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+    return results
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# -----------------------------------------------------------------------------
+#                             == ParseContext ==
+#
+# A context holds the state of a single parse.  It shares the tables of the
+# LRParser it was created from, so creating one is cheap.  Within grammar
+# rules and p_error(), p.parser refers to the context.  Attributes that
+# aren't part of the parse state are looked up on the parser, so any
+# attributes attached to the parser are still visible.
+#
+# A context may be given a lexer to use when parse() is called without one.
+# -----------------------------------------------------------------------------
+
+class ParseContext(LRParser):
+    def __init__(self, parser, lexer=None):
+        self.parent = getattr(parser, 'parent', parser)
+        self.productions = parser.productions
+        self.action = parser.action
+        self.goto = parser.goto
+        self.conflicts = parser.conflicts
+        self.errorfunc = parser.errorfunc
+        self.defaulted_states = parser.defaulted_states
+        self.passthrough = parser.passthrough
+        self.nodes = parser.nodes
+        self.errorok = True
+        self.valstack = None
+        self.lexer = lexer
+
+    def __getattr__(self, name):
+        if name == 'parent':
+            raise AttributeError(name)
+        return getattr(self.parent, name)
+
+    def parse(self, input=None, lexer=None, debug=False, tracking=False):
+        return LRParser.parse(self, input, lexer or self.lexer, debug, tracking)
+
+    def parse_tokens(self, tokens, lexer=None, debug=False, tracking=False):
+        return LRParser.parse_tokens(self, tokens, lexer or self.lexer, debug, tracking)
+
+    def parse_async(self, reader, lexer=None, debug=False, tracking=False, callbacks=None, **kwargs):
+        return LRParser.parse_async(self, reader, lexer or self.lexer, debug, tracking, callbacks, **kwargs)
+
+# -----------------------------------------------------------------------------
+#                              == PushParser ==
+#
+# A parser that is driven by its caller instead of pulling tokens from a
+# lexer.  Each token is passed to feed(), which performs all of the shifts
+# and reductions it allows before returning.  finish() signals the end of
+# the input and returns the result of the parse:
+#
+#     p = parser.push_context()
+#     for tok in tokens:
+#         p.feed(tok)
+#     result = p.finish()
+#
+# callbacks is an optional dictionary mapping nonterminal names to functions.
+# Each time a rule for one of these nonterminals is reduced, the function is
+# called with the value of the rule.  This makes it possible to handle the
+# items of an unbounded stream as soon as they are recognized.
+#
+# Error recovery works as it does in parse().  However, p_error() can't read
+# ahead with parser.token(), since the tokens haven't arrived yet.  If it
+# calls errok() and returns None, parsing resumes with the next token fed.
+#
+# The parsing loop is a copy of the one in LRParser.parse() that saves its
+# state between calls.  Make sure changes get made in both locations.
+# -----------------------------------------------------------------------------
+
+class PushParser(ParseContext):
+    def __init__(self, parser, lexer=None, callbacks=None, debug=False, tracking=False):
+        ParseContext.__init__(self, parser, lexer)
+        if isinstance(debug, int) and debug:
+            debug = PlyLogger(sys.stderr)
+        self.callbacks = callbacks or {}
+        self.debug = debug
+        self.tracking = tracking
+        self.pslice = YaccProduction(None)
+        self.pslice.lexer = lexer
+        self.pslice.parser = self
+        self.statestack = []
+        self.symstack = []
+        self.restart()
+        self.state = 0
+        self.lookaheadstack = []
+        self.errorcount = 0
+        self.result = None
+        self.done = False
+
+        if debug:
+            debug.info('PLY: PARSE DEBUG START')
+
+    def token(self):
+        raise YaccError('token() is not available in a push parser')
+
+    def restart(self):
+        LRParser.restart(self)
+        self.pslice.stack = self.symstack
+
+    # Signal the end of the input and return the result of the parse
+    def finish(self):
+        if not self.done:
+            end = YaccSymbol()
+            end.type = '$end'
+            self.feed(end)
+        return self.result
+
+    # Supply the next token of the input.  The parser runs until it needs
+    # another token or the parse ends.
+    def feed(self, lookahead):
+        if self.done:
+            raise YaccError('feed() called after the end of the parse')
+
+        debug = self.debug
+        tracking = self.tracking
+        lexer = self.lexer
+        actions = self.action
+        goto    = self.goto
+        prod    = self.productions
+        defaulted_states = self.defaulted_states
+        callbacks = self.callbacks
+        pslice  = self.pslice
+        statestack = self.statestack
+        symstack = self.symstack
+        lookaheadstack = self.lookaheadstack
+        errorcount = self.errorcount
+        state = self.state
+
+        while True:
+            if debug:
+                debug.debug('State  : %s', state)
+
+            if state not in defaulted_states:
+                if not lookahead:
+                    if not lookaheadstack:
+                        # Wait for the next token
+                        self.state = state
+                        self.errorcount = errorcount
+                        return
+                    lookahead = lookaheadstack.pop()
+
+                # Check the action table
+                t = actions[state].get(lookahead.type)
+            else:
+                t = defaulted_states[state]
+                if debug:
+                    debug.debug('Defaulted state %s: Reduce using %d', state, -t)
+
+            if debug:
+                debug.debug('Stack  : %s',
+                            ('%s . %s' % (' '.join([xx.type for xx in symstack][1:]), str(lookahead))).lstrip())
+
             if t is not None:
                 if t > 0:
                     # shift a symbol on the stack
@@ -369,110 +2327,75 @@ class LRParser:
                     pname = p.name
                     plen  = p.len
 
-                    # Get production function
                     sym = YaccSymbol()
-                    sym.type = pname       # Production name
+                    sym.type = pname
                     sym.value = None
 
                     if debug:
-                        if plen:
-                            debug.info('Action : Reduce rule [%s] with %s and goto state %d', p.str,
-                                       '['+','.join([format_stack_entry(_v.value) for _v in symstack[-plen:]])+']',
-                                       goto[statestack[-1-plen]][pname])
-                        else:
-                            debug.info('Action : Reduce rule [%s] with %s and goto state %d', p.str, [],
-                                       goto[statestack[-1]][pname])
+                        debug.info('Action : Reduce rule [%s] with %s and goto state %d', p.str,
+                                   '['+','.join([format_stack_entry(_v.value) for _v in symstack[len(symstack)-plen:]])+']',
+                                   goto[statestack[-1-plen]][pname])
 
                     if plen:
                         targ = symstack[-plen-1:]
                         targ[0] = sym
-
                         if tracking:
                             t1 = targ[1]
-                            sym.lineno = t1.lineno
-                            sym.lexpos = t1.lexpos
+                            sym.lineno = getattr(t1, 'lineno', 0)
+                            sym.lexpos = getattr(t1, 'lexpos', 0)
                             t1 = targ[-1]
-                            sym.endlineno = getattr(t1, 'endlineno', t1.lineno)
-                            sym.endlexpos = getattr(t1, 'endlexpos', t1.lexpos)
-
-                        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-                        # The code enclosed in this section is duplicated
-                        # below as a performance optimization.  Make sure
-                        # changes get made in both locations.
-
-                        pslice.slice = targ
-
-                        try:
-                            # Call the grammar rule with our special slice object
-                            del symstack[-plen:]
-                            self.state = state
-                            p.callable(pslice)
-                            del statestack[-plen:]
-                            if debug:
-                                debug.info('Result : %s', format_result(pslice[0]))
-                            symstack.append(sym)
-                            state = goto[statestack[-1]][pname]
-                            statestack.append(state)
-                        except SyntaxError:
-                            # If an error was set. Enter error recovery state
-                            lookaheadstack.append(lookahead)    # Save the current lookahead token
-                            symstack.extend(targ[1:-1])         # Put the production slice back on the stack
-                            statestack.pop()                    # Pop back one state (before the reduce)
-                            state = statestack[-1]
-                            sym.type = 'error'
-                            sym.value = 'error'
-                            lookahead = sym
-                            errorcount = error_count
-                            self.errorok = False
-
-                        continue
-
+                            sym.endlineno = getattr(t1, 'endlineno', getattr(t1, 'lineno', 0))
+                            sym.endlexpos = getattr(t1, 'endlexpos', getattr(t1, 'lexpos', 0))
+                        del symstack[-plen:]
                     else:
-
                         if tracking:
-                            sym.lineno = lexer.lineno
-                            sym.lexpos = lexer.lexpos
-
+                            if lexer:
+                                sym.lineno = lexer.lineno
+                                sym.lexpos = lexer.lexpos
+                            else:
+                                sym.lineno = getattr(lookahead, 'lineno', 0)
+                                sym.lexpos = getattr(lookahead, 'lexpos', 0)
                         targ = [sym]
 
-                        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
-                        # The code enclosed in this section is duplicated
-                        # above as a performance optimization.  Make sure
-                        # changes get made in both locations.
-
-                        pslice.slice = targ
-
-                        try:
-                            # Call the grammar rule with our special slice object
-                            self.state = state
-                            p.callable(pslice)
-                            if debug:
-                                debug.info('Result : %s', format_result(pslice[0]))
-                            symstack.append(sym)
-                            state = goto[statestack[-1]][pname]
-                            statestack.append(state)
-                        except SyntaxError:
-                            # If an error was set. Enter error recovery state
-                            lookaheadstack.append(lookahead)    # Save the current lookahead token
-                            statestack.pop()                    # Pop back one state (before the reduce)
-                            state = statestack[-1]
-                            sym.type = 'error'
-                            sym.value = 'error'
-                            lookahead = sym
-                            errorcount = error_count
-                            self.errorok = False
+                    pslice.slice = targ
 
+                    try:
+                        # Call the grammar rule with our special slice object
+                        self.state = state
+                        p.callable(pslice)
+                        if plen:
+                            del statestack[-plen:]
+                        if debug:
+                            debug.info('Result : %s', format_result(pslice[0]))
+                        symstack.append(sym)
+                        state = goto[statestack[-1]][pname]
+                        statestack.append(state)
+                    except SyntaxError:
+                        # If an error was set. Enter error recovery state
+                        lookaheadstack.append(lookahead)    # Save the current lookahead token
+                        symstack.extend(targ[1:-1])         # Put the production slice back on the stack
+                        statestack.pop()                    # Pop back one state (before the reduce)
+                        state = statestack[-1]
+                        sym.type = 'error'
+                        sym.value = 'error'
+                        lookahead = sym
+                        errorcount = error_count
+                        self.errorok = False
                         continue
 
+                    if pname in callbacks:
+                        callbacks[pname](sym.value)
+                    continue
+
                 if t == 0:
-                    n = symstack[-1]
-                    result = getattr(n, 'value', None)
+                    self.result = getattr(symstack[-1], 'value', None)
 
                     if debug:
-                        debug.info('Done   : Returning %s', format_result(result))
+                        debug.info('Done   : Returning %s', format_result(self.result))
                         debug.info('PLY: PARSE DEBUG END')
 
-                    return result
+                    self.done = True
+                    return
 
             if t is None:
 
@@ -480,16 +2403,7 @@ class LRParser:
                     debug.error('Error  : %s',
                                 ('%s . %s' % (' '.join([xx.type for xx in symstack][1:]), str(lookahead))).lstrip())
 
-                # We have some kind of parsing error here.  To handle
-                # this, we are going to push the current token onto
-                # the tokenstack and replace it with an 'error' token.
-                # If there are any synchronization rules, they may
-                # catch it.
-                #
-                # In addition to pushing the error token, we call call
-                # the user defined p_error() function if this is the
-                # first syntax error.  This function is only called if
-                # errorcount == 0.
+                # See LRParser.parse() for a description of error recovery
                 if errorcount == 0 or self.errorok:
                     errorcount = error_count
                     self.errorok = False
@@ -497,7 +2411,7 @@ class LRParser:
                     if errtoken.type == '$end':
                         errtoken = None               # End of file!
                     if self.errorfunc:
-                        if errtoken and not hasattr(errtoken, 'lexer'):
+                        if errtoken and lexer and not hasattr(errtoken, 'lexer'):
                             errtoken.lexer = lexer
                         self.state = state
                         tok = self.errorfunc(errtoken)
@@ -506,53 +2420,42 @@ class LRParser:
                             # mode recovery on their own.  The
                             # returned token is the next lookahead
                             lookahead = tok
-                            errtoken = None
                             continue
                     else:
                         if errtoken:
-                            if hasattr(errtoken, 'lineno'):
-                                lineno = lookahead.lineno
-                            else:
-                                lineno = 0
+                            lineno = getattr(errtoken, 'lineno', 0)
                             if lineno:
                                 sys.stderr.write('yacc: Syntax error at line %d, token=%s\n' % (lineno, errtoken.type))
                             else:
                                 sys.stderr.write('yacc: Syntax error, token=%s' % errtoken.type)
                         else:
                             sys.stderr.write('yacc: Parse error in input. EOF\n')
+                            self.done = True
                             return
 
                 else:
                     errorcount = error_count
 
-                # case 1:  the statestack only has 1 entry on it.  If we're in this state, the
-                # entire parse has been rolled back and we're completely hosed.   The token is
-                # discarded and we just keep going.
-
+                # case 1:  the statestack only has 1 entry on it.  The
+                # entire parse has been rolled back.  Discard the token.
                 if len(statestack) <= 1 and lookahead.type != '$end':
                     lookahead = None
-                    errtoken = None
                     state = 0
-                    # Nuke the pushback stack
                     del lookaheadstack[:]
                     continue
 
-                # case 2: the statestack has a couple of entries on it, but we're
-                # at the end of the file. nuke the top entry and generate an error token
-
-                # Start nuking entries on the stack
+                # case 2: at the end of the file with nothing to recover
                 if lookahead.type == '$end':
-                    # Whoa. We're really hosed here. Bail out
+                    self.done = True
                     return
 
                 if lookahead.type != 'error':
                     sym = symstack[-1]
                     if sym.type == 'error':
-                        # Hmmm. Error is on top of stack, we'll just nuke input
-                        # symbol and continue
+                        # Error is on top of stack, discard the input symbol
                         if tracking:
-                            sym.endlineno = getattr(lookahead, 'lineno', sym.lineno)
-                            sym.endlexpos = getattr(lookahead, 'lexpos', sym.lexpos)
+                            sym.endlineno = getattr(lookahead, 'lineno', getattr(sym, 'lineno', 0))
+                            sym.endlexpos = getattr(lookahead, 'lexpos', getattr(sym, 'lexpos', 0))
                         lookahead = None
                         continue
 
@@ -570,8 +2473,8 @@ class LRParser:
                 else:
                     sym = symstack.pop()
                     if tracking:
-                        lookahead.lineno = sym.lineno
-                        lookahead.lexpos = sym.lexpos
+                        lookahead.lineno = getattr(sym, 'lineno', 0)
+                        lookahead.lexpos = getattr(sym, 'lexpos', 0)
                     statestack.pop()
                     state = statestack[-1]
 
@@ -580,6 +2483,327 @@ class LRParser:
             # If we'r here, something really bad happened
             raise RuntimeError('yacc: internal parser error!!!\n')
 
+# -----------------------------------------------------------------------------
+#                           == IncrementalParser ==
+#
+# A parser for documents that are edited and parsed again, such as the
+# buffer of an editor.  After each parse, the parse tree is kept as a tree
+# of ParseNode objects.  When the document is edited, only the text around
+# the edit is lexed again, and the new parse reuses the subtrees of the old
+# one that weren't affected by the edit.  The work done is roughly
+# proportional to the size of the edit and the depth of the tree rather
+# than to the size of the document.
+#
+# This follows the incremental LR parsing algorithm of Wagner and Graham.
+# The old tree is used as the input of the parser.  A subtree is shifted
+# as a whole if none of its tokens changed, the token that followed it
+# (which may have been used as the lookahead for its reductions) didn't
+# change, and the parser is in the same state as when the subtree was
+# first built.  Otherwise, it is broken down into its children.  Grammar
+# rules aren't called again for reused subtrees, so rules should only
+# compute a value from their arguments.
+#
+# Positions are always tracked.  If a syntax error occurs, the input is
+# parsed again with the normal engine so that p_error() and error recovery
+# work as usual.  No tree is kept in that case, and the next parse starts
+# from scratch.
+#
+#     p = parser.incremental(lexer)
+#     result = p.parse(text)
+#     result = p.edit(start, end, newtext)    # Replace text[start:end]
+# -----------------------------------------------------------------------------
+
+# A node of the parse tree kept by IncrementalParser.
+#
+#    sym       - The YaccSymbol of the rule (with its value and positions)
+#    state     - Parser state below the node when it was built
+#    size      - Number of tokens covered
+#    children  - Child nodes and tokens
+#    first     - First token covered (None if empty)
+#    last      - Last token covered (None if empty)
+
+class ParseNode:
+    __slots__ = ('sym', 'state', 'size', 'children', 'first', 'last')
+
+    def __init__(self, sym, state, size, children, first, last):
+        self.sym = sym
+        self.state = state
+        self.size = size
+        self.children = children
+        self.first = first
+        self.last = last
+
+    def __repr__(self):
+        return 'ParseNode(%s, %d tokens)' % (self.sym.type, self.size)
+
+class IncrementalParser(ParseContext):
+    def __init__(self, parser, lexer=None):
+        ParseContext.__init__(self, parser, lexer)
+        self.text = ''
+        self.tokens = []
+        self.tree = None
+        self.reused = 0          # Subtrees reused by the last parse
+        self.reductions = 0      # Grammar rules called by the last parse
+
+    # Parse a complete document
+    def parse(self, input):
+        lexer = self.lexer
+        if not lexer:
+            from . import lex
+            lexer = self.lexer = lex.lexer
+        lexer.lineno = 1
+        lexer.lexrelex = True
+        lexer.input(input)
+        self.text = input
+        self.tokens = list(lexer)
+        return self.run([(tok, None) for tok in reversed(self.tokens)], 0, 0, None)
+
+    # Replace text[start:end] with newtext and parse the document again
+    def edit(self, start, end, newtext):
+        if self.tree is None:
+            return self.parse(self.text[:start] + newtext + self.text[end:])
+
+        a, b, newtokens = self.relex(start, end, newtext)
+        return self.run([(self.tree, 0)], a, b, newtokens)
+
+    # Lex the text around an edit.  The tokens of the old text in
+    # self.tokens[a:b] are replaced by newtokens.  The positions of the
+    # following tokens are adjusted lazily by the lexer (see Lexer.relex).
+    # Returns (a, b, newtokens).
+    def relex(self, start, end, newtext):
+        lexer = self.lexer
+        self.text = self.text[:start] + newtext + self.text[end:]
+        self.tokens = lexer.relex(self.tokens, start, end, newtext)
+        a, b, n = lexer.relexrange
+        return a, b, self.tokens[a:a+n]
+
+    # Run the parsing engine.  The garbage collector is turned off meanwhile.
+    # The parse tree has no reference cycles, and scanning it over and over
+    # while it is being built would otherwise take most of the time.
+    def run(self, pending, a, b, newtokens):
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self.reparse(pending, a, b, newtokens)
+        finally:
+            if enabled:
+                gc.enable()
+
+    # The parsing engine.  pending is a stack of (item, start) pairs, where
+    # item is a ParseNode or a token, and start is the index of its first
+    # token before the edit (None for new tokens).  Old tokens in [a, b)
+    # are replaced by newtokens.
+    def reparse(self, pending, a, b, newtokens):
+        actions = self.action
+        goto    = self.goto
+        prod    = self.productions
+        defaulted_states = self.defaulted_states
+        pslice  = YaccProduction(None)
+        lexer   = self.lexer
+        adjust  = lexer.adjust
+
+        pslice.lexer = lexer
+        pslice.parser = self
+        statestack = self.statestack = [0]
+        sym = YaccSymbol()
+        sym.type = '$end'
+        symstack = self.symstack = [sym]
+        nodestack = [None]
+        pslice.stack = symstack
+        state = 0
+        reused = 0
+        reductions = 0
+        end = YaccSymbol()
+        end.type = '$end'
+        emitted = newtokens is None
+
+        while True:
+            # Get the next item of the input
+            if pending:
+                item, start = pending[-1]
+            else:
+                item = end
+                start = None
+
+            if not emitted and (item is end or (start is not None and start >= a)):
+                emitted = True
+                pending.extend([(tok, None) for tok in reversed(newtokens)])
+                continue
+
+            if item.__class__ is ParseNode:
+                if item.size and (start + item.size < a or start >= b):
+                    if state == item.state:
+                        # Shift the whole subtree
+                        sym = item.sym
+                        first = adjust(item.first)
+                        last = adjust(item.last)
+                        sym.lineno = first.lineno
+                        sym.lexpos = first.lexpos
+                        sym.endlineno = getattr(last, 'endlineno', last.lineno)
+                        sym.endlexpos = getattr(last, 'endlexpos', last.lexpos)
+                        symstack.append(sym)
+                        nodestack.append(item)
+                        state = goto[state][sym.type]
+                        statestack.append(state)
+                        pending.pop()
+                        reused += 1
+                        continue
+
+                    # Reductions may lead to the state of the subtree
+                    if state in defaulted_states:
+                        t = defaulted_states[state]
+                    else:
+                        t = actions[state].get(item.first.type)
+                    if t is None or t >= 0:
+                        t = None
+                else:
+                    t = None
+
+                if t is None:
+                    # Break the subtree down into its children
+                    pending.pop()
+                    if start is not None:
+                        pos = start + item.size
+                        for child in reversed(item.children):
+                            pos -= child.size if child.__class__ is ParseNode else 1
+                            pending.append((child, pos))
+                    continue
+                lookahead = adjust(item.first)
+            else:
+                if start is not None and a <= start < b:
+                    # A token that was replaced by the edit
+                    pending.pop()
+                    continue
+                lookahead = item
+                if start is not None:
+                    adjust(item)
+                if state in defaulted_states:
+                    t = defaulted_states[state]
+                else:
+                    t = actions[state].get(item.type)
+
+            if t is None:
+                # Syntax error.  Parse again with error recovery
+                return self.fallback()
+
+            if t > 0:
+                # shift a token on the stack
+                symstack.append(item)
+                nodestack.append(item)
+                statestack.append(t)
+                state = t
+                pending.pop()
+                continue
+
+            if t < 0:
+                # reduce a symbol on the stack
+                p = prod[-t]
+                pname = p.name
+                plen  = p.len
+
+                sym = YaccSymbol()
+                sym.type = pname
+                sym.value = None
+
+                if plen:
+                    targ = symstack[-plen-1:]
+                    targ[0] = sym
+                    t1 = targ[1]
+                    sym.lineno = t1.lineno
+                    sym.lexpos = t1.lexpos
+                    t1 = targ[-1]
+                    sym.endlineno = getattr(t1, 'endlineno', t1.lineno)
+                    sym.endlexpos = getattr(t1, 'endlexpos', t1.lexpos)
+
+                    children = nodestack[-plen:]
+                    size = 0
+                    first = last = None
+                    for child in children:
+                        if child.__class__ is ParseNode:
+                            if child.size:
+                                size += child.size
+                                if first is None:
+                                    first = child.first
+                                last = child.last
+                        else:
+                            size += 1
+                            if first is None:
+                                first = child
+                            last = child
+                    node = ParseNode(sym, statestack[-plen-1], size, children, first, last)
+                else:
+                    sym.lineno = getattr(lookahead, 'lineno', 0)
+                    sym.lexpos = getattr(lookahead, 'lexpos', 0)
+                    targ = [sym]
+                    node = ParseNode(sym, state, 0, (), None, None)
+
+                pslice.slice = targ
+
+                try:
+                    # Call the grammar rule with our special slice object
+                    if plen:
+                        del symstack[-plen:]
+                    self.state = state
+                    p.callable(pslice)
+                except SyntaxError:
+                    return self.fallback()
+                reductions += 1
+
+                if plen:
+                    del statestack[-plen:]
+                    del nodestack[-plen:]
+                symstack.append(sym)
+                nodestack.append(node)
+                state = goto[statestack[-1]][pname]
+                statestack.append(state)
+                continue
+
+            if t == 0:
+                self.tree = nodestack[-1]
+                self.reused = reused
+                self.reductions = reductions
+                return getattr(symstack[-1], 'value', None)
+
+    # Parse the tokens with the normal engine after a syntax error
+    def fallback(self):
+        self.tree = None
+        self.reused = 0
+        self.reductions = 0
+        for tok in self.tokens:
+            self.lexer.adjust(tok)
+        return self.parse_tokens(self.tokens, self.lexer, tracking=True)
+
+# -----------------------------------------------------------------------------
+#                              == ParserPool ==
+#
+# Hands out a separate ParseContext to each thread so that a parser can
+# serve many threads without building its tables again.  If a lexer is
+# given, each thread also gets its own clone of it (see lex.LexerPool).
+#
+#    pool = ParserPool(parser, lexer)
+#    result = pool.parse(data)          # Safe to call from any thread
+# -----------------------------------------------------------------------------
+
+class ParserPool:
+    def __init__(self, parser, lexer=None):
+        if lexer is not None and not hasattr(lexer, 'get'):
+            from .lex import LexerPool
+            lexer = LexerPool(lexer)
+        self.parser = parser
+        self.lexers = lexer
+        self.local = threading.local()
+
+    # Return the context for the calling thread
+    def get(self):
+        context = getattr(self.local, 'context', None)
+        if context is None:
+            lexer = self.lexers.get() if self.lexers is not None else None
+            context = self.local.context = self.parser.context(lexer)
+        return context
+
+    def parse(self, input=None, lexer=None, debug=False, tracking=False):
+        return self.get().parse(input, lexer, debug, tracking)
+
 # -----------------------------------------------------------------------------
 #                          === Grammar Representation ===
 #
@@ -681,6 +2905,33 @@ class Production(object):
     def bind(self, pdict):
         if self.func:
             self.callable = pdict[self.func]
+            if hasattr(self.callable, 'node'):
+                self.callable = node_action(self.callable, self.len, self.file, self.line)
+
+# -----------------------------------------------------------------------------
+# class MiniProduction
+#
+# A production as seen by the parsing engine, which only needs the name,
+# the length and the function to call.  The string is kept for debugging
+# messages.  LRParser.compact() replaces Production objects with these,
+# dropping the symbols, precedence and other data only used to build
+# the tables.
+# -----------------------------------------------------------------------------
+
+class MiniProduction(object):
+    __slots__ = ('name', 'len', 'callable', 'str')
+
+    def __init__(self, name, len, callable, str):
+        self.name     = name
+        self.len      = len
+        self.callable = callable
+        self.str      = str
+
+    def __str__(self):
+        return self.str
+
+    def __repr__(self):
+        return 'MiniProduction(%s)' % self.str
 
 # -----------------------------------------------------------------------------
 # class LRItem
@@ -930,17 +3181,16 @@ class Grammar(object):
 
     def find_unreachable(self):
 
-        # Mark all symbols that are reachable from a symbol s
-        def mark_reachable_from(s):
-            if s in reachable:
-                return
-            reachable.add(s)
-            for p in self.Prodnames.get(s, []):
+        # Mark all symbols that are reachable from the starting symbol
+        start = self.Productions[0].prod[0]
+        reachable = {start}
+        todo = [start]
+        while todo:
+            for p in self.Prodnames.get(todo.pop(), []):
                 for r in p.prod:
-                    mark_reachable_from(r)
-
-        reachable = set()
-        mark_reachable_from(self.Productions[0].prod[0])
+                    if r not in reachable:
+                        reachable.add(r)
+                        todo.append(r)
         return [s for s in self.Nonterminals if s not in reachable]
 
     # -----------------------------------------------------------------------------
@@ -966,35 +3216,32 @@ class Grammar(object):
         for n in self.Nonterminals:
             terminates[n] = False
 
-        # Then propagate termination until no change:
-        while True:
-            some_change = False
-            for (n, pl) in self.Prodnames.items():
-                # Nonterminal n terminates iff any of its productions terminates.
-                for p in pl:
-                    # Production p terminates iff all of its rhs symbols terminate.
-                    for s in p.prod:
-                        if not terminates[s]:
-                            # The symbol s does not terminate,
-                            # so production p does not terminate.
-                            p_terminates = False
-                            break
-                    else:
-                        # didn't break from the loop,
-                        # so every symbol s terminates
-                        # so production p terminates.
-                        p_terminates = True
-
-                    if p_terminates:
-                        # symbol n terminates!
-                        if not terminates[n]:
-                            terminates[n] = True
-                            some_change = True
-                        # Don't need to consider any more productions for this n.
-                        break
-
-            if not some_change:
-                break
+        # Then propagate termination.  A production terminates iff all of its
+        # rhs symbols terminate, and a nonterminal terminates iff any of its
+        # productions terminates.  For each production, count the rhs symbols
+        # not known to terminate.  Each time a symbol is found to terminate,
+        # the counts of the productions using it go down.
+        remaining = {}
+        users = {}
+        todo = []
+        for pl in self.Prodnames.values():
+            for p in pl:
+                count = 0
+                for s in p.prod:
+                    if not terminates[s]:
+                        count += 1
+                        users.setdefault(s, []).append(p)
+                remaining[p.number] = count
+                if count == 0 and not terminates[p.name]:
+                    terminates[p.name] = True
+                    todo.append(p.name)
+
+        while todo:
+            for p in users.get(todo.pop(), []):
+                remaining[p.number] -= 1
+                if remaining[p.number] == 0 and not terminates[p.name]:
+                    terminates[p.name] = True
+                    todo.append(p.name)
 
         infinite = []
         for (s, term) in terminates.items():
@@ -1131,17 +3378,32 @@ class Grammar(object):
         for n in self.Nonterminals:
             self.First[n] = []
 
-        # Then propagate symbols until no change:
-        while True:
+        # Then propagate symbols until no change.  A nonterminal only has to
+        # be looked at again when the FIRST set of a symbol used in one of
+        # its productions has changed.
+        users = {}
+        for n in self.Nonterminals:
+            for p in self.Prodnames[n]:
+                for s in p.prod:
+                    users.setdefault(s, {})[n] = True
+
+        todo = collections.deque(self.Nonterminals)
+        queued = set(todo)
+        while todo:
+            n = todo.popleft()
+            queued.discard(n)
+            first = self.First[n]
             some_change = False
-            for n in self.Nonterminals:
-                for p in self.Prodnames[n]:
-                    for f in self._first(p.prod):
-                        if f not in self.First[n]:
-                            self.First[n].append(f)
-                            some_change = True
-            if not some_change:
-                break
+            for p in self.Prodnames[n]:
+                for f in self._first(p.prod):
+                    if f not in first:
+                        first.append(f)
+                        some_change = True
+            if some_change:
+                for m in users.get(n, ()):
+                    if m not in queued:
+                        queued.add(m)
+                        todo.append(m)
 
         return self.First
 
@@ -1274,28 +3536,58 @@ def digraph(X, R, FP):
             traverse(x, N, stack, F, X, R, FP)
     return F
 
+# traverse() is Tarjan's algorithm for strongly connected components, run
+# with an explicit stack instead of recursion so that long chains of
+# relations don't run out of Python stack frames.  Each entry of work is
+# (x, d, iterator over the y's related to x).  All members of a component
+# end up sharing the same list F[x].  F lists may also be shared through
+# FP, so a set of the members of each list is kept, indexed by id().  The
+# list is kept with its set so that its id() can't be reused.
+
 def traverse(x, N, stack, F, X, R, FP):
+    members = {}
+
+    def union(x, y):
+        N[x] = min(N[x], N[y])
+        fx = F[x]
+        fy = F[y]
+        if fx is not fy:
+            entry = members.get(id(fx))
+            if entry is None:
+                entry = members[id(fx)] = (fx, set(fx))
+            seen = entry[1]
+            for a in fy:
+                if a not in seen:
+                    seen.add(a)
+                    fx.append(a)
+
     stack.append(x)
     d = len(stack)
     N[x] = d
     F[x] = FP(x)             # F(X) <- F'(x)
-
-    rel = R(x)               # Get y's related to x
-    for y in rel:
-        if N[y] == 0:
-            traverse(y, N, stack, F, X, R, FP)
-        N[x] = min(N[x], N[y])
-        for a in F.get(y, []):
-            if a not in F[x]:
-                F[x].append(a)
-    if N[x] == d:
-        N[stack[-1]] = MAXINT
-        F[stack[-1]] = F[x]
-        element = stack.pop()
-        while element != x:
-            N[stack[-1]] = MAXINT
-            F[stack[-1]] = F[x]
-            element = stack.pop()
+    work = [(x, d, iter(R(x)))]
+    while work:
+        x, d, rel = work[-1]
+        for y in rel:
+            if N[y] == 0:
+                stack.append(y)
+                N[y] = len(stack)
+                F[y] = FP(y)
+                work.append((y, len(stack), iter(R(y))))
+                break
+            union(x, y)
+        else:
+            work.pop()
+            if N[x] == d:
+                N[stack[-1]] = MAXINT
+                F[stack[-1]] = F[x]
+                element = stack.pop()
+                while element != x:
+                    N[stack[-1]] = MAXINT
+                    F[stack[-1]] = F[x]
+                    element = stack.pop()
+            if work:
+                union(work[-1][0], x)
 
 class LALRError(YaccError):
     pass
@@ -1320,9 +3612,10 @@ class LRTable:
         # Internal attributes
         self.lr_action     = {}        # Action table
         self.lr_goto       = {}        # Goto table
+        self.lr_conflicts  = {}        # All actions of unresolved conflicts, for GLR parsing
         self.lr_productions  = grammar.Productions    # Copy of grammar Production array
-        self.lr_goto_cache = {}        # Cache of computed gotos
-        self.lr0_cidhash   = {}        # Cache of closures
+        self.lr0_trans     = []        # LR(0) transitions of each state
+        self.lr_lookaheads = []        # LALR lookaheads of the items in each state
 
         self._add_count    = 0         # Internal counter used to detect cycles
 
@@ -1335,7 +3628,7 @@ class LRTable:
         self.rr_conflicts  = []
 
         # Build the tables
-        self.grammar.build_lritems()
+        self.build_items()
         self.grammar.compute_first()
         self.grammar.compute_follow()
         self.lr_parse_table()
@@ -1345,94 +3638,111 @@ class LRTable:
         for p in self.lr_productions:
             p.bind(pdict)
 
+    # -----------------------------------------------------------------------------
+    # build_items()
+    #
+    # Numbers all of the LR items of the grammar.  Rather than creating an LRItem
+    # object for each stage of each production, an item is an integer and its
+    # properties are kept in flat lists indexed by it.  The items of production
+    # p are numbered lr_item_start[p.number] + n where n is the position of
+    # the dot, so the item following item i is always i + 1.
+    #
+    #       lr_item_prod   - Production number of each item
+    #       lr_item_dot    - Position of the dot (the lr_index of an LRItem)
+    #       lr_item_sym    - Grammar symbol right after the dot, None at the end
+    #       lr_item_after  - Items starting the productions of lr_item_sym
+    #
+    # LRItem objects are only created by lr_item() for debugging output.
+    # -----------------------------------------------------------------------------
+
+    def build_items(self):
+        Productions = self.grammar.Productions
+        self.lr_item_start = []
+        self.lr_item_prod  = []
+        self.lr_item_dot   = []
+        self.lr_item_sym   = []
+        for p in Productions:
+            self.lr_item_start.append(len(self.lr_item_prod))
+            for n in range(p.len + 1):
+                self.lr_item_prod.append(p.number)
+                self.lr_item_dot.append(n)
+                self.lr_item_sym.append(p.prod[n] if n < p.len else None)
+
+        # The items starting the productions of each nonterminal are shared
+        # by every item having the dot in front of it
+        starts = {}
+        for name, prods in self.grammar.Prodnames.items():
+            starts[name] = [self.lr_item_start[p.number] for p in prods]
+        self.lr_item_after = [starts.get(s, ()) for s in self.lr_item_sym]
+
+        # Marks used by lr0_closure() to add each production only once
+        self.lr0_added = [0] * len(self.lr_item_prod)
+
+    # Return item n as an LRItem
+    def lr_item(self, n):
+        return LRItem(self.grammar.Productions[self.lr_item_prod[n]], self.lr_item_dot[n])
+
     # Compute the LR(0) closure operation on I, where I is a set of LR(0) items.
 
     def lr0_closure(self, I):
         self._add_count += 1
-
-        # Add everything in I to J
-        J = I[:]
-        didadd = True
-        while didadd:
-            didadd = False
-            for j in J:
-                for x in j.lr_after:
-                    if getattr(x, 'lr0_added', 0) == self._add_count:
-                        continue
-                    # Add B --> .G to J
-                    J.append(x.lr_next)
-                    x.lr0_added = self._add_count
-                    didadd = True
+        added = self.lr0_added
+        after = self.lr_item_after
+
+        # Add everything in I to J.  Items appended to J are visited too.
+        J = list(I)
+        for j in J:
+            for x in after[j]:
+                if added[x] == self._add_count:
+                    continue
+                # Add B --> .G to J
+                J.append(x)
+                added[x] = self._add_count
 
         return J
 
-    # Compute the LR(0) goto function goto(I,X) where I is a set
-    # of LR(0) items and X is a grammar symbol.   This function is written
-    # in a way that guarantees uniqueness of the generated goto sets
-    # (i.e. the same goto set will never be returned as two different Python
-    # objects).  With uniqueness, we can later do fast set comparisons using
-    # id(obj) instead of element-wise comparison.
-
-    def lr0_goto(self, I, x):
-        # First we look for a previously cached entry
-        g = self.lr_goto_cache.get((id(I), x))
-        if g:
-            return g
-
-        # Now we generate the goto set in a way that guarantees uniqueness
-        # of the result
-
-        s = self.lr_goto_cache.get(x)
-        if not s:
-            s = {}
-            self.lr_goto_cache[x] = s
-
-        gs = []
-        for p in I:
-            n = p.lr_next
-            if n and n.lr_before == x:
-                s1 = s.get(id(n))
-                if not s1:
-                    s1 = {}
-                    s[id(n)] = s1
-                gs.append(n)
-                s = s1
-        g = s.get('$end')
-        if not g:
-            if gs:
-                g = self.lr0_closure(gs)
-                s['$end'] = g
-            else:
-                s['$end'] = gs
-        self.lr_goto_cache[(id(I), x)] = g
-        return g
+    # Return the state reached from state i on grammar symbol x or -1 if
+    # there is no such transition
+
+    def lr0_goto(self, i, x):
+        return self.lr0_trans[i].get(x, -1)
+
+    # Compute the LR(0) sets of items.  A state is identified by its kernel,
+    # the sorted tuple of the items the state was reached with (the start
+    # item for state 0), so each set of items is only created once.  The
+    # closure of a state is computed from its kernel when the state is
+    # visited.  The transitions of each state, grouped by the symbol after
+    # the dot of the items, are stored in lr0_trans.
 
-    # Compute the LR(0) sets of item function
     def lr0_items(self):
-        C = [self.lr0_closure([self.grammar.Productions[0].lr_next])]
-        i = 0
-        for I in C:
-            self.lr0_cidhash[id(I)] = i
-            i += 1
-
-        # Loop over the items in C and each grammar symbols
-        i = 0
-        while i < len(C):
-            I = C[i]
-            i += 1
-
-            # Collect all of the symbols that could possibly be in the goto(I,X) sets
-            asyms = {}
-            for ii in I:
-                for s in ii.usyms:
-                    asyms[s] = None
-
-            for x in asyms:
-                g = self.lr0_goto(I, x)
-                if not g or id(g) in self.lr0_cidhash:
-                    continue
-                self.lr0_cidhash[id(g)] = len(C)
-                C.append(g)
+        sym = self.lr_item_sym
+        kernels = [(self.lr_item_start[0],)]
+        states = {kernels[0]: 0}
+
+        C = []
+        while len(C) < len(kernels):
+            I = self.lr0_closure(kernels[len(C)])
+            C.append(I)
+
+            # Collect the kernels of goto(I,X) for each symbol X after a dot
+            gotos = {}
+            for p in I:
+                x = sym[p]
+                if x is not None:
+                    if x in gotos:
+                        gotos[x].append(p + 1)
+                    else:
+                        gotos[x] = [p + 1]
+
+            trans = {}
+            for x, kernel in gotos.items():
+                kernel = tuple(sorted(kernel))
+                j = states.get(kernel)
+                if j is None:
+                    j = states[kernel] = len(kernels)
+                    kernels.append(kernel)
+                trans[x] = j
+            self.lr0_trans.append(trans)
 
         return C
 
@@ -1495,12 +3805,15 @@ class LRTable:
 
     def find_nonterminal_transitions(self, C):
         trans = []
+        seen = set()
+        sym = self.lr_item_sym
         for stateno, state in enumerate(C):
             for p in state:
-                if p.lr_index < p.len - 1:
-                    t = (stateno, p.prod[p.lr_index+1])
+                if sym[p] is not None:
+                    t = (stateno, sym[p])
                     if t[1] in self.grammar.Nonterminals:
-                        if t not in trans:
+                        if t not in seen:
+                            seen.add(t)
                             trans.append(t)
         return trans
 
@@ -1517,10 +3830,10 @@ class LRTable:
         state, N = trans
         terms = []
 
-        g = self.lr0_goto(C[state], N)
+        g = C[self.lr0_goto(state, N)]
         for p in g:
-            if p.lr_index < p.len - 1:
-                a = p.prod[p.lr_index+1]
+            a = self.lr_item_sym[p]
+            if a is not None:
                 if a in self.grammar.Terminals:
                     if a not in terms:
                         terms.append(a)
@@ -1542,11 +3855,10 @@ class LRTable:
         rel = []
         state, N = trans
 
-        g = self.lr0_goto(C[state], N)
-        j = self.lr0_cidhash.get(id(g), -1)
-        for p in g:
-            if p.lr_index < p.len - 1:
-                a = p.prod[p.lr_index + 1]
+        j = self.lr0_goto(state, N)
+        for p in C[j]:
+            a = self.lr_item_sym[p]
+            if a is not None:
                 if a in empty:
                     rel.append((j, a))
 
@@ -1589,22 +3901,33 @@ class LRTable:
         for t in trans:
             dtrans[t] = 1
 
+        Productions = self.grammar.Productions
+        item_prod = self.lr_item_prod
+        item_dot  = self.lr_item_dot
+        item_sym  = self.lr_item_sym
+
+        # Items of each state, grouped by name
+        named = {}
+
         # Loop over all transitions and compute lookbacks and includes
         for state, N in trans:
             lookb = []
             includes = []
-            for p in C[state]:
-                if p.name != N:
-                    continue
+            if state not in named:
+                named[state] = {}
+                for p in C[state]:
+                    named[state].setdefault(Productions[item_prod[p]].name, []).append(p)
+            for p in named[state].get(N, []):
 
                 # Okay, we have a name match.  We now follow the production all the way
                 # through the state machine until we get the . on the right hand side
 
-                lr_index = p.lr_index
+                prod = Productions[item_prod[p]].prod
+                lr_index = item_dot[p]
                 j = state
-                while lr_index < p.len - 1:
+                while lr_index < len(prod):
+                    t = prod[lr_index]
                     lr_index = lr_index + 1
-                    t = p.prod[lr_index]
 
                     # Check to see if this symbol and state are a non-terminal transition
                     if (j, t) in dtrans:
@@ -1612,33 +3935,29 @@ class LRTable:
                         # the only way to know for certain is whether the rest of the
                         # production derives empty
 
-                        li = lr_index + 1
-                        while li < p.len:
-                            if p.prod[li] in self.grammar.Terminals:
+                        li = lr_index
+                        while li < len(prod):
+                            if prod[li] in self.grammar.Terminals:
                                 break      # No forget it
-                            if p.prod[li] not in nullable:
+                            if prod[li] not in nullable:
                                 break
                             li = li + 1
                         else:
                             # Appears to be a relation between (j,t) and (state,N)
                             includes.append((j, t))
 
-                    g = self.lr0_goto(C[j], t)               # Go to next set
-                    j = self.lr0_cidhash.get(id(g), -1)      # Go to next state
+                    j = self.lr0_goto(j, t)                  # Go to next state
 
-                # When we get here, j is the final state, now we have to locate the production
+                # When we get here, j is the final state, now we have to locate the production.
+                # This is comparing a production ". A B C" with "A B C ." by the symbols
+                # following the first one of the item
+                d = item_dot[p]
+                rhs = prod if d == 0 else prod[1:d] + ('.',) + prod[d:]
                 for r in C[j]:
-                    if r.name != p.name:
-                        continue
-                    if r.len != p.len:
+                    if item_sym[r] is not None:
                         continue
-                    i = 0
-                    # This look is comparing a production ". A B C" with "A B C ."
-                    while i < r.lr_index:
-                        if r.prod[i] != p.prod[i+1]:
-                            break
-                        i = i + 1
-                    else:
+                    rp = Productions[item_prod[r]]
+                    if rp.name == N and rp.prod == rhs:
                         lookb.append((j, r))
             for i in includes:
                 if i not in includedict:
@@ -1696,20 +4015,26 @@ class LRTable:
     # Inputs:    lookbacks         -  Set of lookback relations
     #            followset         -  Computed follow set
     #
-    # This function directly attaches the lookaheads to productions contained
-    # in the lookbacks set
+    # The lookaheads of the items contained in the lookbacks set are stored in
+    # lr_lookaheads, which holds a dictionary mapping items to lookaheads for
+    # each state.
     # -----------------------------------------------------------------------------
 
     def add_lookaheads(self, lookbacks, followset):
+        lookaheads = self.lr_lookaheads
         for trans, lb in lookbacks.items():
             # Loop over productions in lookback
             for state, p in lb:
-                if state not in p.lookaheads:
-                    p.lookaheads[state] = []
                 f = followset.get(trans, [])
-                for a in f:
-                    if a not in p.lookaheads[state]:
-                        p.lookaheads[state].append(a)
+                laheads = lookaheads[state].get(p)
+                if laheads is None:
+                    lookaheads[state][p] = list(dict.fromkeys(f))
+                else:
+                    seen = set(laheads)
+                    for a in f:
+                        if a not in seen:
+                            seen.add(a)
+                            laheads.append(a)
 
     # -----------------------------------------------------------------------------
     # add_lalr_lookaheads()
@@ -1735,6 +4060,7 @@ class LRTable:
         followsets = self.compute_follow_sets(trans, readsets, included)
 
         # Add all of the lookaheads
+        self.lr_lookaheads = [{} for I in C]
         self.add_lookaheads(lookd, followsets)
 
     # -----------------------------------------------------------------------------
@@ -1748,6 +4074,9 @@ class LRTable:
         goto   = self.lr_goto         # Goto array
         action = self.lr_action       # Action array
         log    = self.log             # Logger for output
+        debug  = not isinstance(log, NullLogger)
+        item_prod = self.lr_item_prod
+        item_sym  = self.lr_item_sym
 
         actionp = {}                  # Action production array (temporary)
 
@@ -1760,29 +4089,34 @@ class LRTable:
         # Build the parser table, state by state
         st = 0
         for I in C:
+            lookaheads = self.lr_lookaheads[st]
             # Loop over each production in I
             actlist = []              # List of actions
             st_action  = {}
             st_actionp = {}
             st_goto    = {}
+            st_conflicts = {}
             log.info('')
             log.info('state %d', st)
             log.info('')
-            for p in I:
-                log.info('    (%d) %s', p.number, p)
+            if debug:
+                for p in I:
+                    log.info('    (%d) %s', item_prod[p], self.lr_item(p))
             log.info('')
 
             for p in I:
-                    if p.len == p.lr_index + 1:
-                        if p.name == "S'":
+                    pn = item_prod[p]
+                    if item_sym[p] is None:
+                        if Productions[pn].name == "S'":
                             # Start symbol. Accept!
                             st_action['$end'] = 0
                             st_actionp['$end'] = p
                         else:
                             # We are at the end of a production.  Reduce!
-                            laheads = p.lookaheads[st]
+                            laheads = lookaheads[p]
                             for a in laheads:
-                                actlist.append((a, p, 'reduce using rule %d (%s)' % (p.number, p)))
+                                if debug:
+                                    actlist.append((a, p, 'reduce using rule %d (%s)' % (pn, self.lr_item(p))))
                                 r = st_action.get(a)
                                 if r is not None:
                                     # Whoa. Have a shift/reduce or reduce/reduce conflict
@@ -1795,16 +4129,17 @@ class LRTable:
                                         sprec, slevel = Precedence.get(a, ('right', 0))
 
                                         # Reduce precedence comes from rule being reduced (p)
-                                        rprec, rlevel = Productions[p.number].prec
+                                        rprec, rlevel = Productions[pn].prec
 
                                         if (slevel < rlevel) or ((slevel == rlevel) and (rprec == 'left')):
                                             # We really need to reduce here.
-                                            st_action[a] = -p.number
+                                            st_action[a] = -pn
                                             st_actionp[a] = p
                                             if not slevel and not rlevel:
                                                 log.info('  ! shift/reduce conflict for %s resolved as reduce', a)
                                                 self.sr_conflicts.append((st, a, 'reduce'))
-                                            Productions[p.number].reduced += 1
+                                                st_conflicts.setdefault(a, {r}).add(-pn)
+                                            Productions[pn].reduced += 1
                                         elif (slevel == rlevel) and (rprec == 'nonassoc'):
                                             st_action[a] = None
                                         else:
@@ -1812,37 +4147,39 @@ class LRTable:
                                             if not rlevel:
                                                 log.info('  ! shift/reduce conflict for %s resolved as shift', a)
                                                 self.sr_conflicts.append((st, a, 'shift'))
+                                                st_conflicts.setdefault(a, {r}).add(-pn)
                                     elif r < 0:
                                         # Reduce/reduce conflict.   In this case, we favor the rule
                                         # that was defined first in the grammar file
                                         oldp = Productions[-r]
-                                        pp = Productions[p.number]
+                                        pp = Productions[pn]
                                         if oldp.line > pp.line:
-                                            st_action[a] = -p.number
+                                            st_action[a] = -pn
                                             st_actionp[a] = p
                                             chosenp, rejectp = pp, oldp
-                                            Productions[p.number].reduced += 1
+                                            Productions[pn].reduced += 1
                                             Productions[oldp.number].reduced -= 1
                                         else:
                                             chosenp, rejectp = oldp, pp
                                         self.rr_conflicts.append((st, chosenp, rejectp))
-                                        log.info('  ! reduce/reduce conflict for %s resolved using rule %d (%s)',
-                                                 a, st_actionp[a].number, st_actionp[a])
+                                        st_conflicts.setdefault(a, {r}).add(-pn)
+                                        if debug:
+                                            log.info('  ! reduce/reduce conflict for %s resolved using rule %d (%s)',
+                                                     a, item_prod[st_actionp[a]], self.lr_item(st_actionp[a]))
                                     else:
                                         raise LALRError('Unknown conflict in state %d' % st)
                                 else:
-                                    st_action[a] = -p.number
+                                    st_action[a] = -pn
                                     st_actionp[a] = p
-                                    Productions[p.number].reduced += 1
+                                    Productions[pn].reduced += 1
                     else:
-                        i = p.lr_index
-                        a = p.prod[i+1]       # Get symbol right after the "."
+                        a = item_sym[p]       # Get symbol right after the "."
                         if a in self.grammar.Terminals:
-                            g = self.lr0_goto(I, a)
-                            j = self.lr0_cidhash.get(id(g), -1)
+                            j = self.lr0_goto(st, a)
                             if j >= 0:
                                 # We are in a shift state
-                                actlist.append((a, p, 'shift and go to state %d' % j))
+                                if debug:
+                                    actlist.append((a, p, 'shift and go to state %d' % j))
                                 r = st_action.get(a)
                                 if r is not None:
                                     # Whoa have a shift/reduce or shift/shift conflict
@@ -1859,16 +4196,17 @@ class LRTable:
                                         sprec, slevel = Precedence.get(a, ('right', 0))
 
                                         # Reduce precedence comes from the rule that could have been reduced
-                                        rprec, rlevel = Productions[st_actionp[a].number].prec
+                                        rprec, rlevel = Productions[item_prod[st_actionp[a]]].prec
 
                                         if (slevel > rlevel) or ((slevel == rlevel) and (rprec == 'right')):
                                             # We decide to shift here... highest precedence to shift
-                                            Productions[st_actionp[a].number].reduced -= 1
+                                            Productions[item_prod[st_actionp[a]]].reduced -= 1
                                             st_action[a] = j
                                             st_actionp[a] = p
                                             if not rlevel:
                                                 log.info('  ! shift/reduce conflict for %s resolved as shift', a)
                                                 self.sr_conflicts.append((st, a, 'shift'))
+                                                st_conflicts.setdefault(a, {r}).add(j)
                                         elif (slevel == rlevel) and (rprec == 'nonassoc'):
                                             st_action[a] = None
                                         else:
@@ -1876,6 +4214,7 @@ class LRTable:
                                             if not slevel and not rlevel:
                                                 log.info('  ! shift/reduce conflict for %s resolved as reduce', a)
                                                 self.sr_conflicts.append((st, a, 'reduce'))
+                                                st_conflicts.setdefault(a, {r}).add(j)
 
                                     else:
                                         raise LALRError('Unknown conflict in state %d' % st)
@@ -1887,7 +4226,7 @@ class LRTable:
             _actprint = {}
             for a, p, m in actlist:
                 if a in st_action:
-                    if p is st_actionp[a]:
+                    if p == st_actionp[a]:
                         log.info('    %-15s %s', a, m)
                         _actprint[(a, m)] = 1
             log.info('')
@@ -1895,7 +4234,7 @@ class LRTable:
             not_used = 0
             for a, p, m in actlist:
                 if a in st_action:
-                    if p is not st_actionp[a]:
+                    if p != st_actionp[a]:
                         if not (a, m) in _actprint:
                             log.debug('  ! %-15s [ %s ]', a, m)
                             not_used = 1
@@ -1905,21 +4244,16 @@ class LRTable:
 
             # Construct the goto table for this state
 
-            nkeys = {}
-            for ii in I:
-                for s in ii.usyms:
-                    if s in self.grammar.Nonterminals:
-                        nkeys[s] = None
-            for n in nkeys:
-                g = self.lr0_goto(I, n)
-                j = self.lr0_cidhash.get(id(g), -1)
-                if j >= 0:
+            for n, j in self.lr0_trans[st].items():
+                if n in self.grammar.Nonterminals:
                     st_goto[n] = j
                     log.info('    %-30s shift and go to state %d', n, j)
 
             action[st] = st_action
             actionp[st] = st_actionp
             goto[st] = st_goto
+            if st_conflicts:
+                self.lr_conflicts[st] = {a: sorted(acts) for a, acts in st_conflicts.items()}
             st += 1
 
 # -----------------------------------------------------------------------------
@@ -2040,6 +4374,18 @@ class ParserReflect(object):
             pass
         return ''.join(parts)
 
+    # Compute a key identifying the specification for yacc(optimize=True).
+    # This is the signature plus the code of all of the grammar rule
+    # functions, since validation also checks the functions themselves.
+    # Returns None if no key can be computed.
+    def spec_key(self):
+        try:
+            codes = tuple(self.pdict[name].__code__ for line, module, name, doc in self.pfuncs)
+            ecode = self.error_func.__code__ if self.error_func else None
+            return (self.signature(), codes, ecode)
+        except (TypeError, AttributeError):
+            return None
+
     # -----------------------------------------------------------------------------
     # validate_modules()
     #
@@ -2262,6 +4608,44 @@ class ParserReflect(object):
 
         self.grammar = grammar
 
+    # Collect the precedence list and the grammar rules without any of the
+    # checks made by validate_precedence() and validate_pfunctions().  Only
+    # used for specifications that are known to be valid.
+    def get_grammar(self):
+        self.preclist = [(term, p[0], level+1) for level, p in enumerate(self.prec or ())
+                         for term in p[1:]]
+        grammar = []
+        for line, module, name, doc in self.pfuncs:
+            if doc:
+                file = self.pdict[name].__code__.co_filename
+                for g in parse_grammar(doc, file, line):
+                    grammar.append((name, g))
+        self.grammar = grammar
+
+# -----------------------------------------------------------------------------
+# @NODE(tag, *positions)
+#
+# This decorator makes a grammar rule build a node of a tree without any
+# code of its own.  The node is a tuple of tag followed by the values of the
+# symbols at the given positions of the rule, or of all of its symbols if no
+# positions are given.  If tag is a class or another callable instead of a
+# string, it is called with these values to make the node.  For example:
+#
+#     @NODE('binop', 2, 1, 3)
+#     def p_expression_binop(p):
+#         '''expression : expression PLUS expression
+#                       | expression MINUS expression'''
+#
+# makes ('binop', '+', left, right) and ('binop', '-', left, right).  The
+# body of the function is never run.
+# -----------------------------------------------------------------------------
+
+def NODE(tag, *positions):
+    def set_node(f):
+        f.node = (tag, positions)
+        return f
+    return set_node
+
 # -----------------------------------------------------------------------------
 # yacc(module)
 #
@@ -2270,7 +4654,7 @@ class ParserReflect(object):
 
 def yacc(*, debug=yaccdebug, module=None, start=None,
          check_recursion=True, optimize=False, debugfile=debug_file,
-         debuglog=None, errorlog=None):
+         debuglog=None, errorlog=None, compact=None, flat=False):
 
     # Reference to the parsing method of the last built parser
     global parse
@@ -2317,11 +4701,20 @@ def yacc(*, debug=yaccdebug, module=None, start=None,
 
     errors = False
 
+    # In optimized mode, a specification is only validated the first time it
+    # is seen.  After that, the source inspection done by validate_all() and
+    # the checks on the grammar below are skipped, unless debugging, since
+    # the checks also write the grammar to the debugging file.
+    spec_key = pinfo.spec_key() if optimize else None
+    validated = spec_key is not None and spec_key in _validated_specs and not debug
+
     # Validate the parser information
-    if pinfo.validate_all():
+    if validated:
+        pinfo.get_grammar()
+    elif pinfo.validate_all():
         raise YaccError('Unable to build parser')
 
-    if not pinfo.error_func:
+    if not pinfo.error_func and not validated:
         errorlog.warning('no p_error() function is defined')
 
     # Create a grammar object
@@ -2332,7 +4725,8 @@ def yacc(*, debug=yaccdebug, module=None, start=None,
         try:
             grammar.set_precedence(term, assoc, level)
         except GrammarError as e:
-            errorlog.warning('%s', e)
+            if not validated:
+                errorlog.warning('%s', e)
 
     # Add productions to the grammar
     for funcname, gram in pinfo.grammar:
@@ -2356,79 +4750,83 @@ def yacc(*, debug=yaccdebug, module=None, start=None,
     if errors:
         raise YaccError('Unable to build parser')
 
-    # Verify the grammar structure
-    undefined_symbols = grammar.undefined_symbols()
-    for sym, prod in undefined_symbols:
-        errorlog.error('%s:%d: Symbol %r used, but not defined as a token or a rule', prod.file, prod.line, sym)
-        errors = True
+    if not validated:
+        # Verify the grammar structure
+        undefined_symbols = grammar.undefined_symbols()
+        for sym, prod in undefined_symbols:
+            errorlog.error('%s:%d: Symbol %r used, but not defined as a token or a rule', prod.file, prod.line, sym)
+            errors = True
 
-    unused_terminals = grammar.unused_terminals()
-    if unused_terminals:
-        debuglog.info('')
-        debuglog.info('Unused terminals:')
-        debuglog.info('')
-        for term in unused_terminals:
-            errorlog.warning('Token %r defined, but not used', term)
-            debuglog.info('    %s', term)
+        unused_terminals = grammar.unused_terminals()
+        if unused_terminals:
+            debuglog.info('')
+            debuglog.info('Unused terminals:')
+            debuglog.info('')
+            for term in unused_terminals:
+                errorlog.warning('Token %r defined, but not used', term)
+                debuglog.info('    %s', term)
 
-    # Print out all productions to the debug log
-    if debug:
-        debuglog.info('')
-        debuglog.info('Grammar')
-        debuglog.info('')
-        for n, p in enumerate(grammar.Productions):
-            debuglog.info('Rule %-5d %s', n, p)
-
-    # Find unused non-terminals
-    unused_rules = grammar.unused_rules()
-    for prod in unused_rules:
-        errorlog.warning('%s:%d: Rule %r defined, but not used', prod.file, prod.line, prod.name)
-
-    if len(unused_terminals) == 1:
-        errorlog.warning('There is 1 unused token')
-    if len(unused_terminals) > 1:
-        errorlog.warning('There are %d unused tokens', len(unused_terminals))
-
-    if len(unused_rules) == 1:
-        errorlog.warning('There is 1 unused rule')
-    if len(unused_rules) > 1:
-        errorlog.warning('There are %d unused rules', len(unused_rules))
+        # Print out all productions to the debug log
+        if debug:
+            debuglog.info('')
+            debuglog.info('Grammar')
+            debuglog.info('')
+            for n, p in enumerate(grammar.Productions):
+                debuglog.info('Rule %-5d %s', n, p)
+
+        # Find unused non-terminals
+        unused_rules = grammar.unused_rules()
+        for prod in unused_rules:
+            errorlog.warning('%s:%d: Rule %r defined, but not used', prod.file, prod.line, prod.name)
+
+        if len(unused_terminals) == 1:
+            errorlog.warning('There is 1 unused token')
+        if len(unused_terminals) > 1:
+            errorlog.warning('There are %d unused tokens', len(unused_terminals))
+
+        if len(unused_rules) == 1:
+            errorlog.warning('There is 1 unused rule')
+        if len(unused_rules) > 1:
+            errorlog.warning('There are %d unused rules', len(unused_rules))
 
-    if debug:
-        debuglog.info('')
-        debuglog.info('Terminals, with rules where they appear')
-        debuglog.info('')
-        terms = list(grammar.Terminals)
-        terms.sort()
-        for term in terms:
-            debuglog.info('%-20s : %s', term, ' '.join([str(s) for s in grammar.Terminals[term]]))
-
-        debuglog.info('')
-        debuglog.info('Nonterminals, with rules where they appear')
-        debuglog.info('')
-        nonterms = list(grammar.Nonterminals)
-        nonterms.sort()
-        for nonterm in nonterms:
-            debuglog.info('%-20s : %s', nonterm, ' '.join([str(s) for s in grammar.Nonterminals[nonterm]]))
-        debuglog.info('')
-
-    if check_recursion:
-        unreachable = grammar.find_unreachable()
-        for u in unreachable:
-            errorlog.warning('Symbol %r is unreachable', u)
-
-        infinite = grammar.infinite_cycles()
-        for inf in infinite:
-            errorlog.error('Infinite recursion detected for symbol %r', inf)
+        if debug:
+            debuglog.info('')
+            debuglog.info('Terminals, with rules where they appear')
+            debuglog.info('')
+            terms = list(grammar.Terminals)
+            terms.sort()
+            for term in terms:
+                debuglog.info('%-20s : %s', term, ' '.join([str(s) for s in grammar.Terminals[term]]))
+
+            debuglog.info('')
+            debuglog.info('Nonterminals, with rules where they appear')
+            debuglog.info('')
+            nonterms = list(grammar.Nonterminals)
+            nonterms.sort()
+            for nonterm in nonterms:
+                debuglog.info('%-20s : %s', nonterm, ' '.join([str(s) for s in grammar.Nonterminals[nonterm]]))
+            debuglog.info('')
+
+        if check_recursion:
+            unreachable = grammar.find_unreachable()
+            for u in unreachable:
+                errorlog.warning('Symbol %r is unreachable', u)
+
+            infinite = grammar.infinite_cycles()
+            for inf in infinite:
+                errorlog.error('Infinite recursion detected for symbol %r', inf)
+                errors = True
+
+        unused_prec = grammar.unused_precedence()
+        for term, assoc in unused_prec:
+            errorlog.error('Precedence rule %r defined for unknown symbol %r', assoc, term)
             errors = True
 
-    unused_prec = grammar.unused_precedence()
-    for term, assoc in unused_prec:
-        errorlog.error('Precedence rule %r defined for unknown symbol %r', assoc, term)
-        errors = True
+        if errors:
+            raise YaccError('Unable to build parser')
 
-    if errors:
-        raise YaccError('Unable to build parser')
+    if spec_key is not None:
+        _validated_specs.add(spec_key)
 
     # Run the LRTable on the grammar
     lr = LRTable(grammar, debuglog)
@@ -2476,7 +4874,13 @@ def yacc(*, debug=yaccdebug, module=None, start=None,
 
     # Build the parser
     lr.bind_callables(pinfo.pdict)
-    parser = LRParser(lr, pinfo.error_func)
+    parser = LRParser(lr, pinfo.error_func, flat)
+
+    # Drop the data only used to build the tables, unless debugging
+    if compact is None:
+        compact = not debug
+    if compact:
+        parser.compact()
 
     parse = parser.parse
     return parser
@@ -0,0 +1,41 @@
+# lex_async.py
+#
+# Tokenize a stream that arrives in small pieces.  Tokens and multi-byte
+# characters are split between reads.  The eof rule must only be called
+# at the end of the stream.
+
+import asyncio
+
+import ply.lex as lex
+
+tokens = [
+    "NUMBER",
+    "WORD",
+    ]
+
+t_NUMBER = r'\d+'
+t_WORD = r'\w+'
+t_ignore = " \t"
+
+def t_newline(t):
+    r'\n+'
+    t.lexer.lineno += len(t.value)
+
+def t_eof(t):
+    print("eof at %d" % t.lexer.lineno)
+
+def t_error(t):
+    pass
+
+lexer = lex.lex()
+
+async def main():
+    reader = asyncio.StreamReader()
+    data = "12 café\n345 naïve\n\n6789".encode('utf-8')
+    for i in range(0, len(data), 2):
+        reader.feed_data(data[i:i+2])
+    reader.feed_eof()
+    async for tok in lexer.tokens_async(reader, chunksize=3):
+        print(tok.type, ascii(tok.value), tok.lineno, tok.lexpos)
+
+asyncio.run(main())
@@ -0,0 +1,66 @@
+# lex_checkpoint.py
+#
+# Save and restore the state of a lexer that uses a state stack, and
+# check that clones don't share the stack, and that cloning doesn't make
+# the original lexer copy its lists.
+
+import ply.lex as lex
+
+tokens = [
+    "NUMBER",
+    "LBRACE",
+    "RBRACE",
+    ]
+
+states = (('block', 'inclusive'),)
+
+t_NUMBER = r'\d+'
+t_ignore = " "
+
+def t_newline(t):
+    r'\n+'
+    t.lexer.lineno += len(t.value)
+
+def t_LBRACE(t):
+    r'\{'
+    t.lexer.push_state('block')
+    return t
+
+def t_block_RBRACE(t):
+    r'\}'
+    t.lexer.pop_state()
+    return t
+
+def t_error(t):
+    pass
+
+lexer = lex.lex()
+lexer.input("1 { 2 {\n3 } 4 } 5")
+for i in range(4):
+    lexer.token()
+cp = lexer.checkpoint()
+print(cp[1:])
+print([tok.value for tok in lexer], lexer.lineno, lexer.current_state())
+
+lexer.restore(cp)
+print([tok.value for tok in lexer], lexer.lineno, lexer.current_state())
+
+other = lexer.clone()
+other.input("9 {")
+other.restore(cp)
+print([tok.value for tok in other])
+
+clone = lexer.clone()
+print(clone.lexstatestack is lexer.lexstatestack)
+clone.restore(cp)
+clone.push_state('block')
+print(lexer.lexstatestack, clone.lexstatestack)
+
+lexer.lexrelex = True
+lexer.input("1 { 2")
+list(lexer)
+log, stack = lexer.lexstatelog, lexer.lexstatestack
+clone = lexer.clone()
+lexer.begin('INITIAL')
+lexer.push_state('block')
+print(lexer.lexstatelog is log, lexer.lexstatestack is stack, len(log), len(clone.lexstatelog))
@@ -0,0 +1,27 @@
+# lex_optimize.py
+#
+# Build a lexer twice in optimized mode.  Validation warnings should
+# only be reported the first time.
+
+import ply.lex as lex
+
+tokens = [
+    "PLUS",
+    "MINUS",
+    "NUMBER",
+    "MINUS"
+    ]
+
+t_PLUS = r'\+'
+t_MINUS = r'-'
+
+def t_NUMBER(t):
+    r'\d+'
+    return t
+
+def t_error(t):
+    pass
+
+for data in ["3+4", "5-6"]:
+    lexer = lex.lex(optimize=True)
+    lex.runmain(lexer, data=data)
@@ -0,0 +1,41 @@
+# lex_pool.py
+#
+# Several threads tokenize different input with clones handed out by a
+# LexerPool.
+
+import threading
+
+import ply.lex as lex
+
+tokens = [
+    "PLUS",
+    "NUMBER",
+    ]
+
+t_PLUS = r'\+'
+t_NUMBER = r'\d+'
+t_ignore = " \t"
+
+def t_error(t):
+    pass
+
+lexer = lex.lex()
+pool = lex.LexerPool(lexer)
+
+def worker(n, results):
+    clone = pool.get()
+    total = 0
+    for i in range(100):
+        clone.input(" + ".join([str(n)] * (i + 1)))
+        total += sum(int(tok.value) for tok in clone if tok.type == 'NUMBER')
+    results[n] = (total, clone is pool.get(), clone is not lexer)
+
+results = {}
+threads = [threading.Thread(target=worker, args=(n, results)) for n in range(1, 5)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+
+for n in sorted(results):
+    print(n, *results[n])
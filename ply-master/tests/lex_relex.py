@@ -0,0 +1,72 @@
+# lex_relex.py
+#
+# Lex the input again after edits with relex(), including an edit that
+# opens a comment handled by an exclusive state.
+
+import ply.lex as lex
+
+tokens = [
+    "NUMBER",
+    "NAME",
+    ]
+
+states = (('comment', 'exclusive'),)
+
+t_NUMBER = r'\d+'
+t_NAME = r'[a-z]+'
+t_ignore = " "
+t_comment_ignore = ""
+
+def t_newline(t):
+    r'\n+'
+    t.lexer.lineno += len(t.value)
+
+def t_begin_comment(t):
+    r'/\*'
+    t.lexer.begin('comment')
+
+def t_comment_end(t):
+    r'\*/'
+    t.lexer.begin('INITIAL')
+
+def t_comment_body(t):
+    r'[^*\n]+|\*'
+    pass
+
+def t_comment_newline(t):
+    r'\n+'
+    t.lexer.lineno += len(t.value)
+
+def t_error(t):
+    pass
+
+def t_comment_error(t):
+    pass
+
+lexer = lex.lex()
+
+text = "abc 12\nx /* y */ 34\nz 5 w\n"
+lexer.lexrelex = True
+lexer.input(text)
+toks = list(lexer)
+
+def edit(start, end, newtext):
+    global text, toks
+    text = text[:start] + newtext + text[end:]
+    toks = lexer.relex(toks, start, end, newtext)
+    print(lexer.relexrange, ' '.join(str(tok.value) for tok in toks))
+    print([(tok.lexpos, tok.lineno) for tok in map(lexer.adjust, toks)])
+
+edit(4, 6, "123\n\n")
+edit(0, 0, "/*")
+edit(0, 2, "")
+
+# Without lexrelex, state changes aren't recorded
+plain = lex.lex()
+plain.input(text)
+plaintoks = list(plain)
+print(plain.lexstatelog)
+try:
+    plain.relex(plaintoks, 0, 0, "1")
+except ValueError as e:
+    print(e)
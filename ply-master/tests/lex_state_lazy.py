@@ -0,0 +1,60 @@
+# lex_state_lazy.py
+#
+# The master regexs of a state are only compiled when the state is first
+# entered.  Clones share the compiled regexs.  Clones attached to a new
+# object must use the rules bound to that object.  An inclusive state only
+# holds its own rules and falls through to those of INITIAL.
+
+import ply.lex as lex
+
+class CommentLexer:
+    tokens = [
+        "PLUS",
+        "NUMBER",
+        "WORD",
+        ]
+
+    states = (('comment', 'exclusive'),
+              ('words', 'inclusive'))
+
+    t_PLUS = r'\+'
+    t_NUMBER = r'\d+'
+    t_ignore = " \t"
+
+    def __init__(self, name):
+        self.name = name
+
+    def t_comment(self, t):
+        r'/\*'
+        t.lexer.begin('comment')
+
+    def t_comment_body_part(self, t):
+        r'(.|\n)*\*/'
+        print("%s comment %r" % (self.name, t.value))
+        t.lexer.begin('INITIAL')
+
+    def t_words_WORD(self, t):
+        r'[a-z]+'
+        t.value = self.name + ':' + t.value
+        return t
+
+    def t_error(self, t):
+        pass
+
+    t_comment_error = t_error
+    t_comment_ignore = t_ignore
+
+a = CommentLexer('a')
+lexer = lex.lex(object=a)
+print(sorted(lexer.lexstatere))
+
+clone = lexer.clone()
+lex.runmain(clone, data="3 + /* first */ 4")
+print(sorted(lexer.lexstatere))
+
+b = CommentLexer('b')
+other = lexer.clone(b)
+other.begin('words')
+print(other.lexretext, other.lexreinclude is other.lexstatere['INITIAL'])
+lex.runmain(other, data="5 + six /* second */")
+print(sorted(other.lexstatere))
@@ -365,6 +365,21 @@ class LexBuildOptionTests(unittest.TestCase):
                                     "(TOK561,'TOK561:',1,39)\n"
                                     "(TOK999,'TOK999:',1,47)\n"
                                     ))
+
+    def test_lex_optimize(self):
+        run_import("lex_optimize")
+        result = sys.stderr.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "Token 'MINUS' multiply defined\n"))
+        self.assertEqual(result.count("multiply defined"), 1)
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "(NUMBER,'3',1,0)\n"
+                                    "(PLUS,'+',1,1)\n"
+                                    "(NUMBER,'4',1,2)\n"
+                                    "(NUMBER,'5',1,0)\n"
+                                    "(MINUS,'-',1,1)\n"
+                                    "(NUMBER,'6',1,2)\n"))
         
 # Tests related to run-time behavior of lexers
 class LexRunTests(unittest.TestCase):
@@ -396,6 +411,73 @@ class LexRunTests(unittest.TestCase):
                                     "(NUMBER,'10',1,32)\n"
                                     ))    
 
+    def test_lex_state_lazy(self):
+        run_import("lex_state_lazy")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "['INITIAL']\n"
+                                    "(NUMBER,'3',1,0)\n"
+                                    "(PLUS,'+',1,2)\n"
+                                    "a comment 'first */'\n"
+                                    "(NUMBER,'4',1,16)\n"
+                                    "['INITIAL', 'comment']\n"
+                                    "['(?P<t_words_WORD>[a-z]+)'] True\n"
+                                    "(NUMBER,'5',1,0)\n"
+                                    "(PLUS,'+',1,2)\n"
+                                    "(WORD,'b:six',1,4)\n"
+                                    "b comment 'second */'\n"
+                                    "['INITIAL', 'comment', 'words']\n"
+                                    ))
+
+    def test_lex_async(self):
+        run_import("lex_async")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "NUMBER '12' 1 0\n"
+                                    "WORD 'caf\\xe9' 1 3\n"
+                                    "NUMBER '345' 2 8\n"
+                                    "WORD 'na\\xefve' 2 12\n"
+                                    "NUMBER '6789' 4 19\n"
+                                    "eof at 4\n"
+                                    ))
+
+    def test_lex_pool(self):
+        run_import("lex_pool")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "1 5050 True True\n"
+                                    "2 10100 True True\n"
+                                    "3 15150 True True\n"
+                                    "4 20200 True True\n"
+                                    ))
+
+    def test_lex_checkpoint(self):
+        run_import("lex_checkpoint")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "(7, 1, 'block', ('INITIAL', 'block'))\n"
+                                    "['3', '}', '4', '}', '5'] 2 INITIAL\n"
+                                    "['3', '}', '4', '}', '5'] 2 INITIAL\n"
+                                    "['3', '}', '4', '}', '5']\n"
+                                    "False\n"
+                                    "[] ['INITIAL', 'block', 'block']\n"
+                                    "True True 4 2\n"
+                                    ))
+
+    def test_lex_relex(self):
+        run_import("lex_relex")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "(1, 2, 1) abc 123 x 34 z 5 w\n"
+                                    "[(0, 1), (4, 1), (10, 4), (20, 4), (23, 5), (25, 5), (27, 5)]\n"
+                                    "(0, 3, 0) 34 z 5 w\n"
+                                    "[(22, 4), (25, 5), (27, 5), (29, 5)]\n"
+                                    "(0, 0, 3) abc 123 x 34 z 5 w\n"
+                                    "[(0, 1), (4, 1), (10, 4), (20, 4), (23, 5), (25, 5), (27, 5)]\n"
+                                    "None\n"
+                                    "relex() needs lexrelex to be set before input() is called\n"
+                                    ))
+
 
 
 unittest.main()
@@ -376,6 +376,261 @@ class YaccErrorWarningTests(unittest.TestCase):
                                     "Generating LALR tables\n"
                                     ))
 
+    def test_yacc_optimize(self):
+        run_import("yacc_optimize")
+        result = sys.stderr.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "yacc_optimize.py:63: Rule 'integer' defined, but not used\n"
+                                    "There is 1 unused rule\n"
+                                    "Symbol 'integer' is unreachable\n"
+                                    ))
+        self.assertEqual(result.count("There is 1 unused rule"), 1)
+        self.assertEqual(sys.stdout.getvalue(), "11\n14\nTrue\n")
+
+    def test_yacc_async(self):
+        run_import("yacc_async")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "a sends 'x = 1 + '\n"
+                                    "b sends 'z = (3'\n"
+                                    "a sends '2\\ny = 5'\n"
+                                    "b sends ' * 4)\\n'\n"
+                                    "a sends '\\n'\n"
+                                    "b result [('z', 12)]\n"
+                                    "a result [('x', 3), ('y', 5)]\n"
+                                    ))
+
+    def test_yacc_chain(self):
+        run_import("yacc_chain")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "1503 x\n"
+                                    ))
+
+    def test_yacc_compact(self):
+        run_import("yacc_compact")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "MiniProduction(expression -> expression PLUS expression) 3\n"
+                                    "14\n"
+                                    "Production(expression -> expression PLUS expression) ('expression', 'PLUS', 'expression')\n"
+                                    "14\n"
+                                    ))
+
+    def test_yacc_kernels(self):
+        run_import("yacc_kernels")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "8\n"
+                                    "0 [('B', 2), ('C', 4), ('s0', 1), ('s1', 3)]\n"
+                                    "1 []\n"
+                                    "2 []\n"
+                                    "3 [('B', 2), ('C', 4), ('s0', 5), ('s1', 3)]\n"
+                                    "4 [('B', 2), ('C', 4), ('s0', 7), ('s1', 6)]\n"
+                                    "5 []\n"
+                                    "6 [('B', 2), ('C', 4), ('s0', 5), ('s1', 3)]\n"
+                                    "7 []\n"
+                                    ))
+
+    def test_yacc_lritems(self):
+        run_import("yacc_lritems")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "10 []\n"
+                                    "0 S' -> . expr\n"
+                                    "1 S' -> expr .\n"
+                                    "2 expr -> . expr PLUS term\n"
+                                    "3 expr -> expr . PLUS term\n"
+                                    "4 expr -> expr PLUS . term\n"
+                                    "5 expr -> expr PLUS term .\n"
+                                    "6 expr -> . term\n"
+                                    "7 expr -> term .\n"
+                                    "8 term -> . NUMBER\n"
+                                    "9 term -> NUMBER .\n"
+                                    "expr -> term . ['PLUS', '$end']\n"
+                                    "[('$end', -2), ('PLUS', -2)]\n"
+                                    ))
+
+    def test_yacc_incremental(self):
+        run_import("yacc_incremental")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "[('a', 3), ('b', 12), ('c', -7), ('d', 8)] 21 0\n"
+                                    "[('a', 3), ('b', 120), ('c', -7), ('d', 8)] 6 4\n"
+                                    "LexToken(NUMBER,8,4,41)\n"
+                                    "Syntax error at 'd' on line 4\n"
+                                    "None None\n"
+                                    "[('a', 3), ('b', 120), ('c', -70), ('d', 8)] 21 0\n"
+                                    ))
+
+    def test_yacc_many(self):
+        run_import("yacc_many")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "3\n"
+                                    "Syntax error at EOF\n"
+                                    "None\n"
+                                    "Syntax error at '*' on line 2\n"
+                                    "6\n"
+                                    "-7\n"
+                                    "4.0\n"
+                                    "[]\n"
+                                    "10\n"
+                                    ))
+
+    def test_yacc_tokens(self):
+        run_import("yacc_tokens")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "14\n"
+                                    "14\n"
+                                    "Syntax error at '*' at position 9\n"
+                                    "1\n"
+                                    ))
+
+    def test_yacc_push(self):
+        run_import("yacc_push")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "a = 3 after 6 tokens\n"
+                                    "Syntax error at '*'\n"
+                                    "b = 0 after 14 tokens\n"
+                                    "c = -6 after 19 tokens\n"
+                                    "3\n"
+                                    ))
+
+    def test_yacc_pool(self):
+        run_import("yacc_pool")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "1 200 20 True True\n"
+                                    "2 200 20 True True\n"
+                                    "3 200 20 True True\n"
+                                    "4 200 20 True True\n"
+                                    "14\n"
+                                    ))
+
+    def test_yacc_spans(self):
+        run_import("yacc_spans")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "binop 2 2 2 (3, 3) (15, 15)\n"
+                                    "group (2, 3) (9, 16) (2, 3)\n"
+                                    "binop 1 1 1 (2, 3) (9, 16)\n"
+                                    "empty 3 23 (23, 23)\n"
+                                    "call (20, 22) (23, 23)\n"
+                                    "binop 1 1 3 (3, 3) (21, 22)\n"
+                                    "Syntax error at '4'\n"
+                                    "error (4, 5) (28, 33)\n"
+                                    "binop 1 1 4 (4, 5) (27, 34)\n"
+                                    "statement (1, 5) (0, 34) (1, 5) (4, 34)\n"
+                                    ))
+
+    def test_yacc_values(self):
+        run_import("yacc_values")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "True\n"
+                                    "group + 2 2 ['expression', 'LPAREN', 'expression', 'RPAREN']\n"
+                                    "Syntax error at '4'\n"
+                                    "error 4 3\n"
+                                    "assign x 0 4 ['x', '='] 1 1\n"
+                                    "0\n"
+                                    ))
+
+    def test_yacc_helpers(self):
+        run_import("yacc_helpers")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "False\n"
+                                    "group PLUS 2\n"
+                                    "0\n"
+                                    ))
+
+    def test_yacc_passthrough(self):
+        run_import("yacc_passthrough")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "statement -> expression None\n"
+                                    "statement -> NAME EQUALS expression None\n"
+                                    "expression -> expression PLUS term None\n"
+                                    "expression -> expression MINUS term None\n"
+                                    "expression -> term 1\n"
+                                    "term -> LPAREN expression RPAREN 2\n"
+                                    "term -> NUMBER 1\n"
+                                    "term -> LPAREN RPAREN 0\n"
+                                    "0\n"
+                                    "4\n"
+                                    "None\n"
+                                    ))
+
+    def test_yacc_node(self):
+        run_import("yacc_node")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "Assign('x', ('binop', '+', ('binop', '*', ('num', 2), ('group', ('binop', '-', ('call', 'f', '(', ('num', 1), ')'), ('call', 'g', '(', ')')))), ('num', 4)))\n"
+                                    "Assign('x', ('binop', '+', ('binop', '*', ('num', 2), ('group', ('binop', '-', ('call', 'f', '(', ('num', 1), ')'), ('call', 'g', '(', ')')))), ('num', 4)))\n"
+                                    ))
+
+    def test_yacc_tree(self):
+        run_import("yacc_tree")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "Syntax error at '4'\n"
+                                    "ParseTree(7 nodes, 11 tokens)\n"
+                                    "statement -> NAME EQUALS expression (0, 11)\n"
+                                    "  NAME 'x'\n"
+                                    "  EQUALS '='\n"
+                                    "  expression -> expression PLUS expression (2, 11)\n"
+                                    "    expression -> expression TIMES expression (2, 9)\n"
+                                    "      expression -> MINUS expression (2, 4)\n"
+                                    "        MINUS '-'\n"
+                                    "        expression -> NUMBER (3, 4)\n"
+                                    "          NUMBER 2\n"
+                                    "      TIMES '*'\n"
+                                    "      expression -> LPAREN error RPAREN (5, 9)\n"
+                                    "        LPAREN '('\n"
+                                    "        error LexToken(NUMBER,4,1,12)\n"
+                                    "        RPAREN ')'\n"
+                                    "    PLUS '+'\n"
+                                    "    expression -> NUMBER (10, 11)\n"
+                                    "      NUMBER 5\n"
+                                    "['-', 2, '*', '(', 3, LexToken(NUMBER,4,1,12), ')', '+', 5]\n"
+                                    "ParseTree(7 nodes, 11 tokens) True expression\n"
+                                    ))
+
+    def test_yacc_glr(self):
+        run_import("yacc_glr")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "merge expression 6 11 2\n"
+                                    "merge expression 2 9 2\n"
+                                    "merge expression 2 11 3\n"
+                                    "x = (((1 + 2) * 3) - 4)\n"
+                                    "x = ((1 + (2 * 3)) - 4)\n"
+                                    "x = (1 + ((2 * 3) - 4))\n"
+                                    "x = (1 + (2 * (3 - 4)))\n"
+                                    "x = ((1 + 2) * (3 - 4))\n"
+                                    "11 1 4 6\n"
+                                    "['4']\n"
+                                    "0\n"
+                                    "['(1 + 2)']\n"
+                                    "Syntax error at '*'\n"
+                                    "None\n"
+                                    ))
+
+    def test_yacc_glr_cycle(self):
+        run_import("yacc_glr_cycle")
+        result = sys.stdout.getvalue()
+        self.assertTrue(check_expected(result,
+                                    "p[-1] is not available in grammar rules called by parse_glr()\n"
+                                    "e(3)\n"
+                                    "0\n"
+                                    "merge expression 0 5 2\n"
+                                    "((e(1) + e(2)) + e(3))\n"
+                                    "4\n"
+                                    ))
+
     def test_yacc_uprec(self):
         self.assertRaises(ply.yacc.YaccError,run_import,"yacc_uprec")
         result = sys.stderr.getvalue()
@@ -0,0 +1,74 @@
+# -----------------------------------------------------------------------------
+# yacc_async.py
+#
+# Run two parses concurrently with parse_async() while the data for each
+# one trickles in.
+# -----------------------------------------------------------------------------
+import asyncio
+
+import ply.yacc as yacc
+
+from calclex import tokens, lexer
+
+# Parsing rules
+precedence = (
+    ('left','PLUS','MINUS'),
+    ('left','TIMES','DIVIDE'),
+    ('right','UMINUS'),
+    )
+
+def p_statements(t):
+    '''statements : statements statement
+                  | statement'''
+    t[0] = t[1] + [t[2]] if len(t) == 3 else [t[1]]
+
+def p_statement_assign(t):
+    'statement : NAME EQUALS expression'
+    t[0] = (t[1], t[3])
+
+def p_expression_binop(t):
+    '''expression : expression PLUS expression
+                  | expression MINUS expression
+                  | expression TIMES expression
+                  | expression DIVIDE expression'''
+    if t[2] == '+'  : t[0] = t[1] + t[3]
+    elif t[2] == '-': t[0] = t[1] - t[3]
+    elif t[2] == '*': t[0] = t[1] * t[3]
+    elif t[2] == '/': t[0] = t[1] / t[3]
+
+def p_expression_uminus(t):
+    'expression : MINUS expression %prec UMINUS'
+    t[0] = -t[2]
+
+def p_expression_group(t):
+    'expression : LPAREN expression RPAREN'
+    t[0] = t[2]
+
+def p_expression_number(t):
+    'expression : NUMBER'
+    t[0] = t[1]
+
+def p_error(t):
+    print("Syntax error at '%s'" % t.value)
+
+parser = yacc.yacc()
+
+async def send(reader, name, lines):
+    for line in lines:
+        print("%s sends %r" % (name, line))
+        reader.feed_data(line.encode())
+        await asyncio.sleep(0)
+    reader.feed_eof()
+
+async def parse(name, lines):
+    reader = asyncio.StreamReader()
+    sender = asyncio.ensure_future(send(reader, name, lines))
+    result = await parser.parse_async(reader, lexer=lexer.clone())
+    await sender
+    print("%s result %s" % (name, result))
+
+async def main():
+    await asyncio.gather(parse("a", ["x = 1 + ", "2\ny = 5", "\n"]),
+                         parse("b", ["z = (3", " * 4)\n"]))
+
+asyncio.run(main())
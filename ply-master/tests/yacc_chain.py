@@ -0,0 +1,47 @@
+# -----------------------------------------------------------------------------
+# yacc_chain.py
+#
+# A generated grammar with a long chain of nonterminals, n0 : n1, n1 : n2,
+# ...  Building the tables must not run out of stack.  Run as a script to
+# build a longer chain against a time and memory budget:
+#
+#     python yacc_chain.py [length [seconds [megabytes]]]
+# -----------------------------------------------------------------------------
+import sys
+import time
+import tracemalloc
+
+import ply.yacc as yacc
+
+if __name__ == '__main__':
+    args = [float(a) for a in sys.argv[1:]]
+    length, seconds, megabytes = (args + [10000, 60, 100][len(args):])[:3]
+    length = int(length)
+else:
+    length = 1500
+
+tokens = ('X', 'Y')
+
+def p_chain(p):
+    p[0] = p[1]
+
+p_chain.__doc__ = '\n'.join(['start : n0 Y'] +
+                            ['n%d : n%d' % (i, i + 1) for i in range(length)] +
+                            ['n%d : X' % length])
+
+def p_error(p):
+    print("Syntax error at %r" % p)
+
+tracemalloc.start()
+t0 = time.perf_counter()
+parser = yacc.yacc(debug=False)
+elapsed = time.perf_counter() - t0
+peak = tracemalloc.get_traced_memory()[1] / 1e6
+tracemalloc.stop()
+
+print(len(parser.productions), parser.parse_tokens((['X', 'Y'], ['x', 'y'], [0, 2])))
+
+if __name__ == '__main__':
+    print("built in %.2f s, peak memory %.1f MB" % (elapsed, peak))
+    if elapsed > seconds or peak > megabytes:
+        sys.exit("over budget of %g s and %g MB" % (seconds, megabytes))
@@ -0,0 +1,48 @@
+# -----------------------------------------------------------------------------
+# yacc_compact.py
+#
+# By default, yacc() keeps only what the parsing engine needs from each
+# production.  compact=False keeps the full Production objects.
+# -----------------------------------------------------------------------------
+import ply.yacc as yacc
+
+from calclex import tokens, lexer
+
+# Parsing rules
+precedence = (
+    ('left','PLUS','MINUS'),
+    ('left','TIMES','DIVIDE'),
+    )
+
+def p_statement_expr(t):
+    'statement : expression'
+    t[0] = t[1]
+
+def p_expression_binop(t):
+    '''expression : expression PLUS expression
+                  | expression MINUS expression
+                  | expression TIMES expression
+                  | expression DIVIDE expression'''
+    if t[2] == '+'  : t[0] = t[1] + t[3]
+    elif t[2] == '-': t[0] = t[1] - t[3]
+    elif t[2] == '*': t[0] = t[1] * t[3]
+    elif t[2] == '/': t[0] = t[1] / t[3]
+
+def p_expression_group(t):
+    'expression : LPAREN expression RPAREN'
+    t[0] = t[2]
+
+def p_expression_number(t):
+    'expression : NUMBER'
+    t[0] = t[1]
+
+def p_error(t):
+    print("Syntax error at '%s'" % t.value)
+
+parser = yacc.yacc()
+print(repr(parser.productions[2]), parser.productions[2].len)
+print(parser.parse("2 * (3 + 4)", lexer=lexer))
+
+parser = yacc.yacc(compact=False)
+print(repr(parser.productions[2]), parser.productions[2].prod)
+print(parser.parse("2 * (3 + 4)", lexer=lexer))
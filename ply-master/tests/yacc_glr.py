@@ -0,0 +1,56 @@
+# -----------------------------------------------------------------------------
+# yacc_glr.py
+#
+# Parse an ambiguous grammar with parse_glr(), collecting every reading of
+# the input.
+# -----------------------------------------------------------------------------
+
+import ply.yacc as yacc
+
+from calclex import tokens, lexer
+
+# Parsing rules.  There is no precedence, so every expression with more
+# than one operator is ambiguous.
+
+def p_statement_assign(t):
+    'statement : NAME EQUALS expression'
+    t[0] = ['%s = %s' % (t[1], e) for e in t[3]]
+
+def p_statement_expr(t):
+    'statement : expression'
+    t[0] = t[1]
+
+def p_expression_binop(t):
+    '''expression : expression PLUS expression
+                  | expression MINUS expression
+                  | expression TIMES expression
+                  | expression DIVIDE expression'''
+    t[0] = ['(%s %s %s)' % (a, t[2], b) for a in t[1] for b in t[3]]
+
+def p_expression_group(t):
+    'expression : LPAREN expression RPAREN'
+    t[0] = t[2]
+
+def p_expression_number(t):
+    'expression : NUMBER'
+    t[0] = [str(t[1])]
+
+def p_error(t):
+    print("Syntax error at '%s'" % t.value)
+
+# Every reading of a part of the input is kept
+def merge(node, values):
+    print('merge', node.type, node.start, node.end, len(values))
+    return [v for value in values for v in value]
+
+parser = yacc.yacc()
+lexer.lineno = 1
+for reading in parser.parse_glr("x = (1) + 2 * 3 - 4", lexer=lexer, merge=merge):
+    print(reading)
+report = parser.glr_report
+print(report.tokens, report.splits, report.split_tokens, report.max_stacks)
+
+print(parser.parse_glr("(4)", lexer=lexer))
+print(parser.glr_report.splits)
+print(parser.parse_glr("1 + 2", lexer=lexer, merge=merge))
+print(parser.parse_glr("1 + * 2", lexer=lexer))
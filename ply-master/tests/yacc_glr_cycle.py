@@ -0,0 +1,52 @@
+# -----------------------------------------------------------------------------
+# yacc_glr_cycle.py
+#
+# Parse with parse_glr() using a grammar with a cycle (expression -> term ->
+# expression), which gives ambiguous inputs infinitely many parses.
+# -----------------------------------------------------------------------------
+
+import ply.yacc as yacc
+
+from calclex import tokens, lexer
+
+def p_statement_expr(t):
+    'statement : expression'
+    t[0] = t[1]
+
+def p_expression_term(t):
+    'expression : term'
+    t[0] = 'e(%s)' % t[1]
+
+def p_expression_plus(t):
+    'expression : expression PLUS expression'
+    t[0] = '(%s + %s)' % (t[1], t[3])
+
+def p_expression_group(t):
+    'expression : LPAREN expression RPAREN'
+    t[0] = t[2]
+
+def p_term_expression(t):
+    'term : expression'
+    t[0] = 't(%s)' % t[1]
+
+def p_term_number(t):
+    'term : NUMBER'
+    try:
+        t[-1]
+    except yacc.YaccError as e:
+        print(e)
+    t[0] = str(t[1])
+
+def p_error(t):
+    print("Syntax error at '%s'" % t.value)
+
+def merge(node, values):
+    print('merge', node.type, node.start, node.end, len(values))
+    return values[0]
+
+parser = yacc.yacc()
+lexer.lineno = 1
+print(parser.parse_glr("3", lexer=lexer, merge=merge))
+print(parser.glr_report.cycles)
+print(parser.parse_glr("1 + 2 + 3", lexer=lexer, merge=merge))
+print(parser.glr_report.cycles)
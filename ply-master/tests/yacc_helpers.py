@@ -0,0 +1,49 @@
+# -----------------------------------------------------------------------------
+# yacc_helpers.py
+#
+# Grammar rules that pass p to helper functions looking at the symbol
+# objects.  Parsers use the symbol objects unless built with flat=True.
+# -----------------------------------------------------------------------------
+
+import ply.yacc as yacc
+
+from calclex import tokens, lexer
+
+# Helper functions looking at p.stack and at the attributes of symbols
+def below(p):
+    return p.stack[-1].type
+
+def first_line(p):
+    return p.slice[1].lineno
+
+# Parsing rules
+precedence = (
+    ('left','PLUS','MINUS'),
+    )
+
+def p_statement_assign(t):
+    'statement : NAME EQUALS expression'
+    t[0] = t[3]
+
+def p_expression_binop(t):
+    '''expression : expression PLUS expression
+                  | expression MINUS expression'''
+    if t[2] == '+': t[0] = t[1] + t[3]
+    else: t[0] = t[1] - t[3]
+
+def p_expression_group(t):
+    'expression : LPAREN expression RPAREN'
+    print("group", below(t), first_line(t))
+    t[0] = t[2]
+
+def p_expression_number(t):
+    'expression : NUMBER'
+    t[0] = t[1]
+
+def p_error(t):
+    print("Syntax error at '%s'" % t.value)
+
+parser = yacc.yacc()
+print(parser.flat)
+lexer.lineno = 1
+print(parser.parse("x = 1 +\n (2 - 3)", lexer=lexer))
@@ -0,0 +1,69 @@
+# -----------------------------------------------------------------------------
+# yacc_incremental.py
+#
+# Edit a document parsed with an incremental parser.  Statements that
+# weren't touched by an edit must be reused instead of being parsed again.
+# -----------------------------------------------------------------------------
+import ply.yacc as yacc
+
+from calclex import tokens, lexer
+
+# Parsing rules
+precedence = (
+    ('left','PLUS','MINUS'),
+    ('left','TIMES','DIVIDE'),
+    ('right','UMINUS'),
+    )
+
+def p_statements(t):
+    '''statements : statements statement
+                  | statement'''
+    t[0] = t[1] + [t[2]] if len(t) == 3 else [t[1]]
+
+def p_statement_assign(t):
+    'statement : NAME EQUALS expression'
+    t[0] = (t[1], t[3])
+
+def p_expression_binop(t):
+    '''expression : expression PLUS expression
+                  | expression MINUS expression
+                  | expression TIMES expression
+                  | expression DIVIDE expression'''
+    if t[2] == '+'  : t[0] = t[1] + t[3]
+    elif t[2] == '-': t[0] = t[1] - t[3]
+    elif t[2] == '*': t[0] = t[1] * t[3]
+    elif t[2] == '/': t[0] = t[1] / t[3]
+
+def p_expression_uminus(t):
+    'expression : MINUS expression %prec UMINUS'
+    t[0] = -t[2]
+
+def p_expression_group(t):
+    'expression : LPAREN expression RPAREN'
+    t[0] = t[2]
+
+def p_expression_number(t):
+    'expression : NUMBER'
+    t[0] = t[1]
+
+def p_error(t):
+    if t:
+        print("Syntax error at '%s' on line %d" % (t.value, t.lineno))
+    else:
+        print("Syntax error at EOF")
+
+parser = yacc.yacc()
+
+p = parser.incremental(lexer)
+text = "a = 1 + 2\nb = 3 * 4\nc = (5 - 6) * 7\nd = 8\n"
+print(p.parse(text), p.reductions, p.reused)
+
+# Change 3 to 30 on line 2
+start = text.index('3')
+print(p.edit(start, start + 1, '30'), p.reductions, p.reused)
+print(p.lexer.adjust(p.tokens[-1]))
+
+# Remove the operand of a multiplication, then put it back
+start = p.text.index('7')
+print(p.edit(start, start + 1, ''), p.tree)
+print(p.edit(start, start, '70'), p.reductions, p.reused)
@@ -0,0 +1,21 @@
+# -----------------------------------------------------------------------------
+# yacc_kernels.py
+#
+# LR(0) states are identified by their kernel items.  The same set of items
+# reached in a different order must give the same state.
+# -----------------------------------------------------------------------------
+import ply.yacc as yacc
+
+g = yacc.Grammar(['B', 'C'])
+g.add_production('s0', ['B'])
+g.add_production('s0', ['s1', 's0'])
+g.add_production('s0', ['C', 's1'])
+g.add_production('s1', [])
+g.add_production('s1', ['s0'])
+g.add_production('s1', ['C'])
+g.set_start('s0')
+
+lr = yacc.LRTable(g)
+print(len(lr.lr_action))
+for st, trans in enumerate(lr.lr0_trans):
+    print(st, sorted(trans.items()))
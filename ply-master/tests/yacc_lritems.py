@@ -0,0 +1,21 @@
+# -----------------------------------------------------------------------------
+# yacc_lritems.py
+#
+# LRTable numbers the LR items of a grammar instead of creating LRItem
+# objects.  lr_item() turns an item number back into an LRItem.
+# -----------------------------------------------------------------------------
+import ply.yacc as yacc
+
+g = yacc.Grammar(['NUMBER', 'PLUS'])
+g.add_production('expr', ['expr', 'PLUS', 'term'])
+g.add_production('expr', ['term'])
+g.add_production('term', ['NUMBER'])
+g.set_start('expr')
+
+lr = yacc.LRTable(g)
+print(len(lr.lr_item_prod), g[1].lr_items)
+for n in range(len(lr.lr_item_prod)):
+    print(n, lr.lr_item(n))
+for n, laheads in sorted(lr.lr_lookaheads[2].items()):
+    print(lr.lr_item(n), laheads)
+print(sorted(lr.lr_action[2].items()))
@@ -0,0 +1,72 @@
+# -----------------------------------------------------------------------------
+# yacc_many.py
+#
+# Parse several inputs in worker processes with parse_many().  Results
+# must come back in order, along with the messages printed by p_error().
+# The state of the last parse isn't sent to the workers.
+# -----------------------------------------------------------------------------
+import multiprocessing
+import pickle
+
+import ply.yacc as yacc
+
+from calclex import tokens, lexer
+
+# Parsing rules
+precedence = (
+    ('left','PLUS','MINUS'),
+    ('left','TIMES','DIVIDE'),
+    ('right','UMINUS'),
+    )
+
+def p_statement_expr(t):
+    'statement : expression'
+    t[0] = t[1]
+
+def p_expression_binop(t):
+    '''expression : expression PLUS expression
+                  | expression MINUS expression
+                  | expression TIMES expression
+                  | expression DIVIDE expression'''
+    if t[2] == '+'  : t[0] = t[1] + t[3]
+    elif t[2] == '-': t[0] = t[1] - t[3]
+    elif t[2] == '*': t[0] = t[1] * t[3]
+    elif t[2] == '/': t[0] = t[1] / t[3]
+
+def p_expression_uminus(t):
+    'expression : MINUS expression %prec UMINUS'
+    t[0] = -t[2]
+
+def p_expression_group(t):
+    'expression : LPAREN expression RPAREN'
+    t[0] = t[2]
+
+def p_expression_number(t):
+    'expression : NUMBER'
+    t[0] = t[1]
+
+def p_error(t):
+    if t:
+        print("Syntax error at '%s' on line %d" % (t.value, t.lineno))
+    else:
+        print("Syntax error at EOF")
+
+parser = yacc.yacc()
+
+# The worker processes must not import the test driver again
+if 'fork' in multiprocessing.get_all_start_methods():
+    multiprocessing.set_start_method('fork', force=True)
+    workers = 2
+else:
+    workers = 1
+
+inputs = ["1 + 2", "3 * (4", "\n5 * * 6", "-7", "8 / 2"]
+for result in parser.parse_many(inputs, lexer=lexer, workers=workers, chunksize=2):
+    print(result)
+
+# A value that can't be pickled is left on the symbol stack
+parser.parse("9", lexer=lexer)
+parser.symstack.append(lambda: None)
+copy = pickle.loads(pickle.dumps(parser))
+print([name for name in ('token', 'statestack', 'symstack', 'state') if hasattr(copy, name)])
+print(copy.parse("2 * 5", lexer=lexer))
@@ -0,0 +1,56 @@
+# -----------------------------------------------------------------------------
+# yacc_node.py
+#
+# Grammar rules that build tree nodes with the NODE decorator.  The same
+# trees are built whether or not the rules are called.
+# -----------------------------------------------------------------------------
+
+import ply.yacc as yacc
+from ply.yacc import NODE
+
+from calclex import tokens, lexer
+
+class Assign:
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def __repr__(self):
+        return 'Assign(%r, %r)' % (self.name, self.value)
+
+# Parsing rules
+precedence = (
+    ('left','PLUS','MINUS'),
+    ('left','TIMES','DIVIDE'),
+    )
+
+@NODE(Assign, 1, 3)
+def p_statement_assign(p):
+    'statement : NAME EQUALS expression'
+
+@NODE('binop', 2, 1, 3)
+def p_expression_binop(p):
+    '''expression : expression PLUS expression
+                  | expression MINUS expression
+                  | expression TIMES expression
+                  | expression DIVIDE expression'''
+
+@NODE('group', 2)
+def p_expression_group(p):
+    'expression : LPAREN expression RPAREN'
+
+@NODE('call')
+def p_expression_call(p):
+    '''expression : NAME LPAREN RPAREN
+                  | NAME LPAREN expression RPAREN'''
+
+@NODE('num')
+def p_expression_number(p):
+    'expression : NUMBER'
+
+def p_error(p):
+    print("Syntax error at '%s'" % p.value)
+
+parser = yacc.yacc(flat=True)
+for tracking in (False, True):
+    print(parser.parse("x = 2 * (f(1) - g()) + 4", lexer=lexer, tracking=tracking))
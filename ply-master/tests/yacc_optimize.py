@@ -0,0 +1,75 @@
+# -----------------------------------------------------------------------------
+# yacc_optimize.py
+#
+# Build a parser with an unused rule twice in optimized mode.  Warnings
+# should only be reported the first time.  A debugging build still writes
+# the grammar to the debugging log.
+# -----------------------------------------------------------------------------
+import io
+
+import ply.yacc as yacc
+
+from calclex import tokens, lexer
+
+# Parsing rules
+precedence = (
+    ('left','PLUS','MINUS'),
+    ('left','TIMES','DIVIDE'),
+    ('right','UMINUS'),
+    )
+
+# dictionary of names
+names = { }
+
+def p_statement_assign(t):
+    'statement : NAME EQUALS expression'
+    names[t[1]] = t[3]
+
+def p_statement_expr(t):
+    'statement : expression'
+    print(t[1])
+
+def p_expression_binop(t):
+    '''expression : expression PLUS expression
+                  | expression MINUS expression
+                  | expression TIMES expression
+                  | expression DIVIDE expression'''
+    if t[2] == '+'  : t[0] = t[1] + t[3]
+    elif t[2] == '-': t[0] = t[1] - t[3]
+    elif t[2] == '*': t[0] = t[1] * t[3]
+    elif t[2] == '/': t[0] = t[1] / t[3]
+
+def p_expression_uminus(t):
+    'expression : MINUS expression %prec UMINUS'
+    t[0] = -t[2]
+
+def p_expression_group(t):
+    'expression : LPAREN expression RPAREN'
+    t[0] = t[2]
+
+def p_expression_number(t):
+    'expression : NUMBER'
+    t[0] = t[1]
+
+def p_expression_name(t):
+    'expression : NAME'
+    try:
+        t[0] = names[t[1]]
+    except LookupError:
+        print("Undefined name '%s'" % t[1])
+        t[0] = 0
+
+def p_integer(t):
+    'integer : NUMBER'
+    t[0] = t[1]
+
+def p_error(t):
+    print("Syntax error at '%s'" % t.value)
+
+for data in ["3+4*2", "(3+4)*2"]:
+    parser = yacc.yacc(optimize=True)
+    parser.parse(data, lexer=lexer)
+
+log = io.StringIO()
+yacc.yacc(optimize=True, debug=True, debuglog=yacc.PlyLogger(log), errorlog=yacc.NullLogger())
+print('Rule 11    integer -> NUMBER' in log.getvalue())
@@ -0,0 +1,51 @@
+# -----------------------------------------------------------------------------
+# yacc_passthrough.py
+#
+# Rules that only pass on the value of one of their symbols, or do nothing,
+# are recognized and performed by the parser without calling them.
+# -----------------------------------------------------------------------------
+
+import ply.yacc as yacc
+
+from calclex import tokens, lexer
+
+# Parsing rules
+precedence = (
+    ('left','PLUS','MINUS'),
+    )
+
+def p_statement_expr(t):
+    '''statement : expression
+                 | NAME EQUALS expression'''
+    t[0] = t[len(t)-1]
+
+def p_expression_binop(t):
+    '''expression : expression PLUS term
+                  | expression MINUS term'''
+    if t[2] == '+': t[0] = t[1] + t[3]
+    else: t[0] = t[1] - t[3]
+
+def p_expression_term(t):
+    'expression : term'
+    t[0] = t[1]
+
+def p_term_group(t):
+    'term : LPAREN expression RPAREN'
+    t[0] = t[2]
+
+def p_term_number(t):
+    'term : NUMBER'
+    t[0] = t[1]
+
+def p_term_empty(t):
+    'term : LPAREN RPAREN'
+    pass
+
+def p_error(t):
+    print("Syntax error at '%s'" % t.value)
+
+parser = yacc.yacc(flat=True)
+for p, k in zip(parser.productions[1:], parser.passthrough[1:]):
+    print(p.str, k)
+for data in ("x = 1 + (2 - (3))", "(4)", "()"):
+    print(parser.parse(data, lexer=lexer))
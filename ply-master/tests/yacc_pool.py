@@ -0,0 +1,82 @@
+# -----------------------------------------------------------------------------
+# yacc_pool.py
+#
+# Several threads share one parser through a ParserPool.  Each thread
+# gets its own parse context and its own clone of the lexer.  Syntax
+# errors in one thread must not disturb the parses running in others.
+# -----------------------------------------------------------------------------
+import sys
+import threading
+
+import ply.yacc as yacc
+
+from calclex import tokens, lexer
+
+# Parsing rules
+precedence = (
+    ('left','PLUS','MINUS'),
+    ('left','TIMES','DIVIDE'),
+    ('right','UMINUS'),
+    )
+
+def p_statement_expr(t):
+    'statement : expression'
+    t[0] = t[1]
+
+def p_expression_group_error(t):
+    'expression : LPAREN error RPAREN'
+    # Only the start symbol is left on the stack of this parse
+    t[0] = len(t.parser.symstack) - 1
+
+def p_expression_binop(t):
+    '''expression : expression PLUS expression
+                  | expression MINUS expression
+                  | expression TIMES expression
+                  | expression DIVIDE expression'''
+    if t[2] == '+'  : t[0] = t[1] + t[3]
+    elif t[2] == '-': t[0] = t[1] - t[3]
+    elif t[2] == '*': t[0] = t[1] * t[3]
+    elif t[2] == '/': t[0] = t[1] // t[3]
+
+def p_expression_uminus(t):
+    'expression : MINUS expression %prec UMINUS'
+    t[0] = -t[2]
+
+def p_expression_group(t):
+    'expression : LPAREN expression RPAREN'
+    t[0] = t[2]
+
+def p_expression_number(t):
+    'expression : NUMBER'
+    t[0] = t[1]
+
+def p_error(t):
+    if t:
+        t.lexer.errors += 1
+
+sys.setswitchinterval(1e-5)
+parser = yacc.yacc()
+pool = yacc.ParserPool(parser, lexer)
+
+def worker(n, results):
+    context = pool.get()
+    context.lexer.errors = 0
+    ok = 0
+    for i in range(200):
+        data = "(%d+%d)*%d" % (n, i, n) if i % 10 else "(%d + * %d)*%d" % (n, i, n)
+        expected = (n + i) * n if i % 10 else 0
+        if pool.parse(data) == expected:
+            ok += 1
+    results[n] = (ok, context.lexer.errors, context.lexer is not lexer,
+                  context.parent is parser)
+
+results = {}
+threads = [threading.Thread(target=worker, args=(n, results)) for n in range(1, 5)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+
+for n in sorted(results):
+    print(n, *results[n])
+print(parser.parse("2*(3+4)", lexer=lexer))
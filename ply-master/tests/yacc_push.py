@@ -0,0 +1,68 @@
+# -----------------------------------------------------------------------------
+# yacc_push.py
+#
+# Feed tokens to a push parser one at a time.  Each statement is reported
+# through a callback as soon as it is recognized, and errors are
+# recovered from as in parse().
+# -----------------------------------------------------------------------------
+import ply.yacc as yacc
+
+from calclex import tokens, lexer
+
+# Parsing rules
+precedence = (
+    ('left','PLUS','MINUS'),
+    ('left','TIMES','DIVIDE'),
+    ('right','UMINUS'),
+    )
+
+def p_statements(t):
+    '''statements : statements statement
+                  | statement'''
+    t[0] = t[1] + 1 if len(t) == 3 else 1
+
+def p_statement_assign(t):
+    'statement : NAME EQUALS expression'
+    t[0] = (t[1], t[3])
+
+def p_expression_binop(t):
+    '''expression : expression PLUS expression
+                  | expression MINUS expression
+                  | expression TIMES expression
+                  | expression DIVIDE expression'''
+    if t[2] == '+'  : t[0] = t[1] + t[3]
+    elif t[2] == '-': t[0] = t[1] - t[3]
+    elif t[2] == '*': t[0] = t[1] * t[3]
+    elif t[2] == '/': t[0] = t[1] / t[3]
+
+def p_expression_uminus(t):
+    'expression : MINUS expression %prec UMINUS'
+    t[0] = -t[2]
+
+def p_expression_group(t):
+    'expression : LPAREN expression RPAREN'
+    t[0] = t[2]
+
+def p_expression_group_error(t):
+    'expression : LPAREN error RPAREN'
+    t[0] = 0
+
+def p_expression_number(t):
+    'expression : NUMBER'
+    t[0] = t[1]
+
+def p_error(t):
+    print("Syntax error at '%s'" % t.value)
+
+parser = yacc.yacc()
+
+fed = 0
+def statement(value):
+    print("%s = %s after %d tokens" % (value[0], value[1], fed))
+
+p = parser.push_context(lexer, callbacks={'statement': statement})
+lexer.input("a = 1 + 2 b = (3 * * 4) c = -2 * 3")
+for tok in lexer:
+    fed += 1
+    p.feed(tok)
+print(p.finish())
@@ -0,0 +1,57 @@
+# -----------------------------------------------------------------------------
+# yacc_spans.py
+#
+# Position tracking with parse(tracking=True).  Line numbers and lexing
+# positions of nonterminals, empty rules and error tokens are read back
+# through p.lineno(), p.linespan() and p.lexspan().
+# -----------------------------------------------------------------------------
+
+import ply.yacc as yacc
+
+from calclex import tokens, lexer
+
+# Parsing rules
+precedence = (
+    ('left','PLUS','MINUS'),
+    )
+
+def p_statement_assign(t):
+    'statement : NAME EQUALS expression'
+    print("statement", t.linespan(0), t.lexspan(0), t.linespan(3), t.lexspan(3))
+
+def p_expression_binop(t):
+    '''expression : expression PLUS expression
+                  | expression MINUS expression'''
+    print("binop", t.lineno(0), t.lineno(1), t.lineno(2), t.linespan(3), t.lexspan(3))
+
+def p_expression_call(t):
+    'expression : NAME LPAREN args RPAREN'
+    print("call", t.lexspan(0), t.lexspan(3))
+    # The call is reported at its opening parenthesis
+    t.set_lexpos(0, t.lexpos(2))
+
+def p_expression_group(t):
+    'expression : LPAREN expression RPAREN'
+    print("group", t.linespan(0), t.lexspan(0), t.linespan(2))
+
+def p_expression_group_error(t):
+    'expression : LPAREN error RPAREN'
+    print("error", t.linespan(2), t.lexspan(2))
+
+def p_expression_number(t):
+    'expression : NUMBER'
+
+def p_args(t):
+    '''args : expression
+            | empty'''
+
+def p_empty(t):
+    'empty :'
+    print("empty", t.lineno(0), t.lexpos(0), t.lexspan(0))
+
+def p_error(t):
+    print("Syntax error at '%s'" % t.value)
+
+parser = yacc.yacc()
+lexer.lineno = 1
+parser.parse("x = 1 +\n (2 +\n 3) - f()\n + (4 4\n 4)", lexer=lexer, tracking=True)
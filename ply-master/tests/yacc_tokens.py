@@ -0,0 +1,62 @@
+# -----------------------------------------------------------------------------
+# yacc_tokens.py
+#
+# Parse tokens that were produced in advance with parse_tokens(), both
+# from a list of tokens and from columns.  p_error() must still get the
+# offending token.
+# -----------------------------------------------------------------------------
+import ply.yacc as yacc
+
+from calclex import tokens, lexer
+
+# Parsing rules
+precedence = (
+    ('left','PLUS','MINUS'),
+    ('left','TIMES','DIVIDE'),
+    ('right','UMINUS'),
+    )
+
+def p_statement_expr(t):
+    'statement : expression'
+    t[0] = t[1]
+
+def p_expression_binop(t):
+    '''expression : expression PLUS expression
+                  | expression MINUS expression
+                  | expression TIMES expression
+                  | expression DIVIDE expression'''
+    if t[2] == '+'  : t[0] = t[1] + t[3]
+    elif t[2] == '-': t[0] = t[1] - t[3]
+    elif t[2] == '*': t[0] = t[1] * t[3]
+    elif t[2] == '/': t[0] = t[1] / t[3]
+
+def p_expression_uminus(t):
+    'expression : MINUS expression %prec UMINUS'
+    t[0] = -t[2]
+
+def p_expression_group(t):
+    'expression : LPAREN expression RPAREN'
+    t[0] = t[2]
+
+def p_expression_group_error(t):
+    'expression : LPAREN error RPAREN'
+    t[0] = 0
+
+def p_expression_number(t):
+    'expression : NUMBER'
+    t[0] = t[1]
+
+def p_error(t):
+    print("Syntax error at '%s' at position %d" % (t.value, t.lexpos))
+
+parser = yacc.yacc()
+
+lexer.input("2 * (3 + 4)")
+toks = list(lexer)
+print(parser.parse_tokens(toks))
+print(parser.parse_tokens(toks))
+
+types = ['NUMBER', 'PLUS', 'LPAREN', 'NUMBER', 'TIMES', 'TIMES', 'RPAREN', 'TIMES', 'NUMBER']
+values = [1, '+', '(', 2, '*', '*', ')', '*', 5]
+positions = [0, 2, 4, 5, 7, 9, 10, 12, 14]
+print(parser.parse_tokens((types, values, positions)))
@@ -0,0 +1,67 @@
+# -----------------------------------------------------------------------------
+# yacc_tree.py
+#
+# Record parse trees with parse_tree(), walk them, and save and load them.
+# -----------------------------------------------------------------------------
+import os
+import tempfile
+
+import ply.yacc as yacc
+
+from calclex import tokens, lexer
+
+# Parsing rules
+precedence = (
+    ('left','PLUS','MINUS'),
+    ('left','TIMES','DIVIDE'),
+    ('right','UMINUS'),
+    )
+
+def p_statement_assign(t):
+    'statement : NAME EQUALS expression'
+    raise AssertionError('rules are not called')
+
+def p_statement_expr(t):
+    'statement : expression'
+
+def p_expression_binop(t):
+    '''expression : expression PLUS expression
+                  | expression MINUS expression
+                  | expression TIMES expression
+                  | expression DIVIDE expression'''
+
+def p_expression_uminus(t):
+    'expression : MINUS expression %prec UMINUS'
+
+def p_expression_group(t):
+    '''expression : LPAREN expression RPAREN
+                  | LPAREN error RPAREN'''
+
+def p_expression_number(t):
+    'expression : NUMBER'
+
+def p_error(t):
+    print("Syntax error at '%s'" % t.value)
+
+def show(node, indent=''):
+    print(indent + str(node.production()), node.tokenspan())
+    for child in node.children:
+        if isinstance(child, yacc.TreeNode):
+            show(child, indent + '  ')
+        else:
+            print(indent + '  ' + child.type, repr(child.value))
+
+parser = yacc.yacc()
+lexer.lineno = 1
+tree = parser.parse_tree("x = -2 * (3 4) + 5", lexer=lexer)
+print(tree)
+show(tree.root)
+print([tok.value for tok in tree.root.children[2].tokens])
+
+f = tempfile.NamedTemporaryFile(delete=False)
+tree.save(f)
+f.close()
+loaded = yacc.ParseTree.load(f.name, parser.productions, tree.tokens)
+print(loaded, list(loaded.prods) == list(tree.prods), loaded.root.children[2].children[0].type)
+del loaded
+os.remove(f.name)
@@ -0,0 +1,56 @@
+# -----------------------------------------------------------------------------
+# yacc_values.py
+#
+# Grammar rules run by the value stack engine.  Values, slices, p[-1],
+# line numbers of tokens and line numbers set on nonterminals with
+# set_lineno() work as they do with symbol objects.
+# -----------------------------------------------------------------------------
+
+import ply.yacc as yacc
+
+from calclex import tokens, lexer
+
+# Helper functions may still look at p.slice, which is made on request
+def symbol_types(p):
+    return [s.type for s in p.slice]
+
+# Parsing rules
+precedence = (
+    ('left','PLUS','MINUS'),
+    )
+
+def p_statement_assign(t):
+    'statement : NAME EQUALS expression'
+    print("assign", t[1], t[3], len(t), t[1:3], t.lineno(1), t.lineno(3))
+    t[0] = t[3]
+
+def p_expression_binop(t):
+    '''expression : expression PLUS expression
+                  | expression MINUS expression'''
+    if t[2] == '+': t[0] = t[1] + t[3]
+    else: t[0] = t[1] - t[3]
+    t.set_lineno(0, t.lineno(1))
+
+def p_expression_group(t):
+    'expression : LPAREN expression RPAREN'
+    print("group", t[-1], t.lineno(1), t.lineno(2), symbol_types(t))
+    t[0] = t[2]
+    t.set_lineno(0, t.lineno(1))
+
+def p_expression_number(t):
+    'expression : NUMBER'
+    t[0] = t[1]
+    t.set_lineno(0, t.lineno(1))
+
+def p_expression_group_error(t):
+    'expression : LPAREN error RPAREN'
+    print("error", t[2].value, t.lineno(2))
+    t[0] = 0
+
+def p_error(t):
+    print("Syntax error at '%s'" % t.value)
+
+parser = yacc.yacc(flat=True)
+print(parser.flat)
+lexer.lineno = 1
+print(parser.parse("x = 1 +\n (2 -\n 3) + (4 4)", lexer=lexer))